@@ -0,0 +1,278 @@
+"""
+Local stand-ins for the Firecrawl and DeepSeek APIs used by the benchmark.
+
+One FastAPI app serves both:
+
+- Firecrawl v1: POST /v1/crawl, GET /v1/crawl/{id}, POST /v1/extract, GET /v1/extract/{id}
+- DeepSeek (OpenAI-compatible): POST /chat/completions and /v1/chat/completions, with and
+  without "stream": true; a system message seen before is reported as prompt_cache_hit_tokens
+  and a share of JSON array answers (--truncate-rate) is cut off to exercise continuations
+
+Every request waits for the configured latency plus a uniform jitter and fails with the
+configured error rate (HTTP 500, or 429 for DeepSeek), so retries and slow upstreams can be
+reproduced without API credits. Responses are derived from the request content, so the same
+pipeline input always produces the same artifacts. Run it on its own with:
+
+    python bench/fake_upstreams.py --port 8900 --llm-latency-ms 800 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Body keys accepted by POST /v1/extract
+EXTRACT_KEYS = {
+    "urls", "prompt", "schema", "systemPrompt", "enableWebSearch", "allowExternalLinks", "showSources",
+    "ignoreSitemap", "includeSubdomains", "scrapeOptions", "origin",
+}
+
+def _digest(text: str) -> int:
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:12], 16)
+
+
+def _company_pool(size: int) -> List[str]:
+    # Mix of spellings so entity resolution and pre-scoring have something to do
+    suffixes = ["Inc.", "GmbH", "AG", "Corporation", "Ltd", "", "Group", "Technologies"]
+    stems = ["Acme", "Bolt", "Cobalt", "Delta", "Ember", "Falcon", "Granite", "Helix", "Ion", "Juno", "Kestrel",
+             "Lumen", "Magna", "Nova", "Orbit", "Pioneer", "Quartz", "Radius", "Summit", "Titan", "Umbra", "Vertex",
+             "Willow", "Xenon", "Yarrow", "Zephyr"]
+    names = []
+    for index in range(size):
+        stem = f"{stems[index % len(stems)]} {['Chemicals', 'Materials', 'Energy', 'Coatings', 'Polymers'][index // len(stems) % 5]}"
+        if index >= len(stems) * 5:
+            stem = f"{stem} {index}"
+        names.append(f"{stem} {suffixes[index % len(suffixes)]}".strip())
+    names += ["Trade Association of Testing", "Industry News Weekly", "AI"]
+    return names
+
+
+class FakeUpstreams:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.crawls: Dict[str, Dict[str, Any]] = {}
+        self.extracts: Dict[str, Dict[str, Any]] = {}
+        self.companies = _company_pool(args.company_pool)
+        self.counters: Dict[str, int] = {}
+        self.prefixes: set = set()
+        self.app = self._build_app()
+
+    async def _delay(self, latency_ms: float) -> None:
+        jitter = self.random.uniform(-self.args.jitter_ms, self.args.jitter_ms)
+        await asyncio.sleep(max(0.0, latency_ms + jitter) / 1000)
+
+    def _fail(self, name: str, status_code: int = 500):
+        self.counters[name] = self.counters.get(name, 0) + 1
+        if self.random.random() < self.args.error_rate:
+            self.counters[f"{name}_errors"] = self.counters.get(f"{name}_errors", 0) + 1
+            return JSONResponse({"success": False, "error": "injected failure"}, status_code=status_code)
+        return None
+
+    # Firecrawl ---------------------------------------------------------------------------
+
+    def _pages(self, url: str) -> List[Dict[str, Any]]:
+        seed = _digest(url)
+        pages = []
+        for index in range(self.args.crawl_pages):
+            body = " ".join(
+                f"{url} makes fluoropolymer films and coatings for solar, aerospace and automotive customers (section {index}, line {line})."
+                for line in range(self.args.page_lines)
+            )
+            pages.append({
+                "markdown": f"# {url} page {index}\n\n{body}\n\nSite id {seed}.",
+                "metadata": {"sourceURL": f"{url.rstrip('/')}/page-{index}"},
+            })
+        return pages
+
+    async def start_crawl(self, request: Request):
+        payload = await request.json()
+        await self._delay(self.args.firecrawl_latency_ms)
+        failure = self._fail("crawl")
+        if failure:
+            return failure
+        crawl_id = uuid.uuid4().hex
+        self.crawls[crawl_id] = {"url": payload.get("url", ""), "started": time.monotonic()}
+        return {"success": True, "id": crawl_id, "url": f"/v1/crawl/{crawl_id}"}
+
+    async def crawl_status(self, crawl_id: str):
+        await self._delay(self.args.firecrawl_latency_ms)
+        crawl = self.crawls.get(crawl_id)
+        if crawl is None:
+            return JSONResponse({"success": False, "error": "crawl not found"}, status_code=404)
+        failure = self._fail("crawl_status")
+        if failure:
+            return failure
+        total = self.args.crawl_pages
+        progress = (time.monotonic() - crawl["started"]) / max(self.args.crawl_seconds, 1e-6)
+        if progress < 1:
+            return {"success": True, "status": "scraping", "total": total, "completed": int(progress * total), "data": []}
+        return {
+            "success": True, "status": "completed", "total": total, "completed": total, "creditsUsed": total,
+            "expiresAt": "2099-01-01T00:00:00Z", "data": self._pages(crawl["url"]),
+        }
+
+    async def start_extract(self, request: Request):
+        payload = await request.json()
+        await self._delay(self.args.firecrawl_latency_ms)
+        unknown = set(payload) - EXTRACT_KEYS
+        if unknown:
+            # Like the v1 API, which validates its request body strictly
+            return JSONResponse({"success": False, "error": f"Unrecognized keys in body: {sorted(unknown)}"}, status_code=400)
+        failure = self._fail("extract")
+        if failure:
+            return failure
+        url = (payload.get("urls") or [""])[0]
+        seed = _digest(url)
+        picked = [self.companies[(seed + step * 7919) % len(self.companies)] for step in range(self.args.companies_per_page)]
+        extract_id = uuid.uuid4().hex
+        self.extracts[extract_id] = {"companies": picked}
+        return {"success": True, "id": extract_id}
+
+    async def extract_status(self, extract_id: str):
+        await self._delay(self.args.extract_latency_ms)
+        extract = self.extracts.get(extract_id)
+        if extract is None:
+            return JSONResponse({"success": False, "error": "extract not found"}, status_code=404)
+        return {"success": True, "status": "completed", "data": {"companies": extract["companies"]}}
+
+    # DeepSeek ----------------------------------------------------------------------------
+
+    def _completion_text(self, prompt: str, messages: List[Dict[str, Any]]) -> str:
+        seed = _digest(prompt)
+        if "Potential Customer Data:" in prompt:
+            # Continuation calls append the previous answer, so read the shard from its own message
+            data = next(str(m.get("content")) for m in messages if "Potential Customer Data:" in str(m.get("content")))
+            data = data.split("Potential Customer Data:", 1)[1]
+            names = json.loads(data[data.index("["):data.rindex("]") + 1])
+            rows = [
+                {
+                    "company_name": name, "industry": "Materials", "revenue": f"${(_digest(name) % 900) + 10} million",
+                    "size": f"{(_digest(name) % 9000) + 100} employees", "stakeholder_name": "Alex Doe",
+                    "stakeholder_position": "Head of Procurement", "stakeholder_email": "",
+                    "stakeholder_phone": "", "stakeholder_link": "", "score": _digest(name) % 101,
+                    "reasoning": "Synthetic benchmark ranking.",
+                }
+                for name in names if name != "AI"
+            ]
+            return json.dumps(rows)
+        if "event opportunities" in prompt:
+            shared = self.args.events - int(self.args.events * (1 - self.args.event_overlap))
+            events = [
+                {"name": f"Shared event {index}", "url": f"https://www.events-{index}.bench.test/?utm_source=bench", "category": "Exhibitions"}
+                for index in range(shared)
+            ] + [
+                {"name": f"Event {seed % 100000}-{index}", "url": f"https://events-{seed % 100000}-{index}.bench.test/", "category": "Associations"}
+                for index in range(self.args.events - shared)
+            ]
+            return json.dumps(events)
+        if "outreach email" in prompt:
+            return "Subject: Partnership\n\nDear Alex,\n\n" + "We would like to introduce our films. " * 20 + "\n\nBest regards"
+        return f"# Company Profile {seed}\n\n" + "\n".join(
+            f"- Fact {index}: fluoropolymer films for solar, aerospace and automotive markets." for index in range(self.args.profile_lines)
+        )
+
+    async def chat_completions(self, request: Request):
+        payload = await request.json()
+        prompt = "\n".join(str(message.get("content", "")) for message in payload.get("messages", []))
+        await self._delay(self.args.llm_latency_ms)
+        failure = self._fail("chat", status_code=self.random.choice([429, 500]))
+        if failure:
+            return failure
+        text = self._completion_text(prompt, payload.get("messages", []))
+        if text.startswith("[") and self.random.random() < self.args.truncate_rate:
+            # Cut the array off like a response that hit max_tokens
+            text = text[:self.random.randint(1, len(text) - 1)]
+        completion_id, created, model = f"chatcmpl-{uuid.uuid4().hex}", int(time.time()), payload.get("model", "deepseek-chat")
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4, "total_tokens": (len(prompt) + len(text)) // 4}
+        # Context caching: a repeated system message counts as a cached prefix, like DeepSeek's disk cache
+        messages = payload.get("messages") or [{}]
+        prefix = str(messages[0].get("content", "")) if messages[0].get("role") == "system" else ""
+        cache_hit = min(len(prefix) // 4, usage["prompt_tokens"]) if prefix and _digest(prefix) in self.prefixes else 0
+        self.prefixes.add(_digest(prefix))
+        usage.update({
+            "prompt_cache_hit_tokens": cache_hit, "prompt_cache_miss_tokens": usage["prompt_tokens"] - cache_hit,
+            "prompt_tokens_details": {"cached_tokens": cache_hit},
+        })
+
+        if not payload.get("stream"):
+            return {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        async def stream():
+            pieces = re.findall(r"\S+\s*", text) or [text]
+            step = max(1, len(pieces) // self.args.stream_chunks)
+            for start in range(0, len(pieces), step):
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": "".join(pieces[start:start + step])}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(self.args.stream_interval_ms / 1000)
+            final = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage,
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+        app.post("/v1/crawl")(self.start_crawl)
+        app.get("/v1/crawl/{crawl_id}")(self.crawl_status)
+        app.post("/v1/extract")(self.start_extract)
+        app.get("/v1/extract/{extract_id}")(self.extract_status)
+        app.post("/chat/completions")(self.chat_completions)
+        app.post("/v1/chat/completions")(self.chat_completions)
+        app.get("/stats")(lambda: self.counters)
+        return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Register the upstream behaviour options (shared with run_bench.py).
+    """
+    group = parser.add_argument_group("fake upstreams")
+    group.add_argument("--llm-latency-ms", type=float, default=500, help="DeepSeek time to first byte")
+    group.add_argument("--firecrawl-latency-ms", type=float, default=100, help="latency of every Firecrawl call")
+    group.add_argument("--extract-latency-ms", type=float, default=300, help="extra latency of the extract result")
+    group.add_argument("--jitter-ms", type=float, default=50, help="uniform +/- jitter added to every latency")
+    group.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls failing with 500 (or 429)")
+    group.add_argument("--crawl-seconds", type=float, default=1.0, help="time until a crawl reports completed")
+    group.add_argument("--crawl-pages", type=int, default=5)
+    group.add_argument("--page-lines", type=int, default=40, help="lines of text per crawled page")
+    group.add_argument("--profile-lines", type=int, default=40, help="lines of the generated company profile")
+    group.add_argument("--events", type=int, default=10, help="events returned by find_potential_events")
+    group.add_argument("--event-overlap", type=float, default=0.5, help="fraction of events shared by all pipelines")
+    group.add_argument("--truncate-rate", type=float, default=0.0, help="fraction of JSON array answers cut off")
+    group.add_argument("--companies-per-page", type=int, default=15)
+    group.add_argument("--company-pool", type=int, default=200)
+    group.add_argument("--stream-chunks", type=int, default=40)
+    group.add_argument("--stream-interval-ms", type=float, default=5)
+    group.add_argument("--seed", type=int, default=1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(FakeUpstreams(args).app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Offline end-to-end benchmark of the lead-generation API.
+
+Starts the fake Firecrawl/DeepSeek upstreams (bench/fake_upstreams.py) in a child process,
+runs the FastAPI app with uvicorn in a thread of this process (so the lag of its event loop
+can be sampled directly), and drives many pipelines against it concurrently:
+
+- "stages" mode calls every stage endpoint in order per pipeline (knowledge base, profile,
+  events, extraction, prioritization, both database stores and a /customers query) and
+  reports the latency of each endpoint;
+- "pipeline" mode submits POST /pipeline/run jobs and polls them until they finish.
+
+Every run works in a fresh temporary directory (artifacts, SQLite caches and the local
+database), so results do not depend on earlier runs. Example:
+
+    python bench/run_bench.py --pipelines 40 --concurrency 10 --llm-latency-ms 800 --output bench_output.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import uvicorn
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import fake_upstreams  # noqa: E402
+
+# Interval of the event-loop lag probe inside the app process
+LAG_PROBE_INTERVAL = 0.05
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.05)
+    raise RuntimeError(f"nothing is listening on port {port}")
+
+
+def _serve_upstreams(args: argparse.Namespace, port: int) -> None:
+    uvicorn.run(fake_upstreams.FakeUpstreams(args).app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """
+    Return the nearest-rank percentile of the values (None for an empty list).
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 0.50),
+        "p95_ms": percentile(samples, 0.95),
+        "p99_ms": percentile(samples, 0.99),
+        "max_ms": max(samples) if samples else None,
+    }
+
+
+class AppServer:
+    """
+    The application under test, served by uvicorn on a background thread with its own event loop.
+    """
+
+    def __init__(self, port: int):
+        import main  # Imported here: the environment and working directory must be prepared first
+
+        self.server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+        self.lag_samples: List[float] = []
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True)
+
+    async def _probe_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not self.server.should_exit:
+            started = loop.time()
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+            self.lag_samples.append((loop.time() - started - LAG_PROBE_INTERVAL) * 1000)
+
+    async def _serve(self) -> None:
+        probe = asyncio.create_task(self._probe_lag())
+        try:
+            await self.server.serve()
+        finally:
+            probe.cancel()
+
+    def start(self) -> None:
+        self._thread.start()
+        deadline = time.monotonic() + 30
+        while not self.server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("the application did not start")
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self._thread.join(timeout=30)
+
+
+class Driver:
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, List[str]] = {}
+
+    async def call(self, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.errors.setdefault(name, []).append(f"{type(e).__name__}: {e}")
+            return None
+        self.latencies.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            self.errors.setdefault(name, []).append(f"{response.status_code}: {response.text[:200]}")
+            return None
+        return response
+
+    async def run_stages(self, index: int) -> bool:
+        run_id = f"bench-{index}"
+        target_url = f"https://target-{index}.bench.test/"
+        steps = [
+            ("generate_knowledge_base", "POST", "/generate_knowledge_base",
+             {"json": {"target_url": target_url, "file_name": "knowledge_base", "wait": True, "run_id": run_id, "refresh": True}}),
+            ("process_knowledge_base", "POST", "/process_knowledge_base", {"json": {"run_id": run_id}}),
+            ("find_potential_events", "POST", "/find_potential_events", {"json": {"run_id": run_id}}),
+            ("extract_companies", "POST", "/extract_companies", {"json": {"run_id": run_id}}),
+            ("prioritize_companies", "POST", "/prioritize_companies", {"json": {"run_id": run_id}}),
+            ("store_events_in_db", "POST", "/store_events_in_db", {"params": {"root_url": target_url, "run_id": run_id}}),
+            ("store_prioritized_companies_in_db", "POST", "/store_prioritized_companies_in_db",
+             {"params": {"root_url": target_url, "run_id": run_id}}),
+            ("customers", "GET", "/customers", {"params": {"root_url": target_url, "limit": 50}}),
+        ]
+        for name, method, url, kwargs in steps:
+            if await self.call(name, method, url, **kwargs) is None:
+                return False
+        return True
+
+    async def run_pipeline_job(self, index: int, poll_interval: float) -> bool:
+        response = await self.call(
+            "pipeline/run", "POST", "/pipeline/run",
+            json={"target_url": f"https://target-{index}.bench.test/", "run_id": f"bench-{index}", "refresh": True}
+        )
+        if response is None:
+            return False
+        job_id = response.json()["job_id"]
+        while True:
+            await asyncio.sleep(poll_interval)
+            status = await self.call("pipeline/status", "GET", f"/pipeline/{job_id}")
+            if status is None:
+                return False
+            summary = status.json()
+            if summary["status"] == "completed":
+                return True
+            if summary["status"] == "failed":
+                self.errors.setdefault("pipeline", []).append(str(summary.get("error")))
+                return False
+
+
+async def drive(args: argparse.Namespace, app_url: str) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout, limits=limits) as client:
+        driver = Driver(client)
+        semaphore = asyncio.Semaphore(args.concurrency)
+        pipeline_latencies: List[float] = []
+
+        async def one(index: int) -> bool:
+            async with semaphore:
+                started = time.perf_counter()
+                if args.mode == "pipeline":
+                    ok = await driver.run_pipeline_job(index, args.poll_interval)
+                else:
+                    ok = await driver.run_stages(index)
+                if ok:
+                    pipeline_latencies.append((time.perf_counter() - started) * 1000)
+                return ok
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(one(index) for index in range(args.pipelines)))
+        elapsed = time.perf_counter() - started
+
+    requests_done = sum(len(samples) for samples in driver.latencies.values())
+    return {
+        "elapsed_s": elapsed,
+        "pipelines": {"completed": sum(outcomes), "failed": len(outcomes) - sum(outcomes), **summarize(pipeline_latencies)},
+        "throughput": {"pipelines_per_s": sum(outcomes) / elapsed, "requests_per_s": requests_done / elapsed},
+        "endpoints": {
+            name: {**summarize(samples), "errors": len(driver.errors.get(name, []))}
+            for name, samples in driver.latencies.items()
+        },
+        "errors": {name: messages[:5] for name, messages in driver.errors.items()},
+    }
+
+
+def _format_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:9.1f}"
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n{report['pipelines']['completed']} pipelines completed, {report['pipelines']['failed']} failed "
+          f"in {report['elapsed_s']:.1f}s ({report['throughput']['pipelines_per_s']:.2f} pipelines/s, "
+          f"{report['throughput']['requests_per_s']:.1f} requests/s)\n")
+    print(f"{'endpoint':36} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    rows = list(report["endpoints"].items()) + [("(whole pipeline)", {**report["pipelines"], "errors": report["pipelines"]["failed"]}),
+                                                 ("(event-loop lag)", {**report["event_loop_lag"], "errors": 0})]
+    for name, stats in rows:
+        print(f"{name:36} {stats['count']:6d} {stats['errors']:6d} {_format_ms(stats['p50_ms'])} "
+              f"{_format_ms(stats['p95_ms'])} {_format_ms(stats['p99_ms'])} {_format_ms(stats['max_ms'])}")
+    for name, messages in report["errors"].items():
+        print(f"\n{name} errors (first {len(messages)}):")
+        for message in messages:
+            print(f"  {message}")
+
+
+def _prepare_environment(args: argparse.Namespace, work_dir: str, upstream_url: str) -> None:
+    # The app resolves data/, static/ and templates/ relative to the working directory
+    for directory in ("static", "templates"):
+        os.symlink(os.path.join(REPO_DIR, directory), os.path.join(work_dir, directory))
+    os.chdir(work_dir)
+    sys.path.insert(0, REPO_DIR)
+
+    os.environ.update({
+        "DEBUG_MODE": "false",
+        "FIRECRAWL_API_KEY": "bench",
+        "FIRECRAWL_API_URL": upstream_url,
+        "DEEPSEEK_API_KEY": "bench",
+        "DEEPSEEK_API_BASE": upstream_url,
+        "LOCAL_CACHE_DIR": os.path.join(work_dir, "data", "cache"),
+        # An empty URL selects the local SQLite database; .env files do not override it
+        "NEON_DATABASE_URL": args.database_url or "",
+    })
+    # Tunables that default to production pacing; values set in the environment win
+    os.environ.setdefault("CRAWL_POLL_INITIAL_INTERVAL", "0.2")
+    os.environ.setdefault("CRAWL_POLL_MAX_INTERVAL", "1")
+    os.environ.setdefault("EXTRACT_RATE_PER_MINUTE", "0")
+    os.environ.setdefault("PIPELINE_MAX_CONCURRENCY", str(max(args.concurrency, 1)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the lead-generation API.")
+    parser.add_argument("--mode", choices=["stages", "pipeline"], default="stages")
+    parser.add_argument("--pipelines", type=int, default=20, help="number of pipelines to run")
+    parser.add_argument("--concurrency", type=int, default=5, help="pipelines in flight at the same time")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="pipeline status poll interval (pipeline mode)")
+    parser.add_argument("--timeout", type=float, default=600, help="per-request timeout in seconds")
+    parser.add_argument("--database-url", help="database to benchmark instead of a fresh local SQLite file")
+    parser.add_argument("--output", help="also write the report as JSON to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary working directory")
+    fake_upstreams.add_arguments(parser)
+    args = parser.parse_args()
+    original_dir = os.getcwd()
+    output = os.path.abspath(args.output) if args.output else None
+
+    work_dir = tempfile.mkdtemp(prefix="lily-bench-")
+    upstream_port, app_port = _free_port(), _free_port()
+    upstreams = multiprocessing.Process(target=_serve_upstreams, args=(args, upstream_port), daemon=True)
+    upstreams.start()
+    try:
+        _wait_for_port(upstream_port)
+        _prepare_environment(args, work_dir, f"http://127.0.0.1:{upstream_port}")
+        server = AppServer(app_port)
+        server.start()
+        try:
+            report = asyncio.run(drive(args, f"http://127.0.0.1:{app_port}"))
+        finally:
+            server.stop()
+        report["event_loop_lag"] = summarize(server.lag_samples)
+        report["upstream_calls"] = httpx.get(f"http://127.0.0.1:{upstream_port}/stats").json()
+        report["config"] = vars(args)
+    finally:
+        upstreams.terminate()
+        upstreams.join()
+        os.chdir(original_dir)
+        if args.keep:
+            print(f"Working directory kept at {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(report)
+    print(f"\nupstream calls: {json.dumps(report['upstream_calls'], sort_keys=True)}")
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
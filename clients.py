@@ -0,0 +1,166 @@
+"""
+Process-wide registry of API clients.
+
+The registry is opened in the FastAPI lifespan and shared by all requests. DeepSeek models are
+built once per (model, temperature, max_tokens) configuration with an explicit API key and base
+URL, and all of them share one keep-alive httpx pool (HTTP/2 when the h2 package is installed).
+Firecrawl's SDK talks through `requests`, so its client gets a shared keep-alive requests session.
+Nothing here reads or writes OPENAI_* environment variables, so concurrent requests cannot race.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+import requests
+from firecrawl import FirecrawlApp
+from langchain_openai import ChatOpenAI
+from requests.adapters import HTTPAdapter
+
+DEEPSEEK_API_BASE = os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com")
+FIRECRAWL_API_URL = os.getenv("FIRECRAWL_API_URL", "https://api.firecrawl.dev")
+
+# Connection pool limits, shared by all requests of this process
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "600"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+
+def _http2_supported() -> bool:
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class PooledFirecrawlApp(FirecrawlApp):
+    """
+    FirecrawlApp whose HTTP calls reuse the connections of a shared requests session
+    instead of opening a new connection per call.
+    """
+
+    def __init__(self, session: requests.Session, api_key: Optional[str] = None, api_url: Optional[str] = None):
+        super().__init__(api_key=api_key, api_url=api_url)
+        self.session = session
+
+    def _send(self, method: str, url: str, headers: Dict[str, str], retries: int, backoff_factor: float, **kwargs):
+        # Same retry-on-502 behaviour as the SDK's own request helpers, but never without a socket timeout
+        kwargs["timeout"] = kwargs.get("timeout") or HTTP_TIMEOUT_SECONDS
+        for attempt in range(retries):
+            response = self.session.request(method, url, headers=headers, **kwargs)
+            if response.status_code != 502:
+                return response
+            time.sleep(backoff_factor * (2 ** attempt))
+        return response
+
+    def _post_request(self, url, data, headers, retries=3, backoff_factor=0.5):
+        timeout = (data["timeout"] + 5000) if "timeout" in data else None
+        return self._send("POST", url, headers, retries, backoff_factor, json=data, timeout=timeout)
+
+    def _get_request(self, url, headers, retries=3, backoff_factor=0.5):
+        return self._send("GET", url, headers, retries, backoff_factor)
+
+    def _delete_request(self, url, headers, retries=3, backoff_factor=0.5):
+        return self._send("DELETE", url, headers, retries, backoff_factor)
+
+
+class ClientRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+        self._firecrawl_session: Optional[requests.Session] = None
+        self._firecrawl: Optional[PooledFirecrawlApp] = None
+        self._models: Dict[Tuple[str, float, Optional[int]], ChatOpenAI] = {}
+
+    def open(self) -> None:
+        """
+        Create the shared connection pools. Called from the FastAPI lifespan; clients requested
+        before that (e.g. by scripts that import main) open the registry on first use.
+        """
+        with self._lock:
+            if self._http_async_client is not None:
+                return
+            limits = httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            )
+            timeout = httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=10.0)
+            http2 = _http2_supported()
+            self._http_client = httpx.Client(limits=limits, timeout=timeout, http2=http2)
+            self._http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_MAX_KEEPALIVE_CONNECTIONS)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._firecrawl_session = session
+
+    async def aclose(self) -> None:
+        """
+        Close every pool. Called when the application shuts down.
+        """
+        with self._lock:
+            http_client, http_async_client = self._http_client, self._http_async_client
+            session = self._firecrawl_session
+            self._http_client = self._http_async_client = self._firecrawl_session = None
+            self._firecrawl = None
+            self._models.clear()
+        if http_async_client is not None:
+            await http_async_client.aclose()
+        if http_client is not None:
+            http_client.close()
+        if session is not None:
+            session.close()
+
+    def chat_model(self, model: str, temperature: float, max_tokens: Optional[int]) -> ChatOpenAI:
+        """
+        Return the shared DeepSeek chat model for this configuration.
+        Raises RuntimeError if DEEPSEEK_API_KEY is not set.
+        """
+        api_key = os.getenv("DEEPSEEK_API_KEY")
+        if not api_key:
+            raise RuntimeError("DEEPSEEK_API_KEY not set in environment.")
+        self.open()
+        key = (model, temperature, max_tokens)
+        with self._lock:
+            llm = self._models.get(key)
+            if llm is None:
+                llm = ChatOpenAI(
+                    model=model,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    api_key=api_key,
+                    base_url=DEEPSEEK_API_BASE,
+                    # Streams end with a usage chunk, including DeepSeek's context cache hits
+                    stream_usage=True,
+                    # Retries and timeouts are handled by resilience.py
+                    max_retries=0,
+                    http_client=self._http_client,
+                    http_async_client=self._http_async_client
+                )
+                self._models[key] = llm
+        return llm
+
+    def firecrawl(self) -> FirecrawlApp:
+        """
+        Return the shared Firecrawl client. Raises RuntimeError if FIRECRAWL_API_KEY is not set.
+        """
+        api_key = os.getenv("FIRECRAWL_API_KEY")
+        if not api_key:
+            raise RuntimeError("FIRECRAWL_API_KEY not set in environment.")
+        self.open()
+        with self._lock:
+            if self._firecrawl is None:
+                self._firecrawl = PooledFirecrawlApp(self._firecrawl_session, api_key=api_key, api_url=FIRECRAWL_API_URL)
+            return self._firecrawl
+
+
+registry = ClientRegistry()
@@ -0,0 +1,215 @@
+"""
+Per-URL store of crawled pages (data/cache/crawl_store.sqlite).
+
+Every crawled page is kept with its content hash and fetch timestamp, keyed by the target URL
+of the crawl and the page URL. A repeat crawl of the same target within CRAWL_CACHE_TTL_SECONDS
+is served from the store, and a refresh reports which pages were added, changed or removed so
+that unchanged sites do not have to go through the downstream stages again.
+
+The progress of crawls started with "wait": false is kept here as well (crawl_jobs), so
+GET /crawl_status can be answered by any uvicorn worker. Finished crawl jobs are dropped
+CRAWL_JOB_RETENTION_SECONDS after their last update.
+"""
+import hashlib
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import local_store
+
+CRAWL_CACHE_TTL_SECONDS = int(os.getenv("CRAWL_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CRAWL_JOB_RETENTION_SECONDS = int(os.getenv("CRAWL_JOB_RETENTION_SECONDS", str(24 * 3600)))
+
+# Columns of a crawl job that callers may set
+CRAWL_JOB_FIELDS = ("target_url", "status", "completed", "total", "error", "file_path", "changed")
+
+
+def _path() -> str:
+    return os.getenv("CRAWL_STORE_PATH") or local_store.store_path("crawl_store.sqlite")
+
+
+def _init(conn) -> None:
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS crawl_pages ("
+        " target_url TEXT NOT NULL, page_url TEXT NOT NULL, content_hash TEXT NOT NULL,"
+        " markdown TEXT NOT NULL, fetched_at REAL NOT NULL, PRIMARY KEY (target_url, page_url))"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS crawls ("
+        " target_url TEXT PRIMARY KEY, content_hash TEXT NOT NULL, page_count INTEGER NOT NULL,"
+        " crawled_at REAL NOT NULL, run_id TEXT)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS crawl_jobs ("
+        " crawl_id TEXT PRIMARY KEY, target_url TEXT, status TEXT NOT NULL, completed INTEGER NOT NULL DEFAULT 0,"
+        " total INTEGER NOT NULL DEFAULT 0, error TEXT, file_path TEXT, changed INTEGER, updated_at REAL NOT NULL)"
+    )
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def pages_from_crawl(crawl_status: Dict[str, Any]) -> List[Dict[str, str]]:
+    """
+    Turn a Firecrawl crawl result into a list of {"url", "markdown"} pages, sorted by URL
+    so that the same site content always produces the same knowledge base.
+    """
+    pages = {}
+    for index, item in enumerate(crawl_status.get("data") or []):
+        metadata = item.get("metadata") or {}
+        url = metadata.get("sourceURL") or metadata.get("url") or f"page-{index}"
+        markdown = item.get("markdown") or ""
+        if markdown.strip():
+            pages[url] = markdown
+    return [{"url": url, "markdown": pages[url]} for url in sorted(pages)]
+
+
+def assemble_knowledge_base(pages: List[Dict[str, str]]) -> str:
+    """
+    Join the pages into one Markdown document, keeping a source marker at every page boundary.
+    """
+    return "\n".join(f"<!-- source: {page['url']} -->\n{page['markdown']}" for page in pages)
+
+
+def load_crawl(target_url: str, max_age_seconds: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Return the stored crawl of target_url with its pages, or None if there is none
+    or it is older than max_age_seconds.
+    """
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        crawl = conn.execute("SELECT * FROM crawls WHERE target_url = ?", (target_url,)).fetchone()
+        if crawl is None:
+            return None
+        if max_age_seconds is not None and time.time() - crawl["crawled_at"] > max_age_seconds:
+            return None
+        rows = conn.execute(
+            "SELECT page_url, markdown FROM crawl_pages WHERE target_url = ? ORDER BY page_url", (target_url,)
+        ).fetchall()
+    return {
+        "target_url": target_url,
+        "content_hash": crawl["content_hash"],
+        "crawled_at": crawl["crawled_at"],
+        "run_id": crawl["run_id"],
+        "pages": [{"url": row["page_url"], "markdown": row["markdown"]} for row in rows],
+    }
+
+
+def save_crawl(target_url: str, pages: List[Dict[str, str]], run_id: Optional[str]) -> Dict[str, Any]:
+    """
+    Store a fresh crawl of target_url and report how it differs from the previous one.
+    Pages whose content hash did not change keep their row untouched apart from the fetch time.
+    """
+    now = time.time()
+    kb_hash = content_hash(assemble_knowledge_base(pages))
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            previous = conn.execute("SELECT * FROM crawls WHERE target_url = ?", (target_url,)).fetchone()
+            stored = {
+                row["page_url"]: row["content_hash"]
+                for row in conn.execute(
+                    "SELECT page_url, content_hash FROM crawl_pages WHERE target_url = ?", (target_url,)
+                )
+            }
+            added, changed, unchanged = [], [], []
+            for page in pages:
+                page_hash = content_hash(page["markdown"])
+                if page["url"] not in stored:
+                    added.append(page["url"])
+                elif stored[page["url"]] != page_hash:
+                    changed.append(page["url"])
+                else:
+                    unchanged.append(page["url"])
+                    conn.execute(
+                        "UPDATE crawl_pages SET fetched_at = ? WHERE target_url = ? AND page_url = ?",
+                        (now, target_url, page["url"])
+                    )
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO crawl_pages (target_url, page_url, content_hash, markdown, fetched_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (target_url, page["url"], page_hash, page["markdown"], now)
+                )
+            removed = sorted(set(stored) - {page["url"] for page in pages})
+            conn.executemany(
+                "DELETE FROM crawl_pages WHERE target_url = ? AND page_url = ?",
+                [(target_url, url) for url in removed]
+            )
+            # Unchanged content keeps pointing at the run that already processed it
+            content_changed = previous is None or previous["content_hash"] != kb_hash
+            conn.execute(
+                "INSERT OR REPLACE INTO crawls (target_url, content_hash, page_count, crawled_at, run_id)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (target_url, kb_hash, len(pages), now, run_id if content_changed else previous["run_id"])
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return {
+        "content_hash": kb_hash,
+        "changed": content_changed,
+        "previous_run_id": None if content_changed else previous["run_id"],
+        "added_pages": added,
+        "changed_pages": changed,
+        "removed_pages": removed,
+        "unchanged_pages": len(unchanged),
+    }
+
+
+def record_run(target_url: str, run_id: str) -> None:
+    """
+    Point the stored crawl at the run that built its knowledge base most recently.
+    """
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        conn.execute("UPDATE crawls SET run_id = ? WHERE target_url = ?", (run_id, target_url))
+
+
+def update_crawl_job(crawl_id: str, **fields: Any) -> None:
+    """
+    Create or update the progress of a crawl job (fields from CRAWL_JOB_FIELDS). Creating a job
+    also drops the finished jobs older than CRAWL_JOB_RETENTION_SECONDS.
+    """
+    unknown = set(fields) - set(CRAWL_JOB_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown crawl job fields: {sorted(unknown)}")
+    now = time.time()
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        exists = conn.execute("SELECT 1 FROM crawl_jobs WHERE crawl_id = ?", (crawl_id,)).fetchone()
+        if exists:
+            assignments = "".join(f"{name} = ?, " for name in fields)
+            conn.execute(
+                f"UPDATE crawl_jobs SET {assignments}updated_at = ? WHERE crawl_id = ?",
+                (*fields.values(), now, crawl_id)
+            )
+            return
+        conn.execute(
+            "DELETE FROM crawl_jobs WHERE status IN ('completed', 'failed', 'cancelled') AND updated_at < ?",
+            (now - CRAWL_JOB_RETENTION_SECONDS,)
+        )
+        fields.setdefault("status", "scraping")
+        conn.execute(
+            f"INSERT INTO crawl_jobs (crawl_id, {', '.join(fields)}, updated_at) VALUES (?, {'?, ' * len(fields)}?)",
+            (crawl_id, *fields.values(), now)
+        )
+
+
+def crawl_job(crawl_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the progress of a crawl job ({"crawl_id", "target_url", "status", "completed", "total"}, plus
+    "error", "file_path" and "changed" once known), or None if it is unknown or has been dropped.
+    """
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        row = conn.execute("SELECT * FROM crawl_jobs WHERE crawl_id = ?", (crawl_id,)).fetchone()
+    if row is None:
+        return None
+    job = {"crawl_id": crawl_id, **{name: row[name] for name in CRAWL_JOB_FIELDS if row[name] is not None}}
+    if "changed" in job:
+        job["changed"] = bool(job["changed"])
+    return job
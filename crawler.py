@@ -0,0 +1,125 @@
+"""
+Non-blocking helpers around the Firecrawl crawl API.
+
+The Firecrawl SDK is synchronous, so every SDK call is pushed onto a worker thread
+and the waits between status checks use asyncio.sleep. This keeps the event loop
+free while crawls are in flight, so one worker can track many crawls at once.
+
+Every call goes through resilience.call (retries, deadlines, circuit breaker). Starting a
+crawl sends an idempotency key, so a retried start never launches a second crawl; status
+checks are idempotent and may be hedged. A crawl that has not reached a terminal status
+within CRAWL_DEADLINE_SECONDS is cancelled and reported as timed out.
+
+The progress of every crawl is kept in the crawl_jobs table of the crawl store, so it can be
+read by any worker process.
+"""
+import asyncio
+import os
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Set
+
+from firecrawl import FirecrawlApp
+
+import crawl_store
+import metrics
+import resilience
+
+# Statuses after which a crawl job will not change any more
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+# Adaptive polling: start fast, back off while the crawl makes no progress
+POLL_INITIAL_INTERVAL = float(os.getenv("CRAWL_POLL_INITIAL_INTERVAL", "2"))
+POLL_MAX_INTERVAL = float(os.getenv("CRAWL_POLL_MAX_INTERVAL", "30"))
+POLL_BACKOFF_FACTOR = float(os.getenv("CRAWL_POLL_BACKOFF_FACTOR", "1.5"))
+
+# Longest a crawl may run before it is cancelled
+CRAWL_DEADLINE_SECONDS = float(os.getenv("CRAWL_DEADLINE_SECONDS", "1800"))
+
+# Crawls finishing in the background of this process; referenced until they are done
+background_tasks: Set[asyncio.Task] = set()
+
+
+async def start_crawl(fire_app: FirecrawlApp, target_url: str, params: Dict[str, Any]) -> str:
+    """
+    Submit a crawl job without waiting for it to finish and return its crawl id.
+    """
+    idempotency_key = str(uuid.uuid4())
+    response = await resilience.call(
+        "firecrawl", "crawl", lambda: asyncio.to_thread(fire_app.async_crawl_url, target_url, params, idempotency_key)
+    )
+    crawl_id = (response or {}).get("id")
+    if not crawl_id:
+        raise RuntimeError(f"Firecrawl did not return a crawl id: {response}")
+    await asyncio.to_thread(crawl_store.update_crawl_job, crawl_id, target_url=target_url, status="scraping")
+    return crawl_id
+
+
+async def wait_for_crawl(
+    fire_app: FirecrawlApp,
+    crawl_id: str,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Poll the crawl status until the job reaches a terminal status and return the last status.
+    The interval resets whenever new pages complete and grows by POLL_BACKOFF_FACTOR
+    (up to POLL_MAX_INTERVAL) while the crawl is not making progress.
+    Raises TimeoutError (after cancelling the crawl) once CRAWL_DEADLINE_SECONDS have passed.
+    """
+    interval = POLL_INITIAL_INTERVAL
+    last_completed = -1
+    finish_by = time.monotonic() + CRAWL_DEADLINE_SECONDS
+    while True:
+        crawl_status = await resilience.call(
+            "firecrawl", "poll", lambda: asyncio.to_thread(fire_app.check_crawl_status, crawl_id), idempotent=True
+        )
+        status = crawl_status.get("status")
+        completed = crawl_status.get("completed") or 0
+        print(f"current status: {status} ({completed}/{crawl_status.get('total') or 0} pages)")
+
+        await asyncio.to_thread(
+            crawl_store.update_crawl_job, crawl_id, status=status, completed=completed, total=crawl_status.get("total") or 0
+        )
+        if on_progress:
+            on_progress(crawl_status)
+
+        if status in TERMINAL_STATUSES:
+            metrics.FIRECRAWL_CREDITS.labels("crawl").inc(crawl_status.get("creditsUsed") or 0)
+            return crawl_status
+
+        if completed > last_completed:
+            interval = POLL_INITIAL_INTERVAL
+        else:
+            interval = min(interval * POLL_BACKOFF_FACTOR, POLL_MAX_INTERVAL)
+        last_completed = completed
+        if time.monotonic() + interval > finish_by:
+            await cancel_crawl(fire_app, crawl_id)
+            await asyncio.to_thread(crawl_store.update_crawl_job, crawl_id, status="failed")
+            raise TimeoutError(f"crawl {crawl_id} did not finish within {CRAWL_DEADLINE_SECONDS:.0f}s (status '{status}')")
+        await asyncio.sleep(interval)
+
+
+async def cancel_crawl(fire_app: FirecrawlApp, crawl_id: str) -> None:
+    """
+    Ask Firecrawl to stop a crawl; failures are only logged, the caller is already giving up on it.
+    """
+    try:
+        await resilience.call("firecrawl", "cancel", lambda: asyncio.to_thread(fire_app.cancel_crawl, crawl_id))
+    except Exception as e:
+        print(f"Could not cancel crawl {crawl_id}: {e}")
+
+
+
+def run_in_background(task: asyncio.Task) -> None:
+    """
+    Keep a crawl task referenced until it is done; its outcome is recorded in the crawl store,
+    so its exception is retrieved here instead of being reported as unhandled.
+    """
+    background_tasks.add(task)
+
+    def done(finished: asyncio.Task) -> None:
+        background_tasks.discard(finished)
+        if not finished.cancelled():
+            finished.exception()
+
+    task.add_done_callback(done)
@@ -1,22 +1,107 @@
-from fastapi import APIRouter, HTTPException
-import os, json, datetime
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
+from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio, os, json, base64, datetime
+from sqlalchemy import and_, inspect, or_, select, text, insert, update, Column, Integer, BigInteger, Float, String, DateTime, Index
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import entities
+import lead_metrics
+import local_store
+import metrics
+import workspace
 
 load_dotenv()  # Load .env file
 
-# Retrieve Neon database connection string from environment variables
+# Retrieve Neon database connection string from environment variables.
+# Without it (local development, tests) a SQLite file under data/cache is used instead.
 DATABASE_URL = os.getenv("NEON_DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("NEON_DATABASE_URL not set in environment variables.")
+USING_LOCAL_DATABASE = not DATABASE_URL
+if USING_LOCAL_DATABASE:
+    DATABASE_URL = f"sqlite:///{local_store.store_path('database.sqlite')}"
+    print(f"NEON_DATABASE_URL not set, using local database {DATABASE_URL}")
 
-# Create database engine and session
-engine = create_engine(DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Rows per multi-row INSERT statement when storing large files
+DB_BULK_CHUNK_SIZE = int(os.getenv("DB_BULK_CHUNK_SIZE", "1000"))
+
+# Page sizes of the /events and /customers query endpoints
+QUERY_DEFAULT_LIMIT = 50
+QUERY_MAX_LIMIT = 500
+
+# Connection pool settings. Pre-ping and a short recycle time replace connections that
+# serverless Postgres (Neon) dropped while they were idle, instead of failing on them.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+
+def async_database_url(url: str) -> Tuple[str, dict]:
+    """
+    Map a synchronous database URL onto its async driver (asyncpg / aiosqlite).
+    Returns the URL and the connect_args for create_async_engine.
+    """
+    parsed = make_url(url)
+    connect_args = {}
+    backend = parsed.get_backend_name()
+    if backend in ("postgresql", "postgres"):
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+        # asyncpg takes ssl instead of libpq's sslmode and has no channel_binding option
+        if "sslmode" in parsed.query:
+            connect_args["ssl"] = parsed.query["sslmode"]
+        parsed = parsed.difference_update_query(["sslmode", "channel_binding"])
+    elif backend == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False), connect_args
+
+
+def _engine_options(url: str) -> dict:
+    options = {"echo": os.getenv("DB_ECHO", "false").lower() == "true", "pool_pre_ping": DB_POOL_PRE_PING}
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_timeout=DB_POOL_TIMEOUT
+        )
+    return options
+
+
+# Create async database engine and session factory (set DB_ECHO=true to log every SQL statement)
+ASYNC_DATABASE_URL, _connect_args = async_database_url(DATABASE_URL)
+engine = create_async_engine(ASYNC_DATABASE_URL, connect_args=_connect_args, **_engine_options(ASYNC_DATABASE_URL))
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
 Base = declarative_base()
 
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """
+    FastAPI dependency: one session per request, closed when the request is done.
+    """
+    async with SessionLocal() as db:
+        yield db
+
+
+async def init_db() -> None:
+    """
+    Create the tables on the local fallback database (or when DB_CREATE_TABLES=true).
+    Called from the application lifespan.
+    """
+    if USING_LOCAL_DATABASE or os.getenv("DB_CREATE_TABLES", "false").lower() == "true":
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+
+async def close_db() -> None:
+    """
+    Close all pooled connections. Called when the application shuts down.
+    """
+    await engine.dispose()
+
+
 # Define the database model for the 'potential_events' table
 class PotentialEvent(Base):
     __tablename__ = "potential_events"
@@ -26,26 +111,150 @@ class PotentialEvent(Base):
     category = Column(String, nullable=False)  # Associations / Exhibitions / News
     root_url = Column(String, nullable=False)  # Root URL of the company that initiated the query
     create_time = Column('create_time', DateTime, default=datetime.datetime.utcnow)
+    __table_args__ = (
+        Index("uq_potential_events_root_url_url", "root_url", "url", unique=True),
+        # Keyset pagination of /events, newest first, optionally filtered by root_url or category
+        Index("ix_potential_events_root_url_create_time", "root_url", "create_time", "id"),
+        Index("ix_potential_events_category_create_time", "category", "create_time", "id"),
+        Index("ix_potential_events_create_time", "create_time", "id"),
+    )
 
 
-# Uncomment the following line to automatically create the table on first run
-# Base.metadata.create_all(bind=engine)
+# Tables are created on first run by init_db() for the local database, or with DB_CREATE_TABLES=true
 
 router = APIRouter()
 
+# Tables whose schema has been checked by this process
+_schema_checked = set()
+
+
+def _missing_schema(inspector, table) -> List[str]:
+    # Columns and indexes of the model that an existing table does not have yet
+    existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+    existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+    return (
+        [f"column {column.name}" for column in table.columns if column.name not in existing_columns]
+        + [f"index {index.name}" for index in table.indexes if index.name not in existing_indexes]
+    )
+
+async def ensure_schema(db: AsyncSession, model) -> None:
+    """
+    Create the table of a model if it does not exist yet. A table created by an older version of this module
+    is never changed here: if it lacks columns or indexes the request fails with 503 until
+    `python database.py migrate` (see migrate_schema) has brought it up to date.
+    """
+    if model.__tablename__ in _schema_checked:
+        return
+    table = model.__table__
+
+    def check(session) -> List[str]:
+        connection = session.connection()
+        inspector = inspect(connection)
+        if not inspector.has_table(table.name):
+            table.create(connection, checkfirst=True)
+            return []
+        return _missing_schema(inspector, table)
+
+    missing = await db.run_sync(check)
+    await db.commit()
+    if missing:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Table {table.name} is missing {', '.join(missing)}; run `python database.py migrate` to update it."
+        )
+    _schema_checked.add(model.__tablename__)
+
+async def migrate_schema(models: Optional[List[Any]] = None, dry_run: bool = False, bind=None) -> Dict[str, Dict[str, Any]]:
+    """
+    Bring the tables of the models (default: every table of this module) up to date: create missing tables,
+    add missing (nullable) columns and create missing indexes. Before a unique index is created, duplicate
+    rows left by earlier plain inserts are deleted, keeping the oldest row of each key. With dry_run nothing
+    is changed. Run it with `python database.py migrate [--dry-run]`.
+
+    Returns per table {"created", "missing", "duplicates_deleted"}.
+    """
+    models = models or [PotentialEvent, PotentialCustomer]
+    report = {}
+
+    def migrate(connection, table) -> Dict[str, Any]:
+        inspector = inspect(connection)
+        if not inspector.has_table(table.name):
+            if not dry_run:
+                table.create(connection)
+            return {"created": True, "missing": [], "duplicates_deleted": 0}
+        missing = _missing_schema(inspector, table)
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        duplicates = 0
+        for column in table.columns:
+            if column.name not in existing_columns and not dry_run:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            if index.unique:
+                columns = ", ".join(column.name for column in index.columns)
+                duplicate_rows = f"FROM {table.name} WHERE id NOT IN (SELECT MIN(id) FROM {table.name} GROUP BY {columns})"
+                if dry_run:
+                    duplicates += connection.execute(text(f"SELECT COUNT(*) {duplicate_rows}")).scalar()
+                else:
+                    duplicates += connection.execute(text(f"DELETE {duplicate_rows}")).rowcount
+            if not dry_run:
+                index.create(connection)
+        return {"created": False, "missing": missing, "duplicates_deleted": duplicates}
+
+    async with (bind or engine).begin() as conn:
+        for model in models:
+            report[model.__tablename__] = await conn.run_sync(migrate, model.__table__)
+    return report
+
+async def bulk_upsert(db: AsyncSession, model, rows: List[Dict], key_columns: List[str], update_columns: List[str]) -> int:
+    """
+    Insert rows with multi-row INSERT ... ON CONFLICT (key_columns) DO UPDATE statements of at most
+    DB_BULK_CHUNK_SIZE rows each. Rows repeating a key within the input are collapsed (last one wins).
+    Returns the number of rows written.
+    """
+    rows = list({tuple(row[column] for column in key_columns): row for row in rows}.values())
+    dialect = db.bind.dialect.name
+    with metrics.track_upsert(model.__tablename__, len(rows)):
+        for start in range(0, len(rows), DB_BULK_CHUNK_SIZE):
+            chunk = rows[start:start + DB_BULK_CHUNK_SIZE]
+            if dialect in ("postgresql", "sqlite"):
+                dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+                statement = dialect_insert(model).values(chunk)
+                statement = statement.on_conflict_do_update(
+                    index_elements=key_columns,
+                    set_={column: statement.excluded[column] for column in update_columns}
+                )
+                await db.execute(statement)
+            else:
+                # No portable upsert on other databases; the unique index still rejects duplicates
+                await db.execute(insert(model), chunk)
+    return len(rows)
+
 @router.post("/store_events_in_db")
-async def store_events_in_db(file_path: str, root_url: str):
+async def store_events_in_db(
+    root_url: str,
+    file_path: Optional[str] = None,
+    run_id: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
     """
     Reads JSON data (potential events) from the specified file path,
-    and inserts each record into the 'potential_events' table in the Neon database.
+    and upserts the records into the 'potential_events' table in the Neon database with multi-row
+    INSERT ... ON CONFLICT (root_url, url) statements of at most DB_BULK_CHUNK_SIZE rows,
+    so storing the same run again updates the rows instead of duplicating them.
     
     Parameters:
     - file_path: Path to the JSON file (e.g., data/potential_events/potential_events.json)
+    - run_id: Pipeline run whose potential_events.json is stored when file_path is omitted
     - root_url: The root URL of the company initiating the query (e.g., https://www.dupont.com/brands/tedlar.html)
     
     Returns:
-    - Information on the number of successfully inserted records
+    - Information on the number of stored records
     """
+    file_path = file_path or workspace.artifact_path("potential_events", run_id, create_dir=False)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="JSON file not found.")
     
@@ -58,30 +267,31 @@ async def store_events_in_db(file_path: str, root_url: str):
     if not isinstance(json_data, list):
         raise HTTPException(status_code=400, detail="JSON content is not a list.")
     
-    db = SessionLocal()
-    inserted_count = 0
+    now = datetime.datetime.utcnow()
+    rows = [
+        {
+            "name": item["name"],
+            "url": item["url"],
+            "category": item["category"],
+            "root_url": root_url,
+            "create_time": now
+        }
+        for item in json_data
+        # Skip incomplete data
+        if isinstance(item, dict) and all(k in item for k in ("name", "url", "category"))
+    ]
+    
     try:
-        for item in json_data:
-            # Check required fields
-            if not all(k in item for k in ("name", "url", "category")):
-                continue  # Skip incomplete data
-            event = PotentialEvent(
-                name=item["name"],
-                url=item["url"],
-                category=item["category"],
-                root_url=root_url,
-                create_time=datetime.datetime.utcnow()
-            )
-            db.add(event)
-            inserted_count += 1
-        db.commit()
+        await ensure_schema(db, PotentialEvent)
+        inserted_count = await bulk_upsert(db, PotentialEvent, rows, ["root_url", "url"], ["name", "category"])
+        await db.commit()
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error inserting records into database: {e}")
-    finally:
-        db.close()
     
-    return {"message": f"Inserted {inserted_count} events into the database."}
+    return {"message": f"Stored {inserted_count} events in the database (existing root_url + url pairs are updated)."}
 
 # Define the database model for the 'potential_customer' table
 class PotentialCustomer(Base):
@@ -97,14 +307,66 @@ class PotentialCustomer(Base):
     stakeholder_phone = Column(String(50), nullable=True)
     stakeholder_link = Column(String(200), nullable=True)  
     reasoning = Column(String(500), nullable=True)
+    root_url = Column(String, nullable=True)  # Root URL of the company whose run prioritized this lead
+    # Numeric revenue and headcount parsed from the text columns (see lead_metrics.py)
+    revenue_usd = Column(Float, nullable=True)
+    employee_count = Column(BigInteger, nullable=True)
+    parse_confidence = Column(String(10), nullable=True)  # high / medium / low / none; NULL = not parsed yet
     create_time = Column(DateTime, default=datetime.datetime.utcnow)
+    __table_args__ = (
+        Index("uq_potential_customer_company_email", "company_name", "stakeholder_email", unique=True),
+        # Keyset pagination of /customers, newest first, optionally filtered by root_url or industry
+        Index("ix_potential_customer_root_url_create_time", "root_url", "create_time", "id"),
+        Index("ix_potential_customer_industry_create_time", "industry", "create_time", "id"),
+        Index("ix_potential_customer_create_time", "create_time", "id"),
+        # Range filters and sorting on the parsed metrics
+        Index("ix_potential_customer_revenue_usd", "revenue_usd", "id"),
+        Index("ix_potential_customer_employee_count", "employee_count", "id"),
+    )
 
 
+# Fields a prioritized company needs to be stored
+CUSTOMER_REQUIRED_KEYS = [
+    "company_name",
+    "industry",
+    "revenue",
+    "size",
+    "stakeholder_name",
+    "stakeholder_position",
+    "stakeholder_email",
+    "stakeholder_phone",
+    "reasoning"
+]
+
+# Fields refreshed when a company is stored again with the same stakeholder email
+CUSTOMER_UPDATE_COLUMNS = [
+    "industry",
+    "revenue",
+    "size",
+    "stakeholder_name",
+    "stakeholder_position",
+    "stakeholder_phone",
+    "stakeholder_link",
+    "reasoning",
+    "revenue_usd",
+    "employee_count",
+    "parse_confidence"
+]
+
 @router.post("/store_prioritized_companies_in_db")
-async def store_prioritized_companies_in_db(file_path: str):
+async def store_prioritized_companies_in_db(
+    file_path: Optional[str] = None,
+    run_id: Optional[str] = None,
+    root_url: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
     """
     Reads JSON data from the specified file path (e.g., data\\prioritized_companies\\prioritized_companies.json),
-    and inserts each record into the 'potential_customer' table.
+    or from the prioritized_companies.json of the given run_id when file_path is omitted,
+    tags the records with root_url (the company whose run found them) when given,
+    replaces company names known to the entity index with their canonical spelling (see entities.py),
+    and upserts the records into the 'potential_customer' table with multi-row
+    INSERT ... ON CONFLICT (company_name, stakeholder_email) statements of at most DB_BULK_CHUNK_SIZE rows.
 
     Table schema:
       - company_name
@@ -116,8 +378,11 @@ async def store_prioritized_companies_in_db(file_path: str):
       - stakeholder_email
       - stakeholder_phone
       - reasoning
+      - root_url
+      - revenue_usd, employee_count, parse_confidence (parsed from revenue and size)
       - create_time
     """
+    file_path = file_path or workspace.artifact_path("prioritized_companies", run_id, create_dir=False)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail=f"File '{file_path}' not found.")
     
@@ -130,46 +395,292 @@ async def store_prioritized_companies_in_db(file_path: str):
     if not isinstance(json_data, list):
         raise HTTPException(status_code=400, detail="JSON content is not a list.")
     
-    db = SessionLocal()
-    inserted_count = 0
+    # Store the canonical spelling of every resolved company so name variants update the same row
     try:
-        for item in json_data:
-            # Ensure the required fields exist in item, otherwise skip or use defaults
-            required_keys = [
-                "company_name",
-                "industry",
-                "revenue",
-                "size",
-                "stakeholder_name",
-                "stakeholder_position",
-                "stakeholder_email",
-                "stakeholder_phone",
-                "reasoning"
-            ]
-            # Skip incomplete records
-            if not all(k in item for k in required_keys):
-                continue
-            
-            customer = PotentialCustomer(
-                company_name=item.get("company_name", ""),
-                industry=item.get("industry", ""),
-                revenue=item.get("revenue", ""),
-                size=item.get("size", ""),
-                stakeholder_name=item.get("stakeholder_name", ""),
-                stakeholder_position=item.get("stakeholder_position", ""),
-                stakeholder_email=item.get("stakeholder_email", ""),
-                stakeholder_phone=item.get("stakeholder_phone", ""),
-                stakeholder_link=item.get("stakeholder_link", ""),
-                reasoning=item.get("reasoning", ""),
-                create_time=datetime.datetime.utcnow()
-            )
-            db.add(customer)
-            inserted_count += 1
-        db.commit()
+        canonical = await asyncio.to_thread(
+            entities.canonical_names,
+            [item["company_name"] for item in json_data if isinstance(item, dict) and isinstance(item.get("company_name"), str)]
+        )
     except Exception as e:
-        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error resolving company names: {e}")
+    
+    now = datetime.datetime.utcnow()
+    rows = [
+        {
+            "company_name": canonical.get(str(item.get("company_name")), item.get("company_name", "")),
+            "industry": item.get("industry", ""),
+            "revenue": item.get("revenue", ""),
+            "size": item.get("size", ""),
+            "stakeholder_name": item.get("stakeholder_name", ""),
+            "stakeholder_position": item.get("stakeholder_position", ""),
+            # Empty rather than NULL so the (company_name, stakeholder_email) key also matches without an email
+            "stakeholder_email": item.get("stakeholder_email") or "",
+            "stakeholder_phone": item.get("stakeholder_phone", ""),
+            "stakeholder_link": item.get("stakeholder_link", ""),
+            "reasoning": item.get("reasoning", ""),
+            "root_url": root_url,
+            **lead_metrics.parse_metrics(item.get("revenue"), item.get("size")),
+            "create_time": now
+        }
+        for item in json_data
+        # Skip incomplete records
+        if isinstance(item, dict) and all(k in item for k in CUSTOMER_REQUIRED_KEYS)
+    ]
+    
+    try:
+        await ensure_schema(db, PotentialCustomer)
+        inserted_count = await bulk_upsert(
+            db,
+            PotentialCustomer,
+            rows,
+            ["company_name", "stakeholder_email"],
+            # Storing without root_url keeps the root_url a lead was tagged with earlier
+            CUSTOMER_UPDATE_COLUMNS + (["root_url"] if root_url else [])
+        )
+        await db.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error inserting records into potential_customer table: {e}")
-    finally:
-        db.close()
     
-    return {"message": f"Inserted {inserted_count} records into the potential_customer table."}
+    return {"message": f"Stored {inserted_count} records in the potential_customer table (existing company_name + stakeholder_email pairs are updated)."}
+
+
+# Sort fields accepted by the query endpoints ("-" prefix for descending)
+EVENT_SORT_FIELDS = ("create_time", "name", "category")
+CUSTOMER_SORT_FIELDS = ("create_time", "company_name", "industry", "revenue_usd", "employee_count")
+
+def encode_cursor(values: List[Any]) -> str:
+    """
+    Encode the sort key of the last row of a page as an opaque cursor.
+    """
+    values = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=422, detail="Invalid cursor.")
+    if not isinstance(values, list) or len(values) != 2:
+        raise HTTPException(status_code=422, detail="Invalid cursor.")
+    return values
+
+def row_to_dict(row) -> Dict[str, Any]:
+    return {
+        column.name: value.isoformat() if isinstance(value, datetime.datetime) else value
+        for column in row.__table__.columns
+        for value in [getattr(row, column.name)]
+    }
+
+async def keyset_page(
+    db: AsyncSession,
+    model,
+    filters: List[Any],
+    sort: str,
+    sort_fields: Tuple[str, ...],
+    cursor: Optional[str],
+    limit: int
+) -> Dict[str, Any]:
+    """
+    Return one page of rows ordered by (sort field, id) and the cursor of the next page.
+    Pages continue after the last returned key instead of using OFFSET, so every page costs
+    one index range scan however deep the client pages.
+    """
+    descending = sort.startswith("-")
+    field = sort.lstrip("-")
+    if field not in sort_fields:
+        raise HTTPException(status_code=422, detail=f"sort must be one of {', '.join(sort_fields)} (prefix '-' for descending).")
+    sort_column, id_column = getattr(model, field), model.id
+
+    # Rows without a value cannot be placed by the keyset comparison, so sorting on a nullable field skips them
+    if sort_column.nullable:
+        filters = filters + [sort_column.isnot(None)]
+    statement = select(model).where(*filters)
+    if cursor:
+        last_value, last_id = decode_cursor(cursor)
+        if isinstance(sort_column.type, DateTime) and last_value is not None:
+            try:
+                last_value = datetime.datetime.fromisoformat(last_value)
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=422, detail="Invalid cursor.")
+        if descending:
+            statement = statement.where(or_(sort_column < last_value, and_(sort_column == last_value, id_column < last_id)))
+        else:
+            statement = statement.where(or_(sort_column > last_value, and_(sort_column == last_value, id_column > last_id)))
+    order = (sort_column.desc(), id_column.desc()) if descending else (sort_column.asc(), id_column.asc())
+
+    # Fetch one extra row to know whether there is a next page
+    rows = (await db.execute(statement.order_by(*order).limit(limit + 1))).scalars().all()
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor([getattr(items[-1], field), items[-1].id])
+    return {"items": [row_to_dict(row) for row in items], "next_cursor": next_cursor}
+
+def _time_filters(model, created_from: Optional[datetime.datetime], created_to: Optional[datetime.datetime]) -> List[Any]:
+    filters = []
+    if created_from is not None:
+        filters.append(model.create_time >= created_from)
+    if created_to is not None:
+        filters.append(model.create_time < created_to)
+    return filters
+
+@router.get("/events")
+async def list_events(
+    root_url: Optional[str] = None,
+    category: Optional[str] = None,
+    created_from: Optional[datetime.datetime] = None,
+    created_to: Optional[datetime.datetime] = None,
+    sort: str = "-create_time",
+    limit: int = Query(QUERY_DEFAULT_LIMIT, ge=1, le=QUERY_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Page through the stored potential events.
+
+    Parameters:
+    - root_url, category: exact-match filters
+    - created_from / created_to: create_time range (ISO 8601, from inclusive, to exclusive)
+    - sort: create_time, name or category, prefixed with '-' for descending (default -create_time)
+    - limit: page size (at most 500)
+    - cursor: next_cursor of the previous page
+
+    Returns:
+    - {"items": [...], "next_cursor": "..."}; next_cursor is null on the last page
+    """
+    filters = _time_filters(PotentialEvent, created_from, created_to)
+    if root_url is not None:
+        filters.append(PotentialEvent.root_url == root_url)
+    if category is not None:
+        filters.append(PotentialEvent.category == category)
+    try:
+        await ensure_schema(db, PotentialEvent)
+        return await keyset_page(db, PotentialEvent, filters, sort, EVENT_SORT_FIELDS, cursor, limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error querying potential_events table: {e}")
+
+@router.get("/customers")
+async def list_customers(
+    root_url: Optional[str] = None,
+    industry: Optional[str] = None,
+    min_revenue_usd: Optional[float] = None,
+    max_revenue_usd: Optional[float] = None,
+    min_employees: Optional[int] = None,
+    max_employees: Optional[int] = None,
+    min_confidence: Optional[str] = None,
+    created_from: Optional[datetime.datetime] = None,
+    created_to: Optional[datetime.datetime] = None,
+    sort: str = "-create_time",
+    limit: int = Query(QUERY_DEFAULT_LIMIT, ge=1, le=QUERY_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Page through the stored prioritized companies (potential_customer table).
+
+    Parameters:
+    - root_url, industry: exact-match filters
+    - min_revenue_usd / max_revenue_usd, min_employees / max_employees: inclusive ranges on the parsed metrics
+    - min_confidence: only leads whose metrics were parsed with at least this confidence (low, medium, high)
+    - created_from / created_to: create_time range (ISO 8601, from inclusive, to exclusive)
+    - sort: create_time, company_name, industry, revenue_usd or employee_count, prefixed with '-' for descending
+      (default -create_time); sorting on revenue_usd or employee_count skips leads without that value
+    - limit: page size (at most 500)
+    - cursor: next_cursor of the previous page
+
+    Returns:
+    - {"items": [...], "next_cursor": "..."}; next_cursor is null on the last page
+    """
+    filters = _time_filters(PotentialCustomer, created_from, created_to)
+    if root_url is not None:
+        filters.append(PotentialCustomer.root_url == root_url)
+    if industry is not None:
+        filters.append(PotentialCustomer.industry == industry)
+    if min_revenue_usd is not None:
+        filters.append(PotentialCustomer.revenue_usd >= min_revenue_usd)
+    if max_revenue_usd is not None:
+        filters.append(PotentialCustomer.revenue_usd <= max_revenue_usd)
+    if min_employees is not None:
+        filters.append(PotentialCustomer.employee_count >= min_employees)
+    if max_employees is not None:
+        filters.append(PotentialCustomer.employee_count <= max_employees)
+    if min_confidence is not None:
+        if min_confidence not in lead_metrics.CONFIDENCE_LEVELS:
+            raise HTTPException(status_code=422, detail=f"min_confidence must be one of {', '.join(lead_metrics.CONFIDENCE_LEVELS)}.")
+        accepted = lead_metrics.CONFIDENCE_LEVELS[lead_metrics.CONFIDENCE_LEVELS.index(min_confidence):]
+        filters.append(PotentialCustomer.parse_confidence.in_(accepted))
+    try:
+        await ensure_schema(db, PotentialCustomer)
+        return await keyset_page(db, PotentialCustomer, filters, sort, CUSTOMER_SORT_FIELDS, cursor, limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error querying potential_customer table: {e}")
+
+
+@router.post("/customers/backfill_metrics")
+async def backfill_customer_metrics(
+    reparse: bool = False,
+    batch_size: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Fill revenue_usd, employee_count and parse_confidence for stored leads that were saved before these
+    columns existed (parse_confidence IS NULL). With reparse=true every lead is parsed again, e.g. after
+    the parser in lead_metrics.py was improved. Rows are processed in id order in batches of batch_size.
+
+    Returns:
+    - The number of updated leads and how many were parsed with each confidence
+    """
+    try:
+        await ensure_schema(db, PotentialCustomer)
+        updated, confidences, last_id = 0, {}, 0
+        while True:
+            statement = select(PotentialCustomer.id, PotentialCustomer.revenue, PotentialCustomer.size).where(PotentialCustomer.id > last_id)
+            if not reparse:
+                statement = statement.where(PotentialCustomer.parse_confidence.is_(None))
+            rows = (await db.execute(statement.order_by(PotentialCustomer.id).limit(batch_size))).all()
+            if not rows:
+                break
+            changes = [{"id": row.id, **lead_metrics.parse_metrics(row.revenue, row.size)} for row in rows]
+            await db.execute(update(PotentialCustomer), changes)
+            await db.commit()
+            for change in changes:
+                confidences[change["parse_confidence"]] = confidences.get(change["parse_confidence"], 0) + 1
+            updated += len(changes)
+            last_id = rows[-1].id
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error backfilling lead metrics: {e}")
+
+    return {"message": f"Parsed revenue and size of {updated} leads.", "updated": updated, "confidence": confidences}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Database maintenance.")
+    parser.add_argument("command", choices=["migrate"], help="migrate: bring the tables up to date (see migrate_schema)")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    args = parser.parse_args()
+
+    async def migrate_and_close() -> Dict[str, Dict[str, Any]]:
+        try:
+            return await migrate_schema(dry_run=args.dry_run)
+        finally:
+            await close_db()
+
+    result = asyncio.run(migrate_and_close())
+    for table_name, changes in result.items():
+        verb = "would delete" if args.dry_run else "deleted"
+        if changes["created"]:
+            print(f"{table_name}: {'would be created' if args.dry_run else 'created'}")
+        else:
+            print(f"{table_name}: missing {', '.join(changes['missing']) or 'nothing'}; {verb} {changes['duplicates_deleted']} duplicate rows")
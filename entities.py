@@ -0,0 +1,389 @@
+"""
+Entity resolution of extracted company names (data/cache/entity_index.sqlite).
+
+Firecrawl returns the same company under several spellings across event pages ("DuPont",
+"DuPont de Nemours, Inc.", "Dupont"). resolve() maps every raw name to a canonical entity
+that persists across runs, and records which event URLs mentioned it:
+
+1. The name is normalised into a key: accents, punctuation, parentheticals, a leading "the"
+   and trailing legal forms ("Inc.", "GmbH", "S.A.") are removed.
+2. An alias whose key (or key without spaces) is already known resolves directly.
+3. A key that extends a known key by at most ENTITY_MAX_EXTRA_TOKENS words that are only
+   legal forms or corporate noise ("group", "holding", "international"), or that such a key
+   extends, joins that entity if it is the only one ("basf group" -> "basf"). Any other extra
+   word names a different company: "siemens", "siemens energy" and "siemens healthineers"
+   stay three entities, whatever order they arrive in.
+4. Otherwise the candidates sharing enough character trigrams are read from the trigram
+   index and the best one with a Jaccard similarity of at least ENTITY_MATCH_THRESHOLD wins.
+5. Anything left becomes a new entity.
+
+Alias mention counts (which pick the canonical spelling) count every (run, source URL, name)
+observation once, so resuming or re-running a run's prioritization does not count its names again.
+Calls without a run_id cannot be told apart and always count.
+
+Candidates are only read from the posting lists of a name's rarest trigrams (per-trigram
+entity counts are kept in entity_gram_counts), so common fragments such as "sys" or "tech"
+never make a lookup scan a large part of the index and no names are compared pairwise.
+"""
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import local_store
+
+ENTITY_MATCH_THRESHOLD = float(os.getenv("ENTITY_MATCH_THRESHOLD", "0.7"))
+ENTITY_MAX_EXTRA_TOKENS = int(os.getenv("ENTITY_MAX_EXTRA_TOKENS", "2"))
+
+LEGAL_FORMS = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited", "llc", "llp", "lp", "plc",
+    "gmbh", "mbh", "ag", "se", "sa", "sas", "sarl", "spa", "srl", "nv", "bv", "ab", "asa", "oy", "oyj", "as", "kg",
+    "kgaa", "pte", "pty", "kk", "bhd", "sdn", "cv",
+}
+# Words that do not tell two companies apart when they follow a known name ("BASF Group")
+ALIAS_NOISE = {
+    "group", "grp", "holding", "holdings", "international", "intl", "global", "worldwide", "companies",
+    "enterprises", "industries", "and",
+}
+PARENTHETICAL = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def _path() -> str:
+    return os.getenv("ENTITY_INDEX_PATH") or local_store.store_path("entity_index.sqlite")
+
+
+def _init(conn) -> None:
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS entities ("
+        " id INTEGER PRIMARY KEY, canonical_name TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS entity_aliases ("
+        " name TEXT PRIMARY KEY, entity_id INTEGER NOT NULL, name_key TEXT NOT NULL, compact_key TEXT NOT NULL,"
+        " gram_count INTEGER NOT NULL, mentions INTEGER NOT NULL DEFAULT 0, run_id TEXT)"
+    )
+    # Indexes created before aliases recorded the run that added them
+    if "run_id" not in {row[1] for row in conn.execute("PRAGMA table_info(entity_aliases)")}:
+        conn.execute("ALTER TABLE entity_aliases ADD COLUMN run_id TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_entity_aliases_name_key ON entity_aliases (name_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_entity_aliases_compact_key ON entity_aliases (compact_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_entity_aliases_entity ON entity_aliases (entity_id)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS entity_grams ("
+        " gram TEXT NOT NULL, entity_id INTEGER NOT NULL, PRIMARY KEY (gram, entity_id)) WITHOUT ROWID"
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS entity_gram_counts (gram TEXT PRIMARY KEY, entities INTEGER NOT NULL)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS entity_mentions ("
+        " entity_id INTEGER NOT NULL, source_url TEXT NOT NULL, name TEXT NOT NULL, run_id TEXT, seen_at REAL NOT NULL,"
+        " PRIMARY KEY (entity_id, source_url, name))"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS entity_observations ("
+        " run_id TEXT NOT NULL, source_url TEXT NOT NULL, name TEXT NOT NULL,"
+        " PRIMARY KEY (run_id, source_url, name)) WITHOUT ROWID"
+    )
+
+
+def normalize_name(name: str) -> str:
+    """
+    Return the matching key of a company name: lowercase ASCII words without punctuation,
+    parentheticals, a leading "the" or trailing legal forms.
+    """
+    text = unicodedata.normalize("NFKD", name)
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    text = PARENTHETICAL.sub(" ", text).replace("&", " and ")
+    tokens = NON_ALNUM.sub(" ", text).split()
+
+    # Join runs of single letters so that "S.A." and "K.K." become "sa" and "kk"
+    joined, previous_single = [], False
+    for token in tokens:
+        if len(token) == 1 and previous_single:
+            joined[-1] += token
+        else:
+            joined.append(token)
+        previous_single = len(token) == 1
+    tokens = joined
+
+    if len(tokens) > 1 and tokens[0] == "the":
+        tokens = tokens[1:]
+    while len(tokens) > 1 and (tokens[-1] in LEGAL_FORMS or tokens[-1] == "and"):
+        tokens = tokens[:-1]
+    return " ".join(tokens)
+
+
+def trigrams(key: str) -> Set[str]:
+    """
+    Return the character trigrams of a key, ignoring spaces and padded at both ends.
+    """
+    padded = f"#{key.replace(' ', '')}#"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def _is_noise(tokens: List[str]) -> bool:
+    return all(token in LEGAL_FORMS or token in ALIAS_NOISE for token in tokens)
+
+
+def _prefix_match(conn, key: str) -> Optional[int]:
+    """
+    Return the single entity whose key extends this key, or that this key extends, by at most
+    ENTITY_MAX_EXTRA_TOKENS words of legal forms or corporate noise. Ambiguous or missing
+    matches return None.
+    """
+    tokens = key.split()
+    # Very short keys ("abc") extend to too many unrelated names
+    if len(tokens[0]) < 4 or ENTITY_MAX_EXTRA_TOKENS <= 0:
+        return None
+    prefixes = [
+        " ".join(tokens[:n]) for n in range(max(1, len(tokens) - ENTITY_MAX_EXTRA_TOKENS), len(tokens))
+        if _is_noise(tokens[n:])
+    ]
+    candidates = set()
+    if prefixes:
+        rows = conn.execute(
+            f"SELECT DISTINCT entity_id FROM entity_aliases WHERE name_key IN ({','.join('?' * len(prefixes))})",
+            prefixes
+        ).fetchall()
+        candidates.update(row["entity_id"] for row in rows)
+    # Keys starting with "<key> ": the range scan uses the name_key index ("!" sorts right after " ")
+    rows = conn.execute(
+        "SELECT entity_id, name_key FROM entity_aliases WHERE name_key >= ? AND name_key < ?",
+        (key + " ", key + "!")
+    ).fetchall()
+    candidates.update(
+        row["entity_id"] for row in rows
+        if len(row["name_key"].split()) - len(tokens) <= ENTITY_MAX_EXTRA_TOKENS
+        and _is_noise(row["name_key"].split()[len(tokens):])
+    )
+    return candidates.pop() if len(candidates) == 1 else None
+
+
+def _fuzzy_match(conn, grams: Set[str]) -> Optional[int]:
+    """
+    Return the entity with the most similar alias (trigram Jaccard >= ENTITY_MATCH_THRESHOLD), if any.
+    """
+    if not grams:
+        return None
+    # Jaccard >= t needs at least t * |grams| shared trigrams, so any match contains one of the
+    # |grams| - min_shared + 1 rarest trigrams; only their (short) posting lists are read
+    min_shared = max(1, math.ceil(ENTITY_MATCH_THRESHOLD * len(grams)))
+    gram_list = sorted(grams)
+    counts = {
+        row["gram"]: row["entities"]
+        for row in conn.execute(
+            f"SELECT gram, entities FROM entity_gram_counts WHERE gram IN ({','.join('?' * len(gram_list))})", gram_list
+        )
+    }
+    probe = sorted(gram_list, key=lambda gram: counts.get(gram, 0))[:len(gram_list) - min_shared + 1]
+    probe = [gram for gram in probe if counts.get(gram)]
+    if not probe:
+        return None
+    rows = conn.execute(
+        f"SELECT DISTINCT entity_id FROM entity_grams WHERE gram IN ({','.join('?' * len(probe))})", probe
+    ).fetchall()
+    if not rows:
+        return None
+    entity_ids = [row["entity_id"] for row in rows]
+    aliases = conn.execute(
+        f"SELECT entity_id, name_key, gram_count FROM entity_aliases WHERE entity_id IN ({','.join('?' * len(entity_ids))})",
+        entity_ids
+    ).fetchall()
+    best, best_similarity = None, ENTITY_MATCH_THRESHOLD
+    for alias in aliases:
+        # Sizes alone already rule out most aliases
+        if alias["gram_count"] < ENTITY_MATCH_THRESHOLD * len(grams) or len(grams) < ENTITY_MATCH_THRESHOLD * alias["gram_count"]:
+            continue
+        similarity = _jaccard(grams, trigrams(alias["name_key"]))
+        if similarity >= best_similarity and (best is None or similarity > best_similarity or alias["entity_id"] < best):
+            best, best_similarity = alias["entity_id"], similarity
+    return best
+
+
+def _match(conn, name: str, key: str, grams: Set[str]) -> Optional[int]:
+    row = conn.execute("SELECT entity_id FROM entity_aliases WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        row = conn.execute(
+            "SELECT entity_id FROM entity_aliases WHERE name_key = ? OR compact_key = ? ORDER BY entity_id LIMIT 1",
+            (key, key.replace(" ", ""))
+        ).fetchone()
+    if row is not None:
+        return row["entity_id"]
+    entity_id = _prefix_match(conn, key)
+    if entity_id is None:
+        entity_id = _fuzzy_match(conn, grams)
+    return entity_id
+
+
+def _add_alias(conn, entity_id: int, name: str, key: str, grams: Set[str], run_id: Optional[str]) -> None:
+    conn.execute(
+        "INSERT OR IGNORE INTO entity_aliases (name, entity_id, name_key, compact_key, gram_count, run_id)"
+        " VALUES (?, ?, ?, ?, ?, ?)",
+        (name, entity_id, key, key.replace(" ", ""), len(grams), run_id)
+    )
+    for gram in grams:
+        if conn.execute("INSERT OR IGNORE INTO entity_grams (gram, entity_id) VALUES (?, ?)", (gram, entity_id)).rowcount:
+            conn.execute(
+                "INSERT INTO entity_gram_counts (gram, entities) VALUES (?, 1)"
+                " ON CONFLICT (gram) DO UPDATE SET entities = entities + 1",
+                (gram,)
+            )
+
+
+def _new_observation(conn, run_id: Optional[str], source_url: Optional[str], name: str) -> bool:
+    # Whether this run has not seen the name on this source yet; run-less calls always count
+    if run_id is None:
+        return True
+    return conn.execute(
+        "INSERT OR IGNORE INTO entity_observations (run_id, source_url, name) VALUES (?, ?, ?)",
+        (run_id, source_url or "", name)
+    ).rowcount == 1
+
+
+def _refresh_canonical_names(conn, entity_ids: Iterable[int], now: float) -> None:
+    # The most mentioned spelling becomes the canonical name (ties keep the earliest alias)
+    for entity_id in entity_ids:
+        row = conn.execute(
+            "SELECT name FROM entity_aliases WHERE entity_id = ? ORDER BY mentions DESC, rowid LIMIT 1", (entity_id,)
+        ).fetchone()
+        conn.execute("UPDATE entities SET canonical_name = ?, updated_at = ? WHERE id = ?", (row["name"], now, entity_id))
+
+
+def resolve(names_by_source: Dict[Optional[str], List[str]], run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Resolve the company names found on each source URL (None for names without a known source)
+    into entities, updating the persistent index.
+    Returns one {"entity_id", "canonical_name", "aliases", "sources"} per entity, in the
+    order the entities were first mentioned; aliases and sources only cover this call.
+    """
+    now = time.time()
+    resolved: Dict[int, Dict[str, Any]] = {}
+    mention_counts: Counter = Counter()
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for source_url, names in names_by_source.items():
+                for raw_name in names:
+                    if not isinstance(raw_name, str) or not raw_name.strip():
+                        continue
+                    name = " ".join(raw_name.split())
+                    key = normalize_name(name)
+                    if not key:
+                        continue
+                    grams = trigrams(key)
+                    entity_id = _match(conn, name, key, grams)
+                    if entity_id is None:
+                        entity_id = conn.execute(
+                            "INSERT INTO entities (canonical_name, created_at, updated_at) VALUES (?, ?, ?)", (name, now, now)
+                        ).lastrowid
+                    _add_alias(conn, entity_id, name, key, grams, run_id)
+                    if _new_observation(conn, run_id, source_url, name):
+                        mention_counts[name] += 1
+                    if source_url:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO entity_mentions (entity_id, source_url, name, run_id, seen_at)"
+                            " VALUES (?, ?, ?, ?, ?)",
+                            (entity_id, source_url, name, run_id, now)
+                        )
+
+                    entry = resolved.setdefault(
+                        entity_id, {"entity_id": entity_id, "aliases": [], "sources": []}
+                    )
+                    if name not in entry["aliases"]:
+                        entry["aliases"].append(name)
+                    if source_url and source_url not in entry["sources"]:
+                        entry["sources"].append(source_url)
+            conn.executemany(
+                "UPDATE entity_aliases SET mentions = mentions + ? WHERE name = ?",
+                [(count, name) for name, count in mention_counts.items()]
+            )
+            _refresh_canonical_names(conn, resolved, now)
+            canonical = {
+                row["id"]: row["canonical_name"]
+                for row in conn.execute(
+                    f"SELECT id, canonical_name FROM entities WHERE id IN ({','.join('?' * len(resolved))})", list(resolved)
+                )
+            } if resolved else {}
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return [{**entry, "canonical_name": canonical[entity_id]} for entity_id, entry in resolved.items()]
+
+
+def index_version(exclude_run_id: Optional[str] = None) -> str:
+    """
+    Return a version of the alias index that changes whenever another run adds an alias.
+    Aliases are only ever inserted, so their count and highest rowid identify the index state;
+    the aliases first added by exclude_run_id are left out, so re-resolving a run's own names
+    does not change the version it sees.
+    """
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        row = conn.execute(
+            "SELECT COUNT(*) AS aliases, COALESCE(MAX(rowid), 0) AS last FROM entity_aliases WHERE run_id IS NOT ?",
+            (exclude_run_id,)
+        ).fetchone()
+    return f"{row['aliases']}:{row['last']}"
+
+
+def canonical_names(names: List[str]) -> Dict[str, str]:
+    """
+    Return {name: canonical name} for the names that are known aliases or share a key with one.
+    Read-only: unknown names are left out and the index is not changed.
+    """
+    mapping = {}
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        for name in names:
+            if not isinstance(name, str) or not name.strip():
+                continue
+            cleaned = " ".join(name.split())
+            key = normalize_name(cleaned)
+            row = conn.execute(
+                "SELECT e.canonical_name FROM entity_aliases a JOIN entities e ON e.id = a.entity_id"
+                " WHERE a.name = ? OR a.name_key = ? OR a.compact_key = ? ORDER BY a.name = ? DESC, a.entity_id LIMIT 1",
+                (cleaned, key, key.replace(" ", ""), cleaned)
+            ).fetchone()
+            if row is not None:
+                mapping[name] = row["canonical_name"]
+    return mapping
+
+
+def entity_sources(entity_id: int) -> List[Dict[str, Any]]:
+    """
+    Return every recorded mention of an entity: {"source_url", "name", "run_id", "seen_at"}, newest first.
+    """
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        rows = conn.execute(
+            "SELECT source_url, name, run_id, seen_at FROM entity_mentions WHERE entity_id = ? ORDER BY seen_at DESC, source_url",
+            (entity_id,)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def names_by_source(potential_data: Any, candidates: List[str]) -> Dict[Optional[str], List[str]]:
+    """
+    Group the candidates of a potential_customer.json document by the event URL they were extracted
+    from (its "sources"); candidates without a recorded source are grouped under None.
+    """
+    sources = potential_data.get("sources") if isinstance(potential_data, dict) else None
+    grouped: Dict[Optional[str], List[str]] = {}
+    seen = set()
+    for url, names in (sources or {}).items():
+        if isinstance(names, list):
+            grouped[url] = [name for name in names if isinstance(name, str)]
+            seen.update(name.strip().lower() for name in grouped[url])
+    unsourced = [name for name in candidates if name.strip().lower() not in seen]
+    if unsourced:
+        grouped[None] = unsourced
+    return grouped
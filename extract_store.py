@@ -0,0 +1,135 @@
+"""
+Per-URL store of company extraction results (data/cache/extract_store.sqlite).
+
+Event URLs are canonicalised first (https scheme, lowercase host without "www.", no default
+port, trailing slash, fragment or tracking parameters), so the same association page found
+for different target companies or with different campaign links shares one entry. Every
+successful extraction is kept with its companies and timestamp, keyed by the canonical URL
+and a hash of the extraction options; within EXTRACT_CACHE_TTL_SECONDS it is reused instead
+of calling Firecrawl again.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import local_store
+
+EXTRACT_CACHE_TTL_SECONDS = int(os.getenv("EXTRACT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+TRACKING_PARAMS = {
+    "gclid", "dclid", "fbclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "_hsenc", "_hsmi", "_ga", "_gl",
+    "ref", "ref_src", "trk",
+}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def _path() -> str:
+    return os.getenv("EXTRACT_STORE_PATH") or local_store.store_path("extract_store.sqlite")
+
+
+def _init(conn) -> None:
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS extractions ("
+        " canonical_url TEXT NOT NULL, options_hash TEXT NOT NULL, url TEXT NOT NULL, companies TEXT NOT NULL,"
+        " extracted_at REAL NOT NULL, run_id TEXT, PRIMARY KEY (canonical_url, options_hash))"
+    )
+
+
+def canonical_url(url: str) -> str:
+    """
+    Return the canonical form of an event URL used as the store key.
+    A URL that cannot be parsed at all (an unclosed IPv6 bracket) is returned stripped.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        if not parts.netloc and parts.path and not parts.scheme:
+            # Scheme-less URLs ("example.com/events") put the host into the path
+            parts = urlsplit(f"https://{url.strip()}")
+    except ValueError:
+        return url.strip()
+    scheme = (parts.scheme or "https").lower()
+    host = (parts.hostname or "").lower().rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    try:
+        port = parts.port
+    except ValueError:
+        # Malformed or out-of-range port ("example.com:99999"): keep the netloc as it is
+        port, host = None, parts.netloc.lower()
+    netloc = host if port is None or port == DEFAULT_PORTS.get(scheme) else f"{host}:{port}"
+    path = parts.path or ""
+    while "//" in path:
+        path = path.replace("//", "/")
+    path = path.rstrip("/")
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    ))
+    # http and https serve the same event pages, so both map to https
+    return urlunsplit(("https" if scheme in DEFAULT_PORTS else scheme, netloc, path, query, ""))
+
+
+def options_hash(options: Dict[str, Any]) -> str:
+    """
+    Hash the extraction options (prompt, schema, ...) so that changing them invalidates stored results.
+    """
+    return hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def load_extractions(canonical_urls: List[str], options: Dict[str, Any], max_age_seconds: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Return {canonical_url: {"url", "companies", "extracted_at", "run_id"}} for the stored extractions
+    of these URLs with the same options that are not older than max_age_seconds.
+    """
+    if not canonical_urls:
+        return {}
+    key = options_hash(options)
+    oldest = time.time() - max_age_seconds if max_age_seconds is not None else None
+    found = {}
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        # Stay below SQLite's bound-parameter limit for long URL lists
+        for start in range(0, len(canonical_urls), 500):
+            batch = canonical_urls[start:start + 500]
+            rows = conn.execute(
+                f"SELECT * FROM extractions WHERE options_hash = ? AND canonical_url IN ({','.join('?' * len(batch))})",
+                [key] + batch
+            ).fetchall()
+            for row in rows:
+                if oldest is not None and row["extracted_at"] < oldest:
+                    continue
+                found[row["canonical_url"]] = {
+                    "url": row["url"],
+                    "companies": json.loads(row["companies"]),
+                    "extracted_at": row["extracted_at"],
+                    "run_id": row["run_id"],
+                }
+    return found
+
+
+def save_extractions(results: Dict[str, Dict[str, Any]], options: Dict[str, Any], run_id: Optional[str]) -> None:
+    """
+    Store fresh extractions, given as {canonical_url: {"url", "companies"}}.
+    """
+    if not results:
+        return
+    key, now = options_hash(options), time.time()
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO extractions (canonical_url, options_hash, url, companies, extracted_at, run_id)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (canonical, key, result["url"], json.dumps(result["companies"], ensure_ascii=False), now, run_id)
+                    for canonical, result in results.items()
+                ]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
@@ -0,0 +1,195 @@
+"""
+Parallel company-name extraction from event pages.
+
+Every event URL gets its own Firecrawl extract job, submitted once (with an idempotency key, so
+a retried submit never starts a second paid job) and then polled for its status; only the free
+status polls are retried and hedged. The SDK is synchronous, so its calls run on worker threads.
+At most EXTRACT_CONCURRENCY jobs are in flight and jobs are started no faster than
+EXTRACT_RATE_PER_MINUTE. The per-URL results are merged in URL order and deduplicated;
+a URL that fails (after the retries of resilience.py) is reported in "errors" without
+aborting the others.
+
+URLs are deduplicated by their canonical form and results are kept in extract_store, so a
+page already extracted within EXTRACT_CACHE_TTL_SECONDS (for this or another target
+company) is not sent to Firecrawl again.
+"""
+import asyncio
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from firecrawl import FirecrawlApp
+from pydantic import BaseModel
+
+import extract_store
+import metrics
+import resilience
+
+EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", "5"))
+EXTRACT_RATE_PER_MINUTE = float(os.getenv("EXTRACT_RATE_PER_MINUTE", "60"))
+# Seconds between status polls of an extract job, and the longest a job may take
+EXTRACT_POLL_INTERVAL = float(os.getenv("EXTRACT_POLL_INTERVAL", "2"))
+EXTRACT_DEADLINE_SECONDS = float(os.getenv("EXTRACT_DEADLINE_SECONDS", "900"))
+
+
+# Internal schema definition for extraction result
+class ExtractSchema(BaseModel):
+    companies: List[str]
+
+
+COMPANY_EXTRACT_OPTIONS = {
+    "prompt": "Extract company names from all pages.",
+    "schema": ExtractSchema.model_json_schema(),
+    "enable_web_search": False  # Disable web search to save time
+}
+
+
+# Option names accepted by FirecrawlApp.extract and their POST /v1/extract names. async_extract
+# sends its params as they are, and the API rejects (or ignores) keys it does not know.
+EXTRACT_PARAM_NAMES = {
+    "enable_web_search": "enableWebSearch",
+    "show_sources": "showSources",
+    "system_prompt": "systemPrompt",
+}
+
+
+def request_params(options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return extract options with the SDK's snake_case names renamed to the API's camelCase ones.
+    """
+    return {EXTRACT_PARAM_NAMES.get(key, key): value for key, value in options.items()}
+
+
+class RateLimiter:
+    """
+    Spaces call starts at least 60 / per_minute seconds apart (no limit when per_minute <= 0).
+    """
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def run_extract(fire_app: FirecrawlApp, url: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Submit an extract job for one URL and poll it until it completes; return the completed status.
+    Raises RuntimeError if the job fails and TimeoutError after EXTRACT_DEADLINE_SECONDS.
+    """
+    idempotency_key = str(uuid.uuid4())
+    params = request_params(options)
+    response = await resilience.call(
+        "firecrawl", "extract",
+        lambda: asyncio.to_thread(fire_app.async_extract, [url], params, idempotency_key)
+    )
+    response = response or {}
+    job_id = response.get("id")
+    if not response.get("success", True) or not job_id:
+        raise RuntimeError(response.get("error") or f"Firecrawl did not return an extract job id: {response}")
+
+    finish_by = time.monotonic() + EXTRACT_DEADLINE_SECONDS
+    while True:
+        status = await resilience.call(
+            "firecrawl", "extract_status", lambda: asyncio.to_thread(fire_app.get_extract_status, job_id),
+            idempotent=True
+        )
+        if status.get("status") == "completed":
+            if not status.get("success", True):
+                raise RuntimeError(status.get("error") or "extraction was not successful")
+            return status
+        if status.get("status") in ("failed", "cancelled"):
+            raise RuntimeError(f"Extract job {status.get('status')}: {status.get('error')}")
+        if time.monotonic() >= finish_by:
+            raise TimeoutError(f"Extract job {job_id} did not complete within {EXTRACT_DEADLINE_SECONDS:.0f}s")
+        await asyncio.sleep(EXTRACT_POLL_INTERVAL)
+
+
+def event_urls(events: List[Dict[str, Any]]) -> List[str]:
+    """
+    Return the distinct event URLs in the order they appear in the events file.
+    URLs with the same canonical form (see extract_store.canonical_url) are kept once.
+    """
+    urls = {}
+    for event in events:
+        url = event.get("url") if isinstance(event, dict) else None
+        if isinstance(url, str) and url.strip():
+            urls.setdefault(extract_store.canonical_url(url), url.strip())
+    return list(urls.values())
+
+
+def merge_companies(per_url: Dict[str, List[str]]) -> List[str]:
+    """
+    Merge the company lists of every URL (in URL order), dropping case and whitespace duplicates.
+    """
+    companies = {}
+    for names in per_url.values():
+        for name in names:
+            if isinstance(name, str) and name.strip():
+                companies.setdefault(name.strip().lower(), name.strip())
+    return list(companies.values())
+
+
+async def extract_companies(
+    fire_app: FirecrawlApp,
+    urls: List[str],
+    options: Dict[str, Any],
+    run_id: Optional[str] = None,
+    refresh: bool = False
+) -> Dict[str, Any]:
+    """
+    Extract company names from every URL and return a potential_customer.json document:
+    {"success", "data": {"companies"}, "sources": {canonical url: [companies]}, "errors": [{"url", "error"}],
+     "cached": [canonical urls served from the extract store]}.
+    URLs extracted within EXTRACT_CACHE_TTL_SECONDS are served from the store unless refresh is set.
+    """
+    canonical = {url: extract_store.canonical_url(url) for url in urls}
+    stored = {} if refresh else await asyncio.to_thread(
+        extract_store.load_extractions, list(dict.fromkeys(canonical.values())), options,
+        extract_store.EXTRACT_CACHE_TTL_SECONDS
+    )
+    pending = [url for url in urls if canonical[url] not in stored]
+    if not refresh:
+        metrics.record_cache_lookup("extract_store", True, len(set(canonical.values()) & set(stored)))
+        metrics.record_cache_lookup("extract_store", False, len(pending))
+
+    semaphore = asyncio.Semaphore(EXTRACT_CONCURRENCY)
+    limiter = RateLimiter(EXTRACT_RATE_PER_MINUTE)
+
+    async def extract_one(url: str) -> List[str]:
+        async with semaphore:
+            await limiter.wait()
+            result = await run_extract(fire_app, url, options)
+        return list((result.get("data") or {}).get("companies") or [])
+
+    results = dict(zip(pending, await asyncio.gather(*(extract_one(url) for url in pending), return_exceptions=True)))
+    fresh, errors = {}, []
+    for url in pending:
+        if isinstance(results[url], Exception):
+            print(f"Extraction failed for {url}: {results[url]}")
+            errors.append({"url": url, "error": str(results[url])})
+        else:
+            fresh[canonical[url]] = {"url": url, "companies": results[url]}
+    # Only successful extractions are stored, so failed URLs are retried on the next run
+    await asyncio.to_thread(extract_store.save_extractions, fresh, options, run_id)
+
+    sources = {}
+    for url in urls:
+        entry = stored.get(canonical[url]) or fresh.get(canonical[url])
+        if entry is not None:
+            sources[canonical[url]] = entry["companies"]
+    return {
+        "success": bool(sources),
+        "data": {"companies": merge_companies(sources)},
+        "sources": sources,
+        "errors": errors,
+        "cached": [canonical[url] for url in urls if canonical[url] in stored],
+    }
@@ -0,0 +1,268 @@
+"""
+Durable pipeline job queue (data/cache/job_queue.sqlite).
+
+Jobs are rows in SQLite, so the queue needs no broker and is shared by every process on
+the host: the web tier (any number of uvicorn workers) enqueues jobs and reads their state
+and events, and worker processes (worker.py, or the worker embedded in the app) claim and
+run them.
+
+- A claimed job carries a lease: the worker that owns it renews the lease every
+  JOB_HEARTBEAT_SECONDS, and a job whose lease has not been renewed for JOB_LEASE_SECONDS
+  (the worker crashed or hung) is claimed again by another worker. The stage manifest makes
+  the new attempt skip the stages that had already finished.
+- Every claim increments the job's attempt number, which fences the previous owner: state
+  changes and heartbeats of an attempt that lost its lease are rejected.
+- A job is given up after JOB_MAX_ATTEMPTS claims. A job whose stage fails is not retried;
+  it ends as "failed" and can be resumed.
+- Every progress event of a job is stored with a per-job sequence number, so subscribers
+  on any web worker can replay and follow it (Server-Sent Events with Last-Event-ID).
+"""
+import datetime
+import json
+import os
+import socket
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import local_store
+
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", str(JOB_LEASE_SECONDS / 4)))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Job statuses after which no more events are published
+FINISHED_STATUSES = {"completed", "failed"}
+
+
+class LeaseLostError(RuntimeError):
+    """
+    Raised when a worker writes to a job it no longer owns.
+    """
+
+
+def _path() -> str:
+    return os.getenv("JOB_QUEUE_PATH") or local_store.store_path("job_queue.sqlite")
+
+
+def _init(conn) -> None:
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        " job_id TEXT PRIMARY KEY, params TEXT NOT NULL, status TEXT NOT NULL, stages TEXT NOT NULL,"
+        " error TEXT, attempt INTEGER NOT NULL DEFAULT 0, worker_id TEXT, lease_expires_at REAL,"
+        " created_at REAL NOT NULL, updated_at REAL NOT NULL, finished_at REAL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS job_events ("
+        " job_id TEXT NOT NULL, event_id INTEGER NOT NULL, event TEXT NOT NULL, data TEXT NOT NULL,"
+        " created_at REAL NOT NULL, PRIMARY KEY (job_id, event_id))"
+    )
+
+
+@contextmanager
+def _transaction() -> Iterator[Any]:
+    # BEGIN IMMEDIATE takes the write lock up front, so two workers never claim the same job
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def summary(row: Any) -> Dict[str, Any]:
+    """
+    Return the public state of a job row (the GET /pipeline/{job_id} response and "status" event data).
+    """
+    return {
+        "job_id": row["job_id"],
+        "status": row["status"],
+        "stages": json.loads(row["stages"]),
+        "error": row["error"],
+        "attempt": row["attempt"],
+        "worker_id": row["worker_id"],
+        "created_at": datetime.datetime.utcfromtimestamp(row["created_at"]).isoformat(),
+    }
+
+
+def _add_event(conn, job_id: str, event: str, data: Dict[str, Any]) -> int:
+    row = conn.execute("SELECT COALESCE(MAX(event_id), -1) + 1 AS next_id FROM job_events WHERE job_id = ?", (job_id,)).fetchone()
+    conn.execute(
+        "INSERT INTO job_events (job_id, event_id, event, data, created_at) VALUES (?, ?, ?, ?, ?)",
+        (job_id, row["next_id"], event, json.dumps(data, ensure_ascii=False, default=str), time.time())
+    )
+    return row["next_id"]
+
+
+def enqueue(job_id: str, params: Dict[str, Any]) -> bool:
+    """
+    Queue a job, replacing a finished job with the same id and its events.
+    Returns False if a job with this id is still queued or running.
+    """
+    now = time.time()
+    with _transaction() as conn:
+        row = conn.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is not None and row["status"] not in FINISHED_STATUSES:
+            return False
+        conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+        conn.execute(
+            "INSERT OR REPLACE INTO jobs (job_id, params, status, stages, error, attempt, worker_id, lease_expires_at,"
+            " created_at, updated_at, finished_at) VALUES (?, ?, 'queued', '{}', NULL, 0, NULL, NULL, ?, ?, NULL)",
+            (job_id, json.dumps(params), now, now)
+        )
+        job = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        _add_event(conn, job_id, "status", summary(job))
+    return True
+
+
+def claim(worker_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Lease the oldest queued job, or a running job whose lease has expired, to a worker.
+    Returns {"job_id", "params", "attempt", "recovered", "created_at"} or None if there is nothing to run.
+    """
+    now = time.time()
+    with _transaction() as conn:
+        # Jobs whose workers keep dying are given up instead of being claimed forever
+        abandoned = conn.execute(
+            "SELECT job_id FROM jobs WHERE status = 'running' AND lease_expires_at < ? AND attempt >= ?",
+            (now, JOB_MAX_ATTEMPTS)
+        ).fetchall()
+        for row in abandoned:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, worker_id = NULL, lease_expires_at = NULL,"
+                " updated_at = ?, finished_at = ? WHERE job_id = ?",
+                (f"Worker lease expired {JOB_MAX_ATTEMPTS} times; giving up.", now, now, row["job_id"])
+            )
+            job = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (row["job_id"],)).fetchone()
+            _add_event(conn, row["job_id"], "status", summary(job))
+
+        row = conn.execute(
+            "SELECT job_id, params, status, attempt, created_at FROM jobs"
+            " WHERE status = 'queued' OR (status = 'running' AND lease_expires_at < ?)"
+            " ORDER BY created_at LIMIT 1",
+            (now,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', attempt = attempt + 1, worker_id = ?, lease_expires_at = ?,"
+            " updated_at = ? WHERE job_id = ?",
+            (worker_id, now + JOB_LEASE_SECONDS, now, row["job_id"])
+        )
+    return {
+        "job_id": row["job_id"],
+        "params": json.loads(row["params"]),
+        "attempt": row["attempt"] + 1,
+        "recovered": row["status"] == "running",
+        "created_at": datetime.datetime.utcfromtimestamp(row["created_at"]),
+    }
+
+
+def heartbeat(job_id: str, worker_id: str, attempt: int) -> bool:
+    """
+    Renew a job's lease. Returns False if the attempt no longer owns the job.
+    """
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        cursor = conn.execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE job_id = ? AND worker_id = ? AND attempt = ? AND status = 'running'",
+            (time.time() + JOB_LEASE_SECONDS, job_id, worker_id, attempt)
+        )
+    return cursor.rowcount == 1
+
+
+def publish(
+    job_id: str,
+    worker_id: str,
+    attempt: int,
+    event: str,
+    data: Dict[str, Any],
+    state: Dict[str, Any]
+) -> int:
+    """
+    Store an event of a running job together with its new state ({"status", "stages", "error"})
+    and return the event id. Raises LeaseLostError if the attempt no longer owns the job.
+    """
+    now = time.time()
+    finished = state["status"] in FINISHED_STATUSES
+    with _transaction() as conn:
+        cursor = conn.execute(
+            "UPDATE jobs SET status = ?, stages = ?, error = ?, updated_at = ?, finished_at = ?,"
+            " worker_id = CASE WHEN ? THEN NULL ELSE worker_id END,"
+            " lease_expires_at = CASE WHEN ? THEN NULL ELSE lease_expires_at END"
+            " WHERE job_id = ? AND worker_id = ? AND attempt = ? AND status = 'running'",
+            (state["status"], json.dumps(state["stages"]), state["error"], now, now if finished else None,
+             finished, finished, job_id, worker_id, attempt)
+        )
+        if cursor.rowcount != 1:
+            raise LeaseLostError(f"Job '{job_id}' attempt {attempt} is no longer owned by {worker_id}.")
+        return _add_event(conn, job_id, event, data)
+
+
+def release(job_id: str, worker_id: str, attempt: int) -> bool:
+    """
+    Put a job back in the queue when its worker shuts down, without counting the attempt.
+    """
+    now = time.time()
+    with _transaction() as conn:
+        cursor = conn.execute(
+            "UPDATE jobs SET status = 'queued', attempt = attempt - 1, worker_id = NULL, lease_expires_at = NULL,"
+            " updated_at = ? WHERE job_id = ? AND worker_id = ? AND attempt = ? AND status = 'running'",
+            (now, job_id, worker_id, attempt)
+        )
+        if cursor.rowcount != 1:
+            return False
+        job = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        _add_event(conn, job_id, "status", summary(job))
+    return True
+
+
+def get(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the summary of a job, or None if it is unknown.
+    """
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return summary(row) if row else None
+
+
+def events(job_id: str, after: int = -1) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    """
+    Return the job status and its events with an id greater than `after`, read together so
+    that a finished status guarantees every event of the job is in the list.
+    """
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            rows = conn.execute(
+                "SELECT event_id, event, data FROM job_events WHERE job_id = ? AND event_id > ? ORDER BY event_id",
+                (job_id, after)
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+    return (
+        row["status"] if row else None,
+        [{"id": r["event_id"], "event": r["event"], "data": json.loads(r["data"])} for r in rows],
+    )
+
+
+def counts(timeout: float = 30) -> Dict[str, int]:
+    """
+    Return the number of jobs per status, waiting at most `timeout` seconds for a lock.
+    """
+    with local_store.connect(_path(), timeout=timeout) as conn:
+        _init(conn)
+        rows = conn.execute("SELECT status, COUNT(*) AS jobs FROM jobs GROUP BY status").fetchall()
+    return {row["status"]: row["jobs"] for row in rows}
@@ -0,0 +1,145 @@
+"""
+Token-aware condensing of large knowledge bases.
+
+Knowledge bases that fit KB_SINGLE_PASS_TOKENS are passed through unchanged. Larger ones are
+split into chunks of at most KB_CHUNK_TOKENS along page boundaries, every chunk is summarised
+in parallel (at most KB_SUMMARY_CONCURRENCY calls at a time) and the summaries replace the raw
+content. If the summaries are still too large the step repeats on them.
+"""
+import asyncio
+import os
+import re
+from functools import lru_cache
+from typing import Any, List, Optional
+
+import tiktoken
+from langchain.prompts import ChatPromptTemplate
+
+import llm_cache
+
+KB_SINGLE_PASS_TOKENS = int(os.getenv("KB_SINGLE_PASS_TOKENS", "48000"))
+KB_CHUNK_TOKENS = int(os.getenv("KB_CHUNK_TOKENS", "6000"))
+KB_SUMMARY_CONCURRENCY = int(os.getenv("KB_SUMMARY_CONCURRENCY", "8"))
+
+# Page boundary marker written by crawl_store.assemble_knowledge_base
+PAGE_MARKER = re.compile(r"^<!-- source: .* -->$", re.MULTILINE)
+
+CHUNK_PROMPT = ChatPromptTemplate.from_template(
+    "You are an expert analyst preparing material for a company profile. "
+    "Summarize the following part of a company website in English. Keep every concrete fact about the company name, "
+    "website, industry, products and services and their features, unique selling points, use cases, value proposition, "
+    "customer pain points, target industries, ideal customers, case studies and testimonials. "
+    "Drop navigation text, legal boilerplate and repeated content. Output plain Markdown only.\n\n"
+    "Website content (part {index} of {total}):\n\n{chunk}"
+)
+
+
+# Characters per token assumed when the tiktoken encoding cannot be loaded
+FALLBACK_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    # DeepSeek does not publish a tiktoken encoding; cl100k_base is a close, conservative estimate.
+    # tiktoken downloads the encoding on first use, so hosts without internet access fall back to an estimate.
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"tiktoken encoding unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // FALLBACK_CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_pages(markdown: str) -> List[str]:
+    """
+    Split a knowledge base on its page markers, keeping each marker with its page.
+    """
+    starts = [match.start() for match in PAGE_MARKER.finditer(markdown)]
+    if not starts:
+        return [markdown]
+    if starts[0] != 0:
+        starts.insert(0, 0)
+    bounds = starts + [len(markdown)]
+    return [markdown[bounds[i]:bounds[i + 1]].strip("\n") for i in range(len(starts))]
+
+
+def _split_oversized(text: str, max_tokens: int) -> List[str]:
+    # Split on paragraphs first, and hard-split paragraphs that are still too long
+    encoding = _encoding()
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        if count_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+        elif encoding is None:
+            step = max_tokens * FALLBACK_CHARS_PER_TOKEN
+            pieces.extend(paragraph[start:start + step] for start in range(0, len(paragraph), step))
+        else:
+            tokens = encoding.encode(paragraph, disallowed_special=())
+            pieces.extend(encoding.decode(tokens[start:start + max_tokens]) for start in range(0, len(tokens), max_tokens))
+    return pieces
+
+
+def chunk_knowledge_base(markdown: str, max_tokens: Optional[int] = None) -> List[str]:
+    """
+    Pack pages (or, for oversized pages, paragraphs) greedily into chunks of at most max_tokens
+    (KB_CHUNK_TOKENS by default).
+    """
+    max_tokens = max_tokens or KB_CHUNK_TOKENS
+    pieces = []
+    for page in split_pages(markdown):
+        if count_tokens(page) <= max_tokens:
+            pieces.append(page)
+        else:
+            pieces.extend(_split_oversized(page, max_tokens))
+
+    chunks, current, current_tokens = [], [], 0
+    for piece in pieces:
+        piece_tokens = count_tokens(piece)
+        if current and current_tokens + piece_tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+async def summarize_chunks(chunks: List[str], llm: Any) -> List[str]:
+    """
+    Summarise every chunk in parallel with at most KB_SUMMARY_CONCURRENCY calls in flight.
+    """
+    semaphore = asyncio.Semaphore(KB_SUMMARY_CONCURRENCY)
+
+    async def summarize(index: int, chunk: str) -> str:
+        async with semaphore:
+            messages = CHUNK_PROMPT.format_messages(index=index + 1, total=len(chunks), chunk=chunk)
+            result = await llm_cache.cached_ainvoke(llm, messages)
+            return result.content.strip()
+
+    return await asyncio.gather(*(summarize(i, chunk) for i, chunk in enumerate(chunks)))
+
+
+async def condense(markdown: str, llm: Any) -> dict:
+    """
+    Return {"content", "chunks", "rounds"} where content fits KB_SINGLE_PASS_TOKENS.
+    """
+    chunk_count, rounds = 0, 0
+    tokens = count_tokens(markdown)
+    while tokens > KB_SINGLE_PASS_TOKENS:
+        chunks = chunk_knowledge_base(markdown)
+        summaries = await summarize_chunks(chunks, llm)
+        markdown = "\n\n".join(summaries)
+        chunk_count += len(chunks)
+        rounds += 1
+        previous_tokens, tokens = tokens, count_tokens(markdown)
+        if tokens >= previous_tokens:
+            # Summaries no longer shrink the content; hand over what we have
+            break
+    return {"content": markdown, "chunks": chunk_count, "rounds": rounds}
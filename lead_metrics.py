@@ -0,0 +1,143 @@
+"""
+Normalisation of the free-text revenue and size of prioritized companies.
+
+The LLM writes revenue and headcount as text ("$78.7 billion (2023)", "Over 112,000 employees",
+"1,000-5,000 employees"). parse_metrics turns them into revenue_usd, employee_count and a
+parse_confidence so the database can filter and sort leads by them:
+
+- high: a single figure (in US dollars for revenue)
+- medium: a qualified figure ("over", "approximately", "est.", "+")
+- low: a range (its midpoint is stored) or a revenue converted from another currency
+- none: nothing could be parsed
+
+parse_confidence is the lower of the two fields' confidences.
+"""
+import re
+from typing import Dict, Optional, Tuple
+
+CONFIDENCE_LEVELS = ("none", "low", "medium", "high")
+
+# Approximate conversion rates used for non-USD revenues (stored with low confidence)
+USD_PER_UNIT = {
+    "USD": 1.0,
+    "EUR": 1.08,
+    "GBP": 1.27,
+    "CHF": 1.12,
+    "JPY": 0.0067,
+    "CNY": 0.14,
+    "KRW": 0.00075,
+    "INR": 0.012,
+    "CAD": 0.73,
+    "AUD": 0.66,
+    "SEK": 0.095,
+}
+
+# The currency mentioned first in the text wins. A bare "$" is only US dollars when it is not
+# part of a prefixed dollar sign such as C$ or A$.
+CURRENCY_PATTERNS = [
+    ("USD", re.compile(r"US\$|USD\b|(?<![A-Za-z])\$")),
+    ("EUR", re.compile(r"€|EUR\b|euros?\b", re.IGNORECASE)),
+    ("GBP", re.compile(r"£|GBP\b")),
+    ("CHF", re.compile(r"CHF\b")),
+    ("JPY", re.compile(r"JPY\b|¥|yen\b", re.IGNORECASE)),
+    ("CNY", re.compile(r"CNY\b|RMB\b|yuan\b", re.IGNORECASE)),
+    ("KRW", re.compile(r"KRW\b|₩|won\b", re.IGNORECASE)),
+    ("INR", re.compile(r"INR\b|₹|rupees?\b", re.IGNORECASE)),
+    ("CAD", re.compile(r"CAD\b|C\$")),
+    ("AUD", re.compile(r"AUD\b|A\$")),
+    ("SEK", re.compile(r"SEK\b")),
+]
+
+SCALES = {
+    "thousand": 1e3, "k": 1e3,
+    "million": 1e6, "mn": 1e6, "mm": 1e6, "m": 1e6,
+    "billion": 1e9, "bn": 1e9, "b": 1e9,
+    "trillion": 1e12, "tn": 1e12, "t": 1e12,
+}
+
+SCALE = r"trillion|billion|million|thousand|bn|tn|mn|mm|[kmbt]"
+
+# A number with thousands separators or decimals, an optional range end and an optional scale word;
+# the low end of a range may carry its own scale ("$50M-$100M", "500K to 2M")
+AMOUNT = re.compile(
+    rf"(?P<low>\d+(?:,\d{{3}})*(?:\.\d+)?)(?:\s*(?P<low_scale>{SCALE})\b)?"
+    r"(?:\s*(?:-|–|to)\s*(?:[A-Z]{0,2}[$€£¥])?(?P<high>\d+(?:,\d{3})*(?:\.\d+)?))?"
+    rf"(?:\s*(?P<scale>{SCALE})\b)?",
+    re.IGNORECASE
+)
+QUALIFIER = re.compile(r"\b(over|more than|above|approx\w*|about|around|nearly|almost|roughly|est\w*|circa|ca\.|up to)\b|~|\+", re.IGNORECASE)
+YEAR = re.compile(r"^(19|20)\d{2}$")
+
+
+def _number(text: str) -> float:
+    return float(text.replace(",", ""))
+
+
+def _parse_amount(text: str, scaled_only: bool) -> Optional[Tuple[float, bool]]:
+    """
+    Return (value, is_range) for the first amount in text, skipping bare years.
+    With scaled_only, a bare number only counts if nothing better is found.
+    """
+    fallback = None
+    for match in AMOUNT.finditer(text):
+        low, high = match.group("low"), match.group("high")
+        # Without its own scale, the low end of a range shares the scale of the high end and vice versa
+        low_scale = (match.group("low_scale") or match.group("scale") or "").lower()
+        scale = (match.group("scale") or match.group("low_scale") or "").lower()
+        if not scale and not high and YEAR.match(low):
+            continue
+        value = _number(low) * SCALES.get(low_scale, 1)
+        if high:
+            value = (value + _number(high) * SCALES.get(scale, 1)) / 2
+        if scale or not scaled_only:
+            return value, bool(high)
+        if fallback is None:
+            fallback = (value, bool(high))
+    return fallback
+
+
+def parse_revenue(text: Optional[str]) -> Tuple[Optional[float], str]:
+    """
+    Parse a revenue text into (US dollars, confidence).
+    """
+    if not text:
+        return None, "none"
+    amount = _parse_amount(text, scaled_only=True)
+    if amount is None:
+        return None, "none"
+    value, is_range = amount
+    mentions = [(match.start(), code) for code, pattern in CURRENCY_PATTERNS for match in [pattern.search(text)] if match]
+    currency = min(mentions)[1] if mentions else "USD"
+    value = round(value * USD_PER_UNIT[currency])
+    if is_range or currency != "USD":
+        return value, "low"
+    if QUALIFIER.search(text):
+        return value, "medium"
+    return value, "high"
+
+
+def parse_employee_count(text: Optional[str]) -> Tuple[Optional[int], str]:
+    """
+    Parse a company size text into (employees, confidence).
+    """
+    if not text:
+        return None, "none"
+    amount = _parse_amount(text, scaled_only=False)
+    if amount is None:
+        return None, "none"
+    value, is_range = amount
+    if is_range:
+        return int(round(value)), "low"
+    if QUALIFIER.search(text):
+        return int(round(value)), "medium"
+    return int(round(value)), "high"
+
+
+def parse_metrics(revenue: Optional[str], size: Optional[str]) -> Dict[str, object]:
+    """
+    Return the revenue_usd, employee_count and parse_confidence columns for a lead.
+    """
+    revenue_usd, revenue_confidence = parse_revenue(revenue)
+    employee_count, size_confidence = parse_employee_count(size)
+    confidence = min(revenue_confidence, size_confidence, key=CONFIDENCE_LEVELS.index)
+    return {"revenue_usd": revenue_usd, "employee_count": employee_count, "parse_confidence": confidence}
@@ -0,0 +1,253 @@
+"""
+Content-addressed cache for LLM responses.
+
+Responses are keyed on a SHA-256 of the model, its sampling parameters, the API base and the
+fully rendered messages, so any change to a prompt template or input file produces a new key.
+Lookups go through an in-memory LRU tier first and a SQLite tier (data/cache/llm_cache.sqlite)
+second; the SQLite tier survives restarts, is shared by all workers and is bounded by a TTL
+and a total size limit. Identical calls that are already in flight are coalesced.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, convert_to_messages
+
+import local_store
+import metrics
+import resilience
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH")
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+
+class LLMCache:
+    """
+    Two-tier (memory LRU + SQLite) cache of LLM response texts.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int, memory_entries: int, max_bytes: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+        with local_store.connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, model TEXT, content TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)")
+
+    def _count(self, event: str, value: int = 1) -> None:
+        self.counters[event] += value
+        metrics.LLM_CACHE_EVENTS.labels(event).inc(value)
+
+    @staticmethod
+    def make_key(llm: Any, messages: List[BaseMessage]) -> str:
+        """
+        Hash the model, its parameters and the rendered messages into a cache key.
+        """
+        payload = {
+            "model": getattr(llm, "model_name", None),
+            "temperature": getattr(llm, "temperature", None),
+            "max_tokens": getattr(llm, "max_tokens", None),
+            "api_base": getattr(llm, "openai_api_base", None),
+            "messages": [{"role": m.type, "content": m.content} for m in messages],
+        }
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        content, created_at = entry
+        if time.time() - created_at > self.ttl_seconds:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return content
+
+    def _memory_put(self, key: str, content: str, created_at: float) -> None:
+        self._memory[key] = (content, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        now = time.time()
+        with local_store.connect(self.path) as conn:
+            row = conn.execute("SELECT content, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row["created_at"] > self.ttl_seconds:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            return row["content"], row["created_at"]
+
+    def _disk_put(self, key: str, model: Optional[str], content: str) -> None:
+        now = time.time()
+        size = len(content.encode("utf-8"))
+        with local_store.connect(self.path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, content, size, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, content, size, now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now: float) -> None:
+        # Drop expired entries, then the least recently used ones until the size limit holds
+        expired = conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        evicted = 0
+        if total > self.max_bytes:
+            rows = conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access").fetchall()
+            stale_keys = []
+            for row in rows:
+                if total <= self.max_bytes:
+                    break
+                stale_keys.append((row["key"],))
+                total -= row["size"]
+            conn.executemany("DELETE FROM llm_cache WHERE key = ?", stale_keys)
+            evicted = len(stale_keys)
+        self._count("evictions", max(expired, 0) + evicted)
+
+    async def get(self, key: str) -> Optional[str]:
+        content = self._memory_get(key)
+        if content is not None:
+            self._count("memory_hits")
+            return content
+        entry = await asyncio.to_thread(self._disk_get, key)
+        if entry is not None:
+            self._count("disk_hits")
+            self._memory_put(key, entry[0], entry[1])
+            return entry[0]
+        return None
+
+    async def put(self, key: str, model: Optional[str], content: str) -> None:
+        self._memory_put(key, content, time.time())
+        await asyncio.to_thread(self._disk_put, key, model, content)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        with local_store.connect(self.path) as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        return {
+            **self.counters,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": entries,
+            "disk_bytes": size,
+        }
+
+
+_cache: Optional[LLMCache] = None
+
+
+def get_cache() -> LLMCache:
+    global _cache
+    if _cache is None:
+        path = LLM_CACHE_PATH or local_store.store_path("llm_cache.sqlite")
+        _cache = LLMCache(path, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MEMORY_ENTRIES, LLM_CACHE_MAX_BYTES)
+    return _cache
+
+
+async def _ainvoke(llm: Any, messages: List[BaseMessage]) -> AIMessage:
+    # The actual DeepSeek call, with retries and deadlines (see resilience.py) and its token usage recorded
+    model = getattr(llm, "model_name", None)
+    result = await resilience.call("deepseek", model or "unknown", lambda: llm.ainvoke(messages), idempotent=True)
+    metrics.record_llm_usage(model, messages, result.content if isinstance(result.content, str) else "", result)
+    return result
+
+
+async def cached_ainvoke(llm: Any, messages: List[Any]) -> AIMessage:
+    """
+    Drop-in replacement for `await llm.ainvoke(messages)` that serves repeated calls from the cache.
+    Only the response text is cached, so the returned message carries no response metadata on a hit.
+    """
+    messages = convert_to_messages(messages)
+    if not LLM_CACHE_ENABLED:
+        return await _ainvoke(llm, messages)
+
+    cache = get_cache()
+    key = cache.make_key(llm, messages)
+    content = await cache.get(key)
+    if content is not None:
+        return AIMessage(content=content)
+
+    # Coalesce identical calls that are already waiting for the model
+    pending = cache._in_flight.get(key)
+    if pending is not None:
+        cache._count("coalesced")
+        try:
+            return AIMessage(content=await asyncio.shield(pending))
+        except asyncio.CancelledError:
+            # Only fall back to our own call if the original caller was cancelled, not us
+            if not pending.cancelled():
+                raise
+
+    cache._count("misses")
+    future = asyncio.get_running_loop().create_future()
+    cache._in_flight[key] = future
+    try:
+        result = await _ainvoke(llm, messages)
+        if isinstance(result.content, str) and result.content.strip():
+            await cache.put(key, getattr(llm, "model_name", None), result.content)
+        future.set_result(result.content)
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Mark the exception as retrieved when nobody else was waiting for this call
+        future.exception()
+        raise
+    finally:
+        cache._in_flight.pop(key, None)
+
+
+async def cached_astream(llm: Any, messages: List[Any]) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of cached_ainvoke: yields the response text as the model produces it.
+    A cached response is yielded as a single chunk; a streamed response is cached once it has
+    completed, so a stream abandoned by its client is never stored.
+    """
+    messages = convert_to_messages(messages)
+    cache = get_cache() if LLM_CACHE_ENABLED else None
+    key = cache.make_key(llm, messages) if cache else None
+    if cache:
+        content = await cache.get(key)
+        if content is not None:
+            yield content
+            return
+        cache._count("misses")
+
+    parts = []
+    usage_chunk = None
+    model = getattr(llm, "model_name", None)
+    async for chunk in resilience.stream("deepseek", model or "unknown", lambda: llm.astream(messages)):
+        if getattr(chunk, "usage_metadata", None):
+            usage_chunk = chunk
+        if isinstance(chunk.content, str) and chunk.content:
+            parts.append(chunk.content)
+            yield chunk.content
+
+    content = "".join(parts)
+    metrics.record_llm_usage(model, messages, content, usage_chunk)
+    if cache and content.strip():
+        await cache.put(key, getattr(llm, "model_name", None), content)
@@ -0,0 +1,42 @@
+"""
+Shared helpers for the local SQLite stores kept under data/cache/.
+
+SQLite needs no external service and is safe to share between uvicorn workers on one host.
+Connections are short-lived and opened per operation, so the helpers can be called from
+worker threads via asyncio.to_thread.
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator
+
+# Directory holding the local cache databases
+CACHE_DIR = os.getenv("LOCAL_CACHE_DIR", os.path.join("data", "cache"))
+
+
+def store_path(file_name: str) -> str:
+    """
+    Return the path of a database file inside CACHE_DIR, creating the directory if needed.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, file_name)
+
+
+@contextmanager
+def connect(path: str, timeout: float = 30) -> Iterator[sqlite3.Connection]:
+    """
+    Open a SQLite connection in autocommit mode, tuned for several concurrent processes,
+    and close it when the block exits. `timeout` is how long to wait for a lock held by
+    another connection.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+    finally:
+        conn.close()
@@ -1,36 +1,116 @@
 from fastapi import FastAPI, HTTPException, Request, Body
 import os
-import time
+import asyncio
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from firecrawl import FirecrawlApp
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
-import re
 import json
 import datetime
+import time
 from sqlalchemy import create_engine, Column, Integer, String, DateTime
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import database
 from database import router as db_router
-from pydantic import BaseModel
-from typing import List
-from fastapi.responses import HTMLResponse
+import crawler
+import crawl_store
+import workspace
+import pipeline
+import job_queue
+import llm_cache
+import kb_summary
+import entities
+import prioritization
+import prescore
+import prompts
+import extraction
+import extract_store
+import structured_output
+import manifest
+import clients
+import metrics
+from pydantic import BaseModel, Field, field_validator
+from typing import Awaitable, Callable, List, Literal, Optional
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from starlette.routing import Match
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI()
+# Run a pipeline job worker inside the app process; turn off when pipelines run in worker.py processes
+PIPELINE_EMBEDDED_WORKER = os.getenv("PIPELINE_EMBEDDED_WORKER", "true").lower() == "true"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared API clients and database connection pools live as long as the application
+    clients.registry.open()
+    await database.init_db()
+    worker = asyncio.create_task(pipeline.work(pipeline_stages)) if PIPELINE_EMBEDDED_WORKER else None
+    yield
+    if worker is not None:
+        # Running jobs are handed back to the queue
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+    await clients.registry.aclose()
+    await database.close_db()
+
+app = FastAPI(lifespan=lifespan)
 # Include the router defined in database.py
 app.include_router(db_router)
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # Label by route template (/pipeline/{job_id}) rather than by path to keep the label set small
+    route = next((r.path for r in app.router.routes if r.matches(request.scope)[0] == Match.FULL), "unmatched")
+    in_flight = metrics.HTTP_REQUESTS_IN_FLIGHT.labels(request.method, route)
+    in_flight.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        in_flight.dec()
+        metrics.HTTP_REQUEST_DURATION.labels(request.method, route, str(status)).observe(time.perf_counter() - started)
+
 # Mount the static file directory
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Initialize the template directory
 templates = Jinja2Templates(directory="templates")
 
+# Maximum number of pages crawled per target website
+CRAWL_PAGE_LIMIT = int(os.getenv("CRAWL_PAGE_LIMIT", "10"))
+
+# Batch outreach: companies per request and emails generated at the same time
+OUTREACH_BATCH_LIMIT = 50
+OUTREACH_CONCURRENCY = int(os.getenv("OUTREACH_CONCURRENCY", "8"))
+# Draft the first email of a batch alone so the others hit DeepSeek's cache of the shared prompt prefix
+OUTREACH_WARM_PREFIX = os.getenv("OUTREACH_WARM_PREFIX", "true").lower() == "true"
+
+def _deepseek_model(model: str, temperature: float, max_tokens: Optional[int]) -> ChatOpenAI:
+    """
+    Return the shared DeepSeek model for this configuration (see clients.py).
+    """
+    try:
+        return clients.registry.chat_model(model, temperature, max_tokens)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error initializing DeepSeek model: {e}")
+
+def _firecrawl_client() -> FirecrawlApp:
+    """
+    Return the shared Firecrawl client (see clients.py).
+    """
+    try:
+        return clients.registry.firecrawl()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error initializing Firecrawl client: {e}")
+
 # Frontend homepage route, returns index.html
 @app.get("/", response_class=HTMLResponse)
 async def read_index(request: Request):
@@ -43,90 +123,182 @@ if __name__ == "__main__":
 @app.post("/generate_knowledge_base")
 async def generate_knowledge_base(
     target_url: str = Body(...),
-    file_name: str = Body(...)
+    file_name: str = Body(...),
+    wait: bool = Body(True),
+    run_id: Optional[str] = Body(None),
+    refresh: bool = Body(False)
 ):
     """
-    Crawl the website content from the target URL and save the Markdown knowledge base to data/knowledge_base/knowledge_base.
+    Crawl the website content from the target URL and save the Markdown knowledge base to the run workspace
+    (data/runs/<run_id>/knowledge_base/knowledge_base). A new run_id is created when none is given and is
+    returned so the following stages can be called with it.
     Check if the content is empty during crawling, and return an error if it is.
     Although the interface includes the file_name parameter, it will be fixed to "knowledge_base" by the frontend.
+    The crawl is submitted and polled without blocking the event loop. With "wait": false the crawl id is
+    returned right away and the crawl finishes in the background; poll /crawl_status/{crawl_id} for progress.
+    Crawled pages are kept per URL in the crawl store. A crawl of the same target_url within CRAWL_CACHE_TTL_SECONDS
+    is served from the store unless "refresh": true; a refresh reports the added, changed and removed pages, and
+    "changed": false means the site content is identical to the previous crawl.
     """
-    # Force file_name to "knowledge_base"
-    file_name = "knowledge_base"
+    # The knowledge base always lives at the fixed artifact path of the run
+    run_id = workspace.validate_run_id(run_id) or workspace.new_run_id()
     
     # If DEBUG_MODE=true is set, return debug result directly
     if os.getenv("DEBUG_MODE", "false").lower() == "true":
-        output_file = os.path.join("data", "knowledge_base", file_name)
-        # Ensure the output directory exists
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        output_file = workspace.seed_from_shared("knowledge_base", run_id)
         # Return debug info without actual crawling
         return {
             "message": f"(DEBUG) The target website content has been successfully saved to {output_file}",
+            "run_id": run_id,
             "file_path": output_file
         }
     
-    # Read Firecrawl API key from environment variable
-    api_key = os.getenv("FIRECRAWL_API_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="Missing FIRECRAWL_API_KEY in environment.")
-    
-    # Initialize Firecrawl app
-    fire_app = FirecrawlApp(api_key=api_key)
-    
-    # Set output directory to data/knowledge_base and ensure it exists
-    output_folder = os.path.join("data", "knowledge_base")
-    os.makedirs(output_folder, exist_ok=True)
-    output_file = os.path.join(output_folder, file_name)
-    
-    # Start crawling the target website
-    crawl_status = fire_app.crawl_url(
-        target_url,
-        params={
-            'limit': 10,
-            'scrapeOptions': {'formats': ['markdown'], 'onlyMainContent': True}
-        },
-        poll_interval=30
-    )
-    
-    crawl_id = crawl_status.get('id')
-    status = crawl_status.get('status')
-    while status != 'completed':
-        time.sleep(10)
-        crawl_status = fire_app.check_crawl_status(crawl_id)
-        status = crawl_status.get('status')
-        print(f"current status: {status}")
+    # Resolve the knowledge base path inside the run workspace
+    output_file = workspace.artifact_path("knowledge_base", run_id)
     
-    # Retrieve the crawled Markdown content
-    markdown_content = "\n".join([item.get('markdown', '') for item in crawl_status.get('data', [])])
+    # Serve a recent crawl of the same target from the crawl store
+    if not refresh:
+        stored = await asyncio.to_thread(crawl_store.load_crawl, target_url, crawl_store.CRAWL_CACHE_TTL_SECONDS)
+        metrics.record_cache_lookup("crawl_store", bool(stored and stored["pages"]))
+        if stored and stored["pages"]:
+            try:
+                workspace.write_text(output_file, crawl_store.assemble_knowledge_base(stored["pages"]))
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Error writing file: {e}")
+            return {
+                "message": f"The target website content was crawled recently and has been saved to {output_file}",
+                "run_id": run_id,
+                "file_path": output_file,
+                "from_store": True,
+                "changed": False,
+                "content_hash": stored["content_hash"],
+                "previous_run_id": stored["run_id"]
+            }
     
-    # Check if content is empty
-    if not markdown_content.strip():
-        raise HTTPException(status_code=400, detail="The crawled markdown content is empty. Aborting.")
+    # Shared Firecrawl client (requires FIRECRAWL_API_KEY)
+    fire_app = _firecrawl_client()
     
-    # Save to the specified file
+    # Submit the crawl job; this returns as soon as Firecrawl has accepted it
     try:
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(markdown_content)
+        crawl_id = await crawler.start_crawl(
+            fire_app,
+            target_url,
+            params={
+                'limit': CRAWL_PAGE_LIMIT,
+                'scrapeOptions': {'formats': ['markdown'], 'onlyMainContent': True}
+            }
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error writing file: {e}")
+        raise HTTPException(status_code=502, detail=f"Error starting crawl: {e}")
+    
+    # Poll the crawl and write the knowledge base in a task so the caller can choose not to wait
+    task = asyncio.create_task(_finish_crawl(fire_app, crawl_id, target_url, run_id, output_file))
+    
+    if not wait:
+        crawler.run_in_background(task)
+        return {
+            "message": f"Crawl {crawl_id} started. The knowledge base will be saved to {output_file}",
+            "run_id": run_id,
+            "crawl_id": crawl_id,
+            "status": "scraping",
+            "file_path": output_file
+        }
     
-    return {"message": f"The target website content has been successfully saved to {output_file}", "file_path": output_file}
+    # Shield the task so a dropped client connection does not cancel the crawl
+    changes = await asyncio.shield(task)
+    return {
+        "message": f"The target website content has been successfully saved to {output_file}",
+        "run_id": run_id,
+        "crawl_id": crawl_id,
+        "file_path": output_file,
+        "from_store": False,
+        **changes
+    }
 
-@app.post("/process_knowledge_base")
-async def process_knowledge_base(payload: dict = Body(...)):
+async def _finish_crawl(fire_app: FirecrawlApp, crawl_id: str, target_url: str, run_id: str, output_file: str) -> dict:
     """
-    Read the Markdown knowledge base from the given file path,
-    call DeepSeek to generate a standardized company profile document,
-    and save the final result to data/company_profile/company_profile.md.
-    Also checks for file existence and whether the content is empty.
+    Wait for a submitted crawl to finish, store its pages in the crawl store
+    and save the assembled Markdown knowledge base to output_file.
+    Returns the page-level changes compared to the previous crawl of target_url.
+    """
+    try:
+        crawl_status = await crawler.wait_for_crawl(fire_app, crawl_id)
+        if crawl_status.get("status") != "completed":
+            raise HTTPException(status_code=502, detail=f"Crawl {crawl_id} ended with status '{crawl_status.get('status')}'.")
+        
+        # Retrieve the crawled Markdown content page by page
+        pages = crawl_store.pages_from_crawl(crawl_status)
+        markdown_content = crawl_store.assemble_knowledge_base(pages)
+        
+        # Check if content is empty
+        if not markdown_content.strip():
+            raise HTTPException(status_code=400, detail="The crawled markdown content is empty. Aborting.")
+        
+        # Save to the specified file
+        try:
+            workspace.write_text(output_file, markdown_content)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error writing file: {e}")
+        
+        # Record the pages and compare their content hashes with the previous crawl
+        changes = await asyncio.to_thread(crawl_store.save_crawl, target_url, pages, run_id)
+    except HTTPException as e:
+        await asyncio.to_thread(crawl_store.update_crawl_job, crawl_id, status="failed", error=str(e.detail))
+        raise
+    except Exception as e:
+        await asyncio.to_thread(crawl_store.update_crawl_job, crawl_id, status="failed", error=str(e))
+        raise HTTPException(status_code=502, detail=f"Error while crawling: {e}")
     
-    Example request body:
-    {
-      "file_path": "data\\knowledge_base\\knowledge_base"
-    }
+    await asyncio.to_thread(
+        crawl_store.update_crawl_job, crawl_id, status="completed", file_path=output_file, changed=changes["changed"]
+    )
+    return changes
+
+@app.get("/crawl_status/{crawl_id}")
+async def crawl_status(crawl_id: str):
+    """
+    Return the progress of a crawl started by /generate_knowledge_base (on any worker). Finished crawls are
+    kept for CRAWL_JOB_RETENTION_SECONDS.
+    """
+    job = await asyncio.to_thread(crawl_store.crawl_job, crawl_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Crawl '{crawl_id}' not found.")
+    return job
+
+# Prompt for the standardized company profile
+COMPANY_PROFILE_PROMPT = ChatPromptTemplate.from_template(
+    "You are an expert analyst specialized in generating structured company profiles from provided content.\n\n"
+    "Extract key information from the markdown content provided below, and generate a standardized company profile document in English. "
+    "Please be as detailed as possible. "
+    "Include the following sections:\n\n"
+    "1. Company Information:\n"
+    "- Company Name\n"
+    "- Company Website\n"
+    "- Industry\n\n"
+    "2. Product and Business Information:\n"
+    "- Product/Service Offering & Features\n"
+    "- Unique Selling Points (USPs)\n"
+    "- Typical Use Cases\n\n"
+    "3. Value Proposition & Customer Pain Points:\n"
+    "- Value Proposition\n"
+    "- Customer Pain Points\n\n"
+    "4. Target Market and Customer Profile:\n"
+    "- Target Industry\n"
+    "- Ideal Customer Profile (ICP)\n\n"
+    "5. Customer Success and Testimonials:\n"
+    "- Case Studies or Testimonials\n\n"
+    "Markdown Content:\n\n{markdown_content}"
+)
+
+def _read_knowledge_base(payload: dict) -> tuple:
     """
-    file_path = payload.get("file_path")
+    Resolve and read the knowledge base of a /process_knowledge_base request.
+    Returns (run_id, markdown_content).
+    """
+    run_id = workspace.validate_run_id(payload.get("run_id"))
+    file_path = payload.get("file_path") or (run_id and workspace.artifact_path("knowledge_base", run_id, create_dir=False))
     if not file_path:
-        raise HTTPException(status_code=422, detail="file_path is required.")
+        raise HTTPException(status_code=422, detail="file_path or run_id is required.")
 
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found.")
@@ -141,68 +313,141 @@ async def process_knowledge_base(payload: dict = Body(...)):
         raise HTTPException(status_code=400, detail="Markdown content is empty. Aborting API call.")
     
     print(f"Markdown content length: {len(markdown_content)}")
-    
-    # If debug mode is on, return the existing cached file path without modifying contents
-    if os.getenv("DEBUG_MODE", "false").lower() == "true":
-        output_folder2 = os.path.join("data", "company_profile")
-        os.makedirs(output_folder2, exist_ok=True)
-        output_file2 = os.path.join(output_folder2, "company_profile.md")
-        return {"message": f"(DEBUG) Standardized company profile not modified. Using existing file: {output_file2}", "output_file": output_file2}
-    
-    # Set environment variables for DeepSeek API
-    os.environ["OPENAI_API_KEY"] = os.getenv("DEEPSEEK_API_KEY")
-    os.environ["OPENAI_API_BASE"] = "https://api.deepseek.com"
-    
-    # Build prompt template
-    prompt_template = ChatPromptTemplate.from_template(
-        "You are an expert analyst specialized in generating structured company profiles from provided content.\n\n"
-        "Extract key information from the markdown content provided below, and generate a standardized company profile document in English. "
-        "Please be as detailed as possible. "
-        "Include the following sections:\n\n"
-        "1. Company Information:\n"
-        "- Company Name\n"
-        "- Company Website\n"
-        "- Industry\n\n"
-        "2. Product and Business Information:\n"
-        "- Product/Service Offering & Features\n"
-        "- Unique Selling Points (USPs)\n"
-        "- Typical Use Cases\n\n"
-        "3. Value Proposition & Customer Pain Points:\n"
-        "- Value Proposition\n"
-        "- Customer Pain Points\n\n"
-        "4. Target Market and Customer Profile:\n"
-        "- Target Industry\n"
-        "- Ideal Customer Profile (ICP)\n\n"
-        "5. Customer Success and Testimonials:\n"
-        "- Case Studies or Testimonials\n\n"
-        "Markdown Content:\n\n{markdown_content}"
-    )
-    
-    # Initialize DeepSeek model
-    llm = ChatOpenAI(
-        model="deepseek-reasoner",
-        temperature=0.2,
-        max_tokens=3000
-    )
-    
-    # Construct messages
-    messages = prompt_template.format_messages(markdown_content=markdown_content)
-    
-    # Call DeepSeek model to get results
-    result = llm.invoke(messages)
-    
-    # Set output directory to data/company_profile and ensure it exists
-    output_folder2 = os.path.join("data", "company_profile")
-    os.makedirs(output_folder2, exist_ok=True)
-    output_file2 = os.path.join(output_folder2, "company_profile.md")
-    
+    return run_id, markdown_content
+
+def _company_profile_model() -> ChatOpenAI:
+    """
+    Return the DeepSeek reasoner that writes the company profile.
+    """
+    return _deepseek_model("deepseek-reasoner", temperature=0.2, max_tokens=3000)
+
+async def _company_profile_messages(markdown_content: str) -> tuple:
+    """
+    Condense the knowledge base if needed and render the profile prompt.
+    Returns (messages, number of summarized chunks).
+    """
+    # Large knowledge bases are summarised chunk by chunk in parallel so they fit the context window
+    summary_model = _deepseek_model(os.getenv("KB_SUMMARY_MODEL", "deepseek-chat"), temperature=0.2, max_tokens=1500)
     try:
-        with open(output_file2, "w", encoding="utf-8") as f:
-            f.write(result.content)
+        condensed = await kb_summary.condense(markdown_content, summary_model)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error summarizing knowledge base chunks: {e}")
+    return COMPANY_PROFILE_PROMPT.format_messages(markdown_content=condensed["content"]), condensed["chunks"]
+
+def _save_company_profile(profile: str, run_id: Optional[str]) -> str:
+    """
+    Save the profile into the run workspace and return its path.
+    """
+    output_file = workspace.artifact_path("company_profile", run_id)
+    try:
+        workspace.write_text(output_file, profile)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error writing result file: {e}")
+    return output_file
+
+async def _stream_completion(
+    llm: ChatOpenAI,
+    prepare: Callable[[], Awaitable[tuple]],
+    finish: Callable[[str, object], dict]
+):
+    """
+    Stream one LLM completion as Server-Sent Events.
+    prepare() returns (messages, context); every piece of text is sent as a "token" event as soon as
+    the model produces it, and finish(text, context) (run in a worker thread) stores the artifact and
+    returns the payload of the final "done" event. Failures end the stream with an "error" event.
+    """
+    event_id = 0
+
+    def event(name: str, data: dict) -> str:
+        nonlocal event_id
+        event_id += 1
+        return pipeline.format_sse({"id": event_id - 1, "event": name, "data": data})
+
+    yield event("status", {"status": "running"})
+    try:
+        messages, context = await prepare()
+        parts = []
+        async for text in llm_cache.cached_astream(llm, messages):
+            parts.append(text)
+            yield event("token", {"text": text})
+        yield event("done", await asyncio.to_thread(finish, "".join(parts), context))
+    except HTTPException as e:
+        yield event("error", {"error": e.detail})
+    except Exception as e:
+        yield event("error", {"error": str(e)})
+
+@app.post("/process_knowledge_base")
+async def process_knowledge_base(payload: dict = Body(...)):
+    """
+    Read the Markdown knowledge base from the given file path (or from the run workspace when only run_id is given),
+    call DeepSeek to generate a standardized company profile document,
+    and save the final result to company_profile/company_profile.md in the run workspace.
+    Also checks for file existence and whether the content is empty.
+    Knowledge bases larger than KB_SINGLE_PASS_TOKENS are first condensed with a parallel map-reduce over
+    token-counted chunks (see kb_summary.py).
+    
+    Example request body:
+    {
+      "run_id": "3f2c9a...",
+      "file_path": "data\\runs\\3f2c9a...\\knowledge_base\\knowledge_base"
+    }
+    """
+    run_id, markdown_content = _read_knowledge_base(payload)
+    llm = _company_profile_model()
+    messages, summarized_chunks = await _company_profile_messages(markdown_content)
+    
+    # Call DeepSeek model to get results (served from the LLM cache for unchanged inputs)
+    result = await llm_cache.cached_ainvoke(llm, messages)
     
-    return {"message": f"Standardized company profile created: {output_file2}", "output_file": output_file2}
+    output_file2 = _save_company_profile(result.content, run_id)
+    
+    return {
+        "message": f"Standardized company profile created: {output_file2}",
+        "run_id": run_id,
+        "output_file": output_file2,
+        "summarized_chunks": summarized_chunks
+    }
+
+@app.post("/process_knowledge_base/stream")
+async def process_knowledge_base_stream(payload: dict = Body(...)):
+    """
+    Streaming variant of /process_knowledge_base with the same request body.
+    Returns Server-Sent Events: "status" right away, a "token" event ({"text": ...}) for every piece of the
+    profile as DeepSeek produces it, and "done" with the /process_knowledge_base response once the profile
+    has been written to the run workspace (or "error").
+    """
+    run_id, markdown_content = _read_knowledge_base(payload)
+    llm = _company_profile_model()
+
+    def finish(profile: str, summarized_chunks: int) -> dict:
+        output_file = _save_company_profile(profile, run_id)
+        return {
+            "message": f"Standardized company profile created: {output_file}",
+            "run_id": run_id,
+            "output_file": output_file,
+            "summarized_chunks": summarized_chunks
+        }
+
+    return StreamingResponse(
+        _stream_completion(llm, lambda: _company_profile_messages(markdown_content), finish),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+# Define the Pydantic model for one potential event returned by DeepSeek
+class PotentialEvent(BaseModel):
+    name: str = Field(min_length=1)
+    url: str = Field(min_length=1)
+    category: Literal["Associations", "Exhibitions", "News"]
+
+    @field_validator("category", mode="before")
+    @classmethod
+    def _normalize_category(cls, value):
+        # Accept "exhibition", "ASSOCIATIONS", ... for the three allowed categories
+        if isinstance(value, str):
+            value = value.strip().title()
+            return value if value.endswith("s") else f"{value}s"
+        return value
 
 @app.post("/find_potential_events")
 async def find_potential_events(payload: dict = Body(...)):
@@ -212,17 +457,21 @@ async def find_potential_events(payload: dict = Body(...)):
          - name (string)
          - url (string)
          - category (string) (value: Associations, Exhibitions, News)
-    3. Clean the response to remove markdown formatting and save to file (for inspection)
+    3. Parse the response element by element as it streams in (see structured_output.py): every event is
+       validated on arrival, invalid events and a cut-off tail are re-requested in a continuation call
+       instead of repeating the whole call, and the valid events are saved to file (for inspection)
     4. Return parsed JSON data for further database insertion or frontend use
 
     Example request body:
     {
-      "file_path": "data\\company_profile\\company_profile.md"
+      "run_id": "3f2c9a...",
+      "file_path": "data\\runs\\3f2c9a...\\company_profile\\company_profile.md"
     }
     """
-    file_path = payload.get("file_path")
+    run_id = workspace.validate_run_id(payload.get("run_id"))
+    file_path = payload.get("file_path") or (run_id and workspace.artifact_path("company_profile", run_id, create_dir=False))
     if not file_path:
-        raise HTTPException(status_code=422, detail="file_path is required.")
+        raise HTTPException(status_code=422, detail="file_path or run_id is required.")
 
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="Company profile file not found.")
@@ -236,99 +485,56 @@ async def find_potential_events(payload: dict = Body(...)):
     if not company_profile.strip():
         raise HTTPException(status_code=400, detail="Company profile content is empty.")
     
-    # If debug mode is on, return existing cached content without modification
-    if os.getenv("DEBUG_MODE", "false").lower() == "true":
-        output_folder = os.path.join("data", "potential_events")
-        os.makedirs(output_folder, exist_ok=True)
-        output_file = os.path.join(output_folder, "potential_events.json")
-        if os.path.exists(output_file):
-            try:
-                with open(output_file, "r", encoding="utf-8") as f:
-                    cleaned_output = f.read()
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Error reading potential events file: {e}")
-            try:
-                events_data = json.loads(cleaned_output)
-            except Exception:
-                events_data = None
-            return {
-                "message": f"(DEBUG) Potential events not modified. Using existing file: {output_file}",
-                "output_file": output_file,
-                "parsed_data": events_data
-            }
-        else:
-            return {
-                "message": f"(DEBUG) Potential events file not found. No modification performed.",
-                "output_file": output_file,
-                "parsed_data": None
-            }
-    
-    # Set environment variables for DeepSeek API
-    os.environ["OPENAI_API_KEY"] = os.getenv("DEEPSEEK_API_KEY")
-    os.environ["OPENAI_API_BASE"] = "https://api.deepseek.com"
-    
-    # Build prompt to return clean JSON without extra text or markdown blocks
-    prompt_template = ChatPromptTemplate.from_template(
-        "You are an expert market analyst specialized in identifying potential event opportunities. "
-        "Based on the following company profile information, please provide a structured JSON array of relevant trade associations, industry events, and bodies where target customers are likely to attend (based on public information). "
-        "Each event object should have the following fields: "
-        "name (string), url (string), and category (string, one of ['Associations', 'Exhibitions', 'News']). "
-        "Return only valid JSON with no extra text, no markdown fences, and no additional keys.\n\n"
-        "Company Profile Information:\n\n{company_profile}"
-    )
-    
-    # Initialize DeepSeek model
-    llm = ChatOpenAI(
-        model="deepseek-reasoner",
-        temperature=0.2,
-        max_tokens=3000
-    )
-    
-    messages = prompt_template.format_messages(company_profile=company_profile)
-    result = llm.invoke(messages)
-    
-    # Clean returned text by removing markdown code blocks
-    raw_output = result.content.strip()
-    cleaned_output = re.sub(r"^```json\s*", "", raw_output)
-    cleaned_output = re.sub(r"\s*```$", "", cleaned_output)
+    # Shared DeepSeek model
+    llm = _deepseek_model("deepseek-reasoner", temperature=0.2, max_tokens=3000)
     
-    # Parse cleaned JSON
+    # Instructions plus the profile digest, laid out as the same cacheable prefix as the other prompts
+    messages = prompts.events_messages(prompts.profile_digest(company_profile, run_id))
     try:
-        events_data = json.loads(cleaned_output)
-        if not isinstance(events_data, list):
-            raise ValueError("LLM response JSON is not a list.")
-    except (json.JSONDecodeError, ValueError) as e:
+        result = await structured_output.generate_list(
+            llm, messages, PotentialEvent, key=lambda event: extract_store.canonical_url(event["url"])
+        )
+    except ValueError as e:
         raise HTTPException(status_code=400, detail=f"DeepSeek response is not valid JSON: {e}")
+    events_data = result["items"]
+    cleaned_output = json.dumps(events_data, indent=2, ensure_ascii=False)
 
     # Save the cleaning results to a file for subsequent inspection
-    output_folder = os.path.join("data", "potential_events")
-    os.makedirs(output_folder, exist_ok=True)
-    output_file = os.path.join(output_folder, "potential_events.json")
+    output_file = workspace.artifact_path("potential_events", run_id)
     try:
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(cleaned_output)
+        workspace.write_text(output_file, cleaned_output)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error writing potential events file: {e}")
     
     return {
         "message": f"Potential events information saved to {output_file}",
+        "run_id": run_id,
         "output_file": output_file,
-        "parsed_data": events_data
+        "parsed_data": events_data,
+        "complete": result["complete"],
+        "invalid_events": result["invalid"],
+        "continuations": result["continuations"]
     }
 
 @app.post("/extract_companies")
 async def extract_companies_from_file(payload: dict = Body(...)):
     """
     Endpoint description:
-    1. Receives a parameter 'json_file_path', e.g., "data\\potential_events\\potential_events.json", and reads the JSON data in the file (should be a list containing URLs).
-    2. Extracts all URLs from the JSON data (deduplicated).
-    3. If there are more than 10 URLs, only the first 10 will be used; calls Firecrawl's extract API to extract company names from the pages, returning a 'companies' field with a list of strings.
-    4. Saves the extracted result as a JSON file under the data/potential_customer directory.
+    1. Receives a parameter 'json_file_path', e.g., "data\\potential_events\\potential_events.json", or a 'run_id' whose
+       potential_events.json is used, and reads the JSON data in the file (should be a list containing URLs).
+    2. Extracts all URLs from the JSON data (deduplicated, in file order).
+    3. Calls Firecrawl's extract API once per URL to extract company names from the pages, with at most EXTRACT_CONCURRENCY
+       calls in flight and at most EXTRACT_RATE_PER_MINUTE started per minute (see extraction.py). The per-URL results are
+       merged into one deduplicated 'companies' list; failed URLs are listed under 'errors' and do not abort the others.
+       URLs are compared in canonical form, and pages extracted within EXTRACT_CACHE_TTL_SECONDS (by any run) are
+       served from the extract store (listed under 'cached') unless the payload sets "refresh": true.
+    4. Saves the extracted result as potential_customer/potential_customer.json in the run workspace.
     5. Returns the extraction result and file path.
     """
-    json_file_path = payload.get("json_file_path")
+    run_id = workspace.validate_run_id(payload.get("run_id"))
+    json_file_path = payload.get("json_file_path") or (run_id and workspace.artifact_path("potential_events", run_id, create_dir=False))
     if not json_file_path:
-        raise HTTPException(status_code=422, detail="json_file_path is required.")
+        raise HTTPException(status_code=422, detail="json_file_path or run_id is required.")
     
     if not os.path.exists(json_file_path):
         raise HTTPException(status_code=404, detail=f"File '{json_file_path}' not found.")
@@ -342,38 +548,22 @@ async def extract_companies_from_file(payload: dict = Body(...)):
     if not isinstance(events_data, list):
         raise HTTPException(status_code=400, detail="JSON content is not a list.")
     
-    # Extract all URLs (deduplicated)
-    urls = list({ event.get("url") for event in events_data if event.get("url") })
+    # Extract all URLs (deduplicated, keeping their order so every run extracts the same pages)
+    urls = extraction.event_urls(events_data)
     if not urls:
         raise HTTPException(status_code=400, detail="No valid URLs found in JSON data.")
     
-    # Limit to first 10 URLs if more than 10
-    if len(urls) > 10:
-        urls = urls[:10]
-    
-    # Initialize Firecrawl app (ensure FIRECRAWL_API_KEY is set in the environment)
-    API_KEY = os.getenv("FIRECRAWL_API_KEY")
-    if not API_KEY:
-        raise HTTPException(status_code=500, detail="FIRECRAWL_API_KEY not set in environment.")
-    fire_app = FirecrawlApp(api_key=API_KEY)
+    # Shared Firecrawl client (requires FIRECRAWL_API_KEY)
+    fire_app = _firecrawl_client()
     
-    # Internal schema definition for extraction result
-    class ExtractSchema(BaseModel):
-        companies: List[str]
-    
-    options = {
-        "prompt": "Extract company names from all pages.",
-        "schema": ExtractSchema.model_json_schema(),
-        "enable_web_search": False  # Disable web search to save time
-    }
+    options = extraction.COMPANY_EXTRACT_OPTIONS
     
-    # Set output directory data/potential_customer and ensure it exists
-    output_folder = os.path.join("data", "potential_customer")
-    os.makedirs(output_folder, exist_ok=True)
-    output_file = os.path.join(output_folder, "potential_customer.json")
+    # Resolve the output file inside the run workspace
+    output_file = workspace.artifact_path("potential_customer", run_id)
     
     # If debug mode is enabled, return cached content (no modification)
     if os.getenv("DEBUG_MODE", "false").lower() == "true":
+        workspace.seed_from_shared("potential_customer", run_id)
         if os.path.exists(output_file):
             try:
                 with open(output_file, "r", encoding="utf-8") as f:
@@ -383,33 +573,32 @@ async def extract_companies_from_file(payload: dict = Body(...)):
                 raise HTTPException(status_code=500, detail=f"Error reading cached file: {e}")
             return {
                 "message": f"(DEBUG) Using existing potential customer file: {output_file}",
+                "run_id": run_id,
                 "output_file": output_file,
                 "data": parsed_data
             }
         else:
             return {
                 "message": f"(DEBUG) Potential customer file not found. No modification performed.",
+                "run_id": run_id,
                 "output_file": output_file,
                 "data": None
             }
     
-    # Call Firecrawl extract API to extract company names
-    try:
-        result = fire_app.extract(urls, options)
-        if isinstance(result, str):
-            result = json.loads(result)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error during extraction: {e}")
+    # Call Firecrawl extract API for every URL in parallel and merge the company names
+    result = await extraction.extract_companies(fire_app, urls, options, run_id, refresh=bool(payload.get("refresh")))
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=f"Error during extraction: {result['errors'][0]['error']}")
     
     # Save extraction result to file
     try:
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(result, f, indent=2, ensure_ascii=False)
+        workspace.write_text(output_file, json.dumps(result, indent=2, ensure_ascii=False))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error writing JSON file: {e}")
     
     return {
         "message": "Extraction completed.",
+        "run_id": run_id,
         "output_file": output_file,
         "data": result
     }
@@ -420,7 +609,13 @@ async def prioritize_companies(payload: dict = Body(...)):
     Endpoint description:
     1. Reads potential customer data from potential_customer.json,
        and company profile information from company_profile.md.
-    2. Uses DeepSeek API to prioritize these companies, analyzing public data,
+    2. Resolves the candidate names into canonical entities (see entities.py), so spelling variants such as
+       "DuPont" and "DuPont de Nemours, Inc." are scored once, and saves them with the event URLs that mentioned
+       them to entities/entities.json in the run workspace.
+       Pre-scores the entities locally (see prescore.py) and drops obvious non-companies, keeping at most
+       PRESCORE_TOP_K of them.
+       Uses DeepSeek API to prioritize these companies in parallel shards of PRIORITIZE_SHARD_SIZE candidates
+       (see prioritization.py), analyzing public data,
        and ranks them based on revenue, company size, and industry fit (higher revenue, larger size, and better fit rank higher),
        skipping fake or non-company entries;
        Also identifies key decision-makers and returns their name, title, email, phone, and LinkedIn Sales Navigator link.
@@ -436,22 +631,26 @@ async def prioritize_companies(payload: dict = Body(...)):
          - stakeholder_email (string)
          - stakeholder_phone (string)
          - stakeholder_link (string)
+         - score (integer): 0-100 priority used for the global ranking.
          - reasoning (string): one to two sentences explaining the prioritization.
-    5. If there are more than 50 valid companies, only the top 50 prioritized ones are returned; otherwise, return all.
-    6. Save the result returned by DeepSeek to data/prioritized_companies/prioritized_companies.json.
+    5. Each shard scores its companies (0-100); the shards are merged into one ranking by score (ties by name).
+       If there are more than 50 valid companies, only the top 50 prioritized ones are returned; otherwise, return all.
+    6. Save the merged result to prioritized_companies/prioritized_companies.json in the run workspace.
     
-    Request body example:
+    Request body example (both paths default to the run workspace when run_id is given):
     {
+       "run_id": "3f2c9a...",
        "potential_customer_path": "data\\potential_customer\\potential_customer.json",
        "company_profile_path": "data\\company_profile\\company_profile.md"
     }
     """
-    potential_customer_path = payload.get("potential_customer_path")
-    company_profile_path = payload.get("company_profile_path")
+    run_id = workspace.validate_run_id(payload.get("run_id"))
+    potential_customer_path = payload.get("potential_customer_path") or (run_id and workspace.artifact_path("potential_customer", run_id, create_dir=False))
+    company_profile_path = payload.get("company_profile_path") or (run_id and workspace.artifact_path("company_profile", run_id, create_dir=False))
     if not potential_customer_path:
-        raise HTTPException(status_code=422, detail="potential_customer_path is required.")
+        raise HTTPException(status_code=422, detail="potential_customer_path or run_id is required.")
     if not company_profile_path:
-        raise HTTPException(status_code=422, detail="company_profile_path is required.")
+        raise HTTPException(status_code=422, detail="company_profile_path or run_id is required.")
     
     # Check if files exist
     if not os.path.exists(potential_customer_path):
@@ -473,97 +672,59 @@ async def prioritize_companies(payload: dict = Body(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading company profile file: {e}")
     
-    # Convert potential customer data to string for prompt use
-    potential_data_str = json.dumps(potential_data, ensure_ascii=False, indent=2)
+    candidates = prioritization.candidate_names(potential_data)
+    if not candidates:
+        raise HTTPException(status_code=400, detail="No potential customers to prioritize.")
     
-    # If debug mode is enabled, return existing cache without modification
-    if os.getenv("DEBUG_MODE", "false").lower() == "true":
-        output_folder = os.path.join("data", "prioritized_companies")
-        os.makedirs(output_folder, exist_ok=True)
-        output_file = os.path.join(output_folder, "prioritized_companies.json")
-        if os.path.exists(output_file):
-            try:
-                with open(output_file, "r", encoding="utf-8") as f:
-                    cached_content = f.read()
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Error reading cached file: {e}")
-            return {
-                "message": f"(DEBUG) Using existing prioritized companies file: {output_file}",
-                "output_file": output_file,
-                "raw_result": cached_content
-            }
-        else:
-            return {
-                "message": f"(DEBUG) Prioritized companies file not found. No modification performed.",
-                "output_file": output_file,
-                "raw_result": ""
-            }
-    
-    # Construct DeepSeek prompt
-    prompt_template = ChatPromptTemplate.from_template(
-        "You are a market research expert. Based on the following company profile information and potential customer data, "
-        "analyze public data to prioritize the potential customer companies. Assess each company on approximate revenue, "
-        "company size, industry fit, and overall alignment with our products. Ensure that companies with higher revenue, "
-        "larger scale, and better industry fit are ranked higher. Skip any entry that appears to be fake or not a legitimate company. "
-        "For each valid company, locate key decision-makers and return specific names along with their positions, email addresses, and phone numbers. "
-        "For the field stakeholder_link, search for the candidate's LinkedIn Sales Navigator profile link; if not found, return an empty string without fabricating data. "
-        "Return the results strictly as valid JSON with no extra text, explanations, or markdown formatting. "
-        "The output should be a JSON array sorted by priority (highest priority first), where each object contains the following fields:\n"
-        "  - company_name (string)\n"
-        "  - industry (string)\n"
-        "  - revenue (string)\n"
-        "  - size (string)\n"
-        "  - stakeholder_name (string)\n"
-        "  - stakeholder_position (string)\n"
-        "  - stakeholder_email (string)\n"
-        "  - stakeholder_phone (string)\n"
-        "  - stakeholder_link (string)\n"
-        "  - reasoning (string): one to two sentences explaining the prioritization.\n\n"
-        "Please analyze all provided companies and do not limit your output to 10. If there are more than 50 valid companies, output only the top 50 prioritized results; otherwise, output all.\n\n"
-        "Company Profile Information:\n{company_profile}\n\n"
-        "Potential Customer Data:\n{potential_data}"
-    )
-    
-    prompt = prompt_template.format_prompt(
-        company_profile=company_profile,
-        potential_data=potential_data_str
-    )
+    # Collapse spelling variants into one canonical entity each, keeping the event URLs that mentioned them
+    try:
+        resolved = await asyncio.to_thread(entities.resolve, entities.names_by_source(potential_data, candidates), run_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error resolving company names: {e}")
+    try:
+        workspace.write_text(
+            workspace.artifact_path("entities", run_id), json.dumps(resolved, indent=2, ensure_ascii=False)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error writing entities JSON file: {e}")
+    canonical_names = [entity["canonical_name"] for entity in resolved]
     
-    # Set DeepSeek API environment variables
-    os.environ["OPENAI_API_KEY"] = os.getenv("DEEPSEEK_API_KEY")
-    os.environ["OPENAI_API_BASE"] = "https://api.deepseek.com"
+    # Drop obvious non-companies locally and keep only the best PRESCORE_TOP_K candidates for the prompt
+    prescored = await asyncio.to_thread(prescore.prescore, canonical_names, company_profile, run_id)
+    if not prescored["selected"]:
+        raise HTTPException(status_code=400, detail="No potential customers left after pre-scoring.")
     
-    # Initialize DeepSeek model
-    llm = ChatOpenAI(
-        model="deepseek-reasoner",
-        temperature=0.2,
-        max_tokens=5000
-    )
+    # Shared DeepSeek model (the output budget applies per shard)
+    llm = _deepseek_model("deepseek-reasoner", temperature=0.2, max_tokens=5000)
     
+    # Score the candidates in parallel shards and merge them into one top-50 ranking
     try:
-        result = llm.invoke(prompt.to_messages())
+        ranking = await prioritization.prioritize(prescored["selected"], prompts.profile_digest(company_profile, run_id), llm)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during DeepSeek call: {e}")
     
-    # Clean the returned text, remove possible ```json and ```
-    raw_output = result.content.strip()
-    cleaned_output = re.sub(r"^```json\s*", "", raw_output)
-    cleaned_output = re.sub(r"\s*```$", "", cleaned_output)
+    cleaned_output = json.dumps(ranking["companies"], ensure_ascii=False, indent=2)
     
-    # Save cleaned result to file
-    output_folder = os.path.join("data", "prioritized_companies")
-    os.makedirs(output_folder, exist_ok=True)
-    output_file = os.path.join(output_folder, "prioritized_companies.json")
+    # Save merged result to file
+    output_file = workspace.artifact_path("prioritized_companies", run_id)
     try:
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(cleaned_output)
+        workspace.write_text(output_file, cleaned_output)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error writing prioritized companies JSON file: {e}")
     
     return {
         "message": "Prioritization completed.",
+        "run_id": run_id,
         "output_file": output_file,
-        "raw_result": cleaned_output
+        "raw_result": cleaned_output,
+        "candidates": len(candidates),
+        "entities": len(resolved),
+        "prescored_candidates": len(prescored["selected"]),
+        "prescore_dropped": prescored["dropped"],
+        "shards": ranking["shards"],
+        "failed_shards": ranking["failed_shards"],
+        "continuations": ranking["continuations"],
+        "invalid_companies": ranking["invalid_companies"]
     }
 
 
@@ -580,8 +741,47 @@ class CompanyInfo(BaseModel):
     stakeholder_link: str
     reasoning: str
 
+def _outreach_profile_digest(run_id: Optional[str]) -> str:
+    """
+    Read the company profile used as background for outreach emails and return its digest (see prompts.py).
+    """
+    knowledge_base_path = workspace.artifact_path("company_profile", workspace.validate_run_id(run_id), create_dir=False)
+    if not os.path.exists(knowledge_base_path):
+        raise HTTPException(status_code=404, detail=f"Knowledge base file '{knowledge_base_path}' not found.")
+    try:
+        with open(knowledge_base_path, "r", encoding="utf-8") as f:
+            company_profile = f.read()
+        return prompts.profile_digest(company_profile, run_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading knowledge base file: {e}")
+
+def _outreach_model() -> ChatOpenAI:
+    """
+    Return the DeepSeek chat model used for outreach emails.
+    """
+    return _deepseek_model("deepseek-chat", temperature=0.3, max_tokens=1000)  # Adjust model name if needed
+
+def _outreach_messages(profile_digest: str, company: "CompanyInfo") -> list:
+    """
+    Construct the prompt for email generation: instructions and profile digest as the shared prefix,
+    the company object (formatted with json.dumps) last.
+    """
+    return prompts.outreach_messages(profile_digest, company.dict())
+
+def _save_outreach_email(company: "CompanyInfo", email_text: str, run_id: Optional[str]) -> str:
+    """
+    Persist one generated email under outreach_emails/<company>.json in the run workspace.
+    """
+    output_file = workspace.outreach_email_path(company.company_name, run_id)
+    record = {"company": company.dict(), "email": email_text}
+    try:
+        workspace.write_text(output_file, json.dumps(record, ensure_ascii=False, indent=2))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error saving output to JSON file: {e}")
+    return output_file
+
 @app.post("/generate_outreach_email")
-async def generate_outreach_email(company: CompanyInfo = Body(...)):
+async def generate_outreach_email(company: CompanyInfo = Body(...), run_id: Optional[str] = None):
     """
     Endpoint Description:
     1. Accepts a single company information object from the frontend, with the following example format:
@@ -597,80 +797,355 @@ async def generate_outreach_email(company: CompanyInfo = Body(...)):
          "stakeholder_link": "https://www.linkedin.com/sales/nav/james-carter-honeywell",
          "reasoning": "High revenue and strong alignment with aerospace/industrial applications requiring durable surface protection."
        }
-    2. Reads background information from the knowledge base file (e.g., data/company_profile/company_profile.md),
+    2. Reads background information from the company profile of the run given by the run_id query parameter
+       (e.g., data/runs/<run_id>/company_profile/company_profile.md, or data/company_profile/company_profile.md without run_id),
        including company history, core products, value propositions, etc.
     3. Constructs a prompt requesting DeepSeek (or ChatOpenAI) to generate a personalized outreach email,
        referencing company background and customer data, including a professional opening, targeted product value,
        and a clear call-to-action. Output must be plain text.
-    4. Saves the generated result to a JSON file and returns the JSON response.
+    4. Saves the generated result to outreach_emails/<company>.json in the run workspace and returns the JSON response.
     """
-    # 1. Read the knowledge base file
-    knowledge_base_path = os.path.join("data", "company_profile", "company_profile.md")
-    if not os.path.exists(knowledge_base_path):
-        raise HTTPException(status_code=404, detail=f"Knowledge base file '{knowledge_base_path}' not found.")
+    profile_digest = _outreach_profile_digest(run_id)
+    email_model = _outreach_model()
+
     try:
-        with open(knowledge_base_path, "r", encoding="utf-8") as f:
-            company_profile = f.read()
+        response = await llm_cache.cached_ainvoke(email_model, _outreach_messages(profile_digest, company))
+        email_text = response.content.strip()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading knowledge base file: {e}")
+        raise HTTPException(status_code=500, detail=f"Error generating outreach email: {e}")
+
+    output_file = _save_outreach_email(company, email_text, run_id)
+    return {
+        "message": "Personalized outreach email generated.",
+        "email": email_text,
+        "output_file": output_file
+    }
 
-    # 2. Construct the prompt for email generation (format the company object using json.dumps)
-    prompt_text = (
-        "You are a sales outreach expert. Our company has the following profile:\n\n"
-        f"{company_profile}\n\n"
-        "The potential customer company information is as follows:\n\n"
-        f"{json.dumps(company.dict(), indent=2, ensure_ascii=False)}\n\n"
-        "Based on the above information, plus deep search potential customer company information in public, "
-        "draft a personalized outreach email that is professional, engaging, and tailored to the potential customer. "
-        "The email should reference specific details from both our company profile and the potential customer's data, "
-        "explain why our product is a good fit for them, and include a clear call to action. "
-        "Output the email as plain text with no additional commentary."
+@app.post("/generate_outreach_email/stream")
+async def generate_outreach_email_stream(company: CompanyInfo = Body(...), run_id: Optional[str] = None):
+    """
+    Streaming variant of /generate_outreach_email with the same body and run_id query parameter.
+    Returns Server-Sent Events: "status" right away, a "token" event ({"text": ...}) for every piece of the
+    email as DeepSeek produces it, and "done" with the /generate_outreach_email response once the email
+    has been saved (or "error").
+    """
+    profile_digest = _outreach_profile_digest(run_id)
+    email_model = _outreach_model()
+
+    async def prepare() -> tuple:
+        return _outreach_messages(profile_digest, company), None
+
+    def finish(email_text: str, _context) -> dict:
+        email_text = email_text.strip()
+        return {
+            "message": "Personalized outreach email generated.",
+            "email": email_text,
+            "output_file": _save_outreach_email(company, email_text, run_id)
+        }
+
+    return StreamingResponse(
+        _stream_completion(email_model, prepare, finish),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
     )
 
-    # 3. Set DeepSeek API environment variables
-    API_KEY = os.getenv("DEEPSEEK_API_KEY")
-    if not API_KEY:
-        raise HTTPException(status_code=500, detail="DEEPSEEK_API_KEY not set in environment.")
-    os.environ["OPENAI_API_KEY"] = API_KEY
-    os.environ["OPENAI_API_BASE"] = "https://api.deepseek.com"
+@app.post("/generate_outreach_emails")
+async def generate_outreach_emails(payload: dict = Body(...)):
+    """
+    Endpoint Description:
+    1. Generates outreach emails for a whole prioritized list in one request. The list is either given as
+       "companies" (objects in the /generate_outreach_email format) or read from the prioritized_companies.json
+       of "run_id". At most OUTREACH_BATCH_LIMIT (50) companies are drafted per request.
+    2. Up to "concurrency" emails (default OUTREACH_CONCURRENCY) are generated at the same time, sharing one
+       company profile digest and one model client. All prompts start with the same instructions and digest
+       (see prompts.py); the first email is drafted alone so the rest are served from DeepSeek's prefix cache.
+    3. Streams Server-Sent Events: an "email" event per company as soon as its email is ready (or has failed),
+       then a "done" event with the counts. Each email is saved to outreach_emails/<company>.json.
+
+    Request body example:
+    {
+      "run_id": "3f2c9a...",
+      "concurrency": 10
+    }
+    """
+    run_id = workspace.validate_run_id(payload.get("run_id"))
+    companies = payload.get("companies")
+    if companies is None:
+        prioritized_path = workspace.artifact_path("prioritized_companies", run_id, create_dir=False)
+        if not os.path.exists(prioritized_path):
+            raise HTTPException(status_code=404, detail=f"File '{prioritized_path}' not found.")
+        try:
+            with open(prioritized_path, "r", encoding="utf-8") as f:
+                companies = json.load(f)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error reading prioritized companies file: {e}")
+    if not isinstance(companies, list):
+        raise HTTPException(status_code=400, detail="companies must be a list.")
+    companies = companies[:OUTREACH_BATCH_LIMIT]
 
-    # 4. Initialize the DeepSeek model
     try:
-        email_model = ChatOpenAI(
-            model_name="deepseek-chat",  # Adjust model name if needed
-            temperature=0.3,
-            max_tokens=1000
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error initializing email model: {e}")
+        concurrency = int(payload.get("concurrency") or OUTREACH_CONCURRENCY)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=422, detail="concurrency must be an integer.")
+    concurrency = max(1, min(concurrency, OUTREACH_BATCH_LIMIT))
 
-    # 5. Construct messages and call the model to generate the email
-    messages = [{"role": "system", "content": prompt_text}]
-    try:
-        response = email_model.invoke(messages)
-        email_text = response.content.strip()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating outreach email: {e}")
+    profile_digest = _outreach_profile_digest(run_id)
+    email_model = _outreach_model()
+    semaphore = asyncio.Semaphore(concurrency)
 
-    # 6. Construct the return result
-    output = {
-        "message": "Personalized outreach email generated.",
-        "email": email_text
+    async def draft(index: int, item, after: Optional[asyncio.Task] = None) -> dict:
+        if after is not None:
+            await asyncio.wait([after])
+        name = item.get("company_name") if isinstance(item, dict) else None
+        try:
+            company = CompanyInfo(**item)
+        except Exception as e:
+            return {"index": index, "company_name": name, "error": f"Invalid company data: {e}"}
+        async with semaphore:
+            try:
+                response = await llm_cache.cached_ainvoke(email_model, _outreach_messages(profile_digest, company))
+                email_text = response.content.strip()
+                output_file = await asyncio.to_thread(_save_outreach_email, company, email_text, run_id)
+            except HTTPException as e:
+                return {"index": index, "company_name": name, "error": e.detail}
+            except Exception as e:
+                return {"index": index, "company_name": name, "error": f"Error generating outreach email: {e}"}
+        return {"index": index, "company_name": name, "email": email_text, "output_file": output_file}
+
+    async def stream():
+        tasks = []
+        for i, item in enumerate(companies):
+            first = tasks[0] if tasks and OUTREACH_WARM_PREFIX else None
+            tasks.append(asyncio.create_task(draft(i, item, first)))
+        generated = failed = 0
+        try:
+            for completed in asyncio.as_completed(tasks):
+                result = await completed
+                if "error" in result:
+                    failed += 1
+                else:
+                    generated += 1
+                yield pipeline.format_sse({"id": generated + failed - 1, "event": "email", "data": result})
+            yield pipeline.format_sse({
+                "id": generated + failed,
+                "event": "done",
+                "data": {"run_id": run_id, "generated": generated, "failed": failed}
+            })
+        finally:
+            # Stop outstanding generations if the client goes away
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.post("/pipeline/run")
+async def run_pipeline(
+    target_url: str = Body(..., embed=True),
+    run_id: Optional[str] = Body(None, embed=True),
+    refresh: bool = Body(False, embed=True)
+):
+    """
+    Queue the whole pipeline (crawl -> company profile -> events -> companies -> prioritization) as a job in the
+    durable job queue (see job_queue.py) and return its job id immediately. The job id is also the run_id of the
+    produced artifacts. A worker process (worker.py, or the worker embedded in the app) claims the job and runs it;
+    if that worker dies, another one takes the job over once its lease expires.
+    Every stage after the crawl is checkpointed in the stage manifest (see manifest.py): when the hashes of its
+    input artifacts and settings match an earlier execution, in this run or another one, its outputs are reused
+    and the stage is reported as "skipped". Passing the run_id of an earlier (failed) run therefore resumes it from
+    the first stage whose inputs changed or whose output is missing; "refresh": true runs every stage again.
+    Follow the progress with GET /pipeline/{job_id}/events (Server-Sent Events) or poll GET /pipeline/{job_id}.
+    
+    Request body example:
+    {
+      "target_url": "https://www.dupont.com/brands/tedlar.html"
+    }
+    """
+    run_id = workspace.validate_run_id(run_id) or workspace.new_run_id()
+    await asyncio.to_thread(manifest.record_run, run_id, target_url)
+    queued = await asyncio.to_thread(job_queue.enqueue, run_id, {"target_url": target_url, "refresh": refresh})
+    if not queued:
+        raise HTTPException(status_code=409, detail=f"Pipeline '{run_id}' is already running.")
+    return {
+        "message": "Pipeline queued.",
+        "job_id": run_id,
+        "run_id": run_id,
+        "events_url": f"/pipeline/{run_id}/events"
     }
 
-    # 7. Save the result to a JSON file
+def pipeline_stages(run_id: str, params: dict) -> tuple:
+    """
+    Build the stages of a queued pipeline job (run by the queue workers, see pipeline.py):
+    returns (stages, coroutine run once every stage has succeeded).
+    """
+    target_url, refresh = params["target_url"], params.get("refresh", False)
+    stage_inputs = _pipeline_stage_inputs()
+    
+    async def crawl_stage():
+        # Always runs: the crawl store decides whether the site has to be fetched again
+        return await generate_knowledge_base(
+            target_url=target_url, file_name="knowledge_base", wait=True, run_id=run_id, refresh=refresh)
+    
+    def checkpointed(name, run_stage):
+        artifacts, settings, outputs = stage_inputs[name]
+        
+        async def stage():
+            # Shared state (entity index, earlier rankings) is read when the stage is about to run
+            state = await asyncio.to_thread(_pipeline_stage_state, name, run_id)
+            inputs = await asyncio.to_thread(manifest.input_hash, run_id, artifacts, {**settings, **state})
+            reused = None if refresh else await asyncio.to_thread(manifest.reuse, name, inputs, run_id)
+            if reused:
+                source = "this run" if reused["run_id"] == run_id else f"run {reused['run_id']}"
+                return {
+                    "message": f"Inputs unchanged; reused {', '.join(reused['outputs'])} from {source}.",
+                    "run_id": run_id,
+                    "output_file": workspace.artifact_path(outputs[0], run_id, create_dir=False),
+                    "input_hash": inputs["hash"],
+                    "reused_from": reused["run_id"],
+                    "skipped": True
+                }
+            result = await run_stage()
+            if _stage_partial(result):
+                # Not recorded, so the next run or resume retries what failed instead of reusing it
+                print(f"Stage {name} of run {run_id} only partly succeeded; its outputs are not checkpointed.")
+            else:
+                await asyncio.to_thread(manifest.record, name, inputs, outputs, run_id)
+            return result
+        return stage
+    
+    async def record_completed_run():
+        await asyncio.to_thread(crawl_store.record_run, target_url, run_id)
+    
+    stages = [
+        ("generate_knowledge_base", crawl_stage),
+        ("process_knowledge_base", checkpointed("process_knowledge_base", lambda: process_knowledge_base({"run_id": run_id}))),
+        ("find_potential_events", checkpointed("find_potential_events", lambda: find_potential_events({"run_id": run_id}))),
+        ("extract_companies", checkpointed("extract_companies", lambda: extract_companies_from_file({"run_id": run_id}))),
+        ("prioritize_companies", checkpointed("prioritize_companies", lambda: prioritize_companies({"run_id": run_id}))),
+    ]
+    return stages, record_completed_run
+
+def _pipeline_stage_inputs() -> dict:
+    """
+    Inputs of every checkpointed pipeline stage: (input artifacts, settings, output artifacts).
+    The settings cover everything besides the input files that shapes a stage's output.
+    """
+    return {
+        "process_knowledge_base": (["knowledge_base"], {
+            "prompt": COMPANY_PROFILE_PROMPT.pretty_repr(),
+            "chunk_prompt": kb_summary.CHUNK_PROMPT.pretty_repr(),
+            "single_pass_tokens": kb_summary.KB_SINGLE_PASS_TOKENS,
+            "chunk_tokens": kb_summary.KB_CHUNK_TOKENS,
+            "summary_model": os.getenv("KB_SUMMARY_MODEL", "deepseek-chat"),
+        }, ["company_profile"]),
+        "find_potential_events": (["company_profile"], {
+            "instructions": prompts.EVENTS_INSTRUCTIONS,
+            "request": prompts.EVENTS_REQUEST,
+            "profile_digest_tokens": prompts.PROFILE_DIGEST_TOKENS,
+        }, ["potential_events"]),
+        "extract_companies": (["potential_events"], {
+            "options": extraction.COMPANY_EXTRACT_OPTIONS,
+        }, ["potential_customer"]),
+        "prioritize_companies": (["potential_customer", "company_profile"], {
+            "instructions": prompts.PRIORITIZE_INSTRUCTIONS,
+            "profile_digest_tokens": prompts.PROFILE_DIGEST_TOKENS,
+            "shard_size": prioritization.PRIORITIZE_SHARD_SIZE,
+            "top_n": prioritization.PRIORITIZE_TOP_N,
+            "prescore": [prescore.PRESCORE_TOP_K, prescore.PRESCORE_MIN_SCORE],
+            "prescore_weights": [prescore.FEATURE_WEIGHTS.tolist(), prescore.CUTOFF_WEIGHTS.tolist()],
+            "entity_match": [entities.ENTITY_MATCH_THRESHOLD, entities.ENTITY_MAX_EXTRA_TOKENS, sorted(entities.ALIAS_NOISE)],
+        }, ["prioritized_companies", "entities"]),
+    }
+
+def _stage_partial(result: dict) -> bool:
+    """
+    Whether a stage result only partly succeeded: URLs whose extraction failed, an events list that
+    stayed truncated or invalid, or prioritization shards that failed.
+    """
+    data = result.get("data") if isinstance(result.get("data"), dict) else {}
+    return bool(result.get("errors") or data.get("errors") or result.get("failed_shards")) or result.get("complete") is False
+
+def _pipeline_stage_state(name: str, run_id: str) -> dict:
+    """
+    State outside the run's artifacts that shapes a stage's output, hashed into its inputs: prioritization
+    depends on the entity index and on the companies ranked by other runs. The run's own contributions
+    are left out, so a resumed run still matches its earlier execution.
+    """
+    if name == "prioritize_companies":
+        return {
+            "entity_index": entities.index_version(exclude_run_id=run_id),
+            "known_companies": prescore.known_companies_digest(exclude_run_id=run_id),
+        }
+    return {}
+
+@app.post("/pipeline/{run_id}/resume")
+async def resume_pipeline(run_id: str):
+    """
+    Run the pipeline of an earlier run again under the same run_id. Stages whose inputs are unchanged are
+    skipped, so a run that failed in prioritize_companies only repeats that stage.
+    """
+    run_id = workspace.validate_run_id(run_id)
+    target_url = await asyncio.to_thread(manifest.run_target, run_id)
+    if target_url is None:
+        raise HTTPException(status_code=404, detail=f"Run '{run_id}' not found.")
+    return await run_pipeline(target_url=target_url, run_id=run_id, refresh=False)
+
+@app.get("/pipeline/{run_id}/manifest")
+async def pipeline_manifest(run_id: str):
+    """
+    Return the stage executions recorded for a run: input hashes and the hashes of the outputs they produced.
+    """
+    run_id = workspace.validate_run_id(run_id)
+    return {"run_id": run_id, "stages": await asyncio.to_thread(manifest.run_manifest, run_id)}
+
+@app.get("/pipeline/{job_id}")
+async def pipeline_status(job_id: str):
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Pipeline '{job_id}' not found.")
+    return job
+
+@app.get("/pipeline/{job_id}/events")
+async def pipeline_events(job_id: str, request: Request):
+    """
+    Stream the progress of a pipeline job as Server-Sent Events.
+    Event types: "status" (job summary), "stage" (stage started/completed/failed, with the stage result when completed).
+    Events are read from the job queue, so any web worker can serve them wherever the job runs.
+    """
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Pipeline '{job_id}' not found.")
     try:
-        with open("outreach_email.json", "w", encoding="utf-8") as f:
-            json.dump(output, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error saving output to JSON file: {e}")
+        last_event_id = int(request.headers.get("last-event-id", "-1"))
+    except ValueError:
+        last_event_id = -1
+    return StreamingResponse(
+        pipeline.stream_events(job_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Prometheus metrics of this process: API routes, pipeline stages, Firecrawl and DeepSeek calls,
+    token usage and cost, cache hit ratios and database upserts (see metrics.py).
+    """
+    body, content_type = await asyncio.to_thread(metrics.render)
+    return Response(content=body, media_type=content_type)
 
-    return output
+@app.get("/llm_cache/stats")
+async def llm_cache_stats():
+    """
+    Return hit/miss counters and the size of the LLM response cache of this worker.
+    """
+    return await asyncio.to_thread(llm_cache.get_cache().stats)
 
 
 @app.get("/view_company_profile")
-async def view_company_profile():
-    file_path = os.path.join("data", "company_profile", "company_profile.md")
+async def view_company_profile(run_id: Optional[str] = None):
+    file_path = workspace.artifact_path("company_profile", run_id, create_dir=False)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="Company profile not found.")
     try:
@@ -681,8 +1156,8 @@ async def view_company_profile():
     return {"content": content}
 
 @app.get("/view_potential_events")
-async def view_potential_events():
-    file_path = os.path.join("data", "potential_events", "potential_events.json")
+async def view_potential_events(run_id: Optional[str] = None):
+    file_path = workspace.artifact_path("potential_events", run_id, create_dir=False)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="Potential events file not found.")
     try:
@@ -693,8 +1168,8 @@ async def view_potential_events():
     return {"content": content}
 
 @app.get("/view_potential_customer")
-async def view_potential_customer():
-    file_path = os.path.join("data", "potential_customer", "potential_customer.json")
+async def view_potential_customer(run_id: Optional[str] = None):
+    file_path = workspace.artifact_path("potential_customer", run_id, create_dir=False)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="Potential customer file not found.")
     try:
@@ -705,8 +1180,8 @@ async def view_potential_customer():
     return {"content": content}
 
 @app.get("/view_prioritized_companies")
-async def view_prioritized_companies():
-    file_path = os.path.join("data", "prioritized_companies", "prioritized_companies.json")
+async def view_prioritized_companies(run_id: Optional[str] = None):
+    file_path = workspace.artifact_path("prioritized_companies", run_id, create_dir=False)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="Prioritized companies file not found.")
     try:
@@ -0,0 +1,162 @@
+"""
+Stage manifest for incremental pipeline runs (data/cache/stage_manifest.sqlite).
+
+Every pipeline stage declares its inputs: the artifacts it reads, the settings that shape
+its output (prompts, models, limits) and shared state it depends on (the entity index and the
+companies ranked by other runs, see main._pipeline_stage_state). Their content hashes are combined into one input hash,
+and after the stage has run the manifest records input hash -> output artifacts (with the
+hash of every output file) for the run. Before a stage runs again, the manifest is checked:
+
+1. this run already produced the outputs for the same input hash and the files are unchanged:
+   the stage is skipped (resuming a failed or interrupted run)
+2. another run produced them for the same input hash: its outputs are copied into this run's
+   workspace and the stage is skipped (unchanged upstream content across runs)
+3. otherwise the stage runs and its outputs are recorded, unless it only partly succeeded
+   (failed URLs or shards, an incomplete list): those outputs are used by the run but never
+   reused, so the next run retries what failed
+
+A changed input anywhere therefore re-runs exactly the stages downstream of the change, and a
+failed stage costs only itself on the next attempt. The target URL of every run is kept as
+well, so a run can be resumed by its run id alone.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import local_store
+import workspace
+
+
+def _path() -> str:
+    return os.getenv("STAGE_MANIFEST_PATH") or local_store.store_path("stage_manifest.sqlite")
+
+
+def _init(conn) -> None:
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS stage_outputs ("
+        " stage TEXT NOT NULL, input_hash TEXT NOT NULL, run_id TEXT NOT NULL, outputs TEXT NOT NULL,"
+        " inputs TEXT NOT NULL, completed_at REAL NOT NULL, PRIMARY KEY (stage, input_hash, run_id))"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS runs ("
+        " run_id TEXT PRIMARY KEY, target_url TEXT NOT NULL, updated_at REAL NOT NULL)"
+    )
+
+
+def file_hash(path: str) -> Optional[str]:
+    """
+    Return the sha256 of a file, or None if it does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def input_hash(run_id: str, artifacts: List[str], settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Hash the stage inputs: the run's input artifacts and the stage settings.
+    Returns {"hash", "inputs"}; raises FileNotFoundError if an input artifact is missing.
+    """
+    inputs = {}
+    for artifact in artifacts:
+        digest = file_hash(workspace.artifact_path(artifact, run_id, create_dir=False))
+        if digest is None:
+            raise FileNotFoundError(f"input artifact '{artifact}' of run {run_id} is missing")
+        inputs[artifact] = digest
+    inputs["settings"] = hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return {"hash": hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest(), "inputs": inputs}
+
+
+def _outputs_intact(run_id: str, outputs: Dict[str, str]) -> bool:
+    return all(file_hash(workspace.artifact_path(artifact, run_id, create_dir=False)) == digest for artifact, digest in outputs.items())
+
+
+def reuse(stage: str, inputs: Dict[str, Any], run_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Return {"run_id", "outputs"} of a recorded execution of the stage with the same input hash whose
+    output files are intact, copying them into this run's workspace if they come from another run.
+    Returns None if the stage has to run.
+    """
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        rows = conn.execute(
+            "SELECT run_id, outputs FROM stage_outputs WHERE stage = ? AND input_hash = ?"
+            " ORDER BY run_id = ? DESC, completed_at DESC",
+            (stage, inputs["hash"], run_id)
+        ).fetchall()
+    for row in rows:
+        outputs = json.loads(row["outputs"])
+        if not _outputs_intact(row["run_id"], outputs):
+            continue
+        if row["run_id"] != run_id:
+            for artifact in outputs:
+                workspace.copy_artifact(artifact, row["run_id"], run_id)
+            record(stage, inputs, list(outputs), run_id)
+        return {"run_id": row["run_id"], "outputs": outputs}
+    return None
+
+
+def record(stage: str, inputs: Dict[str, Any], outputs: List[str], run_id: str) -> Dict[str, str]:
+    """
+    Record the outputs a stage produced for these inputs in this run. Outputs that do not exist are left out.
+    """
+    hashes = {}
+    for artifact in outputs:
+        digest = file_hash(workspace.artifact_path(artifact, run_id, create_dir=False))
+        if digest is not None:
+            hashes[artifact] = digest
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        conn.execute(
+            "INSERT OR REPLACE INTO stage_outputs (stage, input_hash, run_id, outputs, inputs, completed_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (stage, inputs["hash"], run_id, json.dumps(hashes), json.dumps(inputs["inputs"]), time.time())
+        )
+    return hashes
+
+
+def record_run(run_id: str, target_url: str) -> None:
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        conn.execute(
+            "INSERT OR REPLACE INTO runs (run_id, target_url, updated_at) VALUES (?, ?, ?)",
+            (run_id, target_url, time.time())
+        )
+
+
+def run_target(run_id: str) -> Optional[str]:
+    """
+    Return the target URL a run was started for, or None if the run is unknown.
+    """
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        row = conn.execute("SELECT target_url FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+    return row["target_url"] if row else None
+
+
+def run_manifest(run_id: str) -> List[Dict[str, Any]]:
+    """
+    Return the recorded stage executions of a run, oldest first.
+    """
+    with local_store.connect(_path()) as conn:
+        _init(conn)
+        rows = conn.execute(
+            "SELECT stage, input_hash, outputs, inputs, completed_at FROM stage_outputs WHERE run_id = ? ORDER BY completed_at",
+            (run_id,)
+        ).fetchall()
+    return [
+        {
+            "stage": row["stage"],
+            "input_hash": row["input_hash"],
+            "inputs": json.loads(row["inputs"]),
+            "outputs": json.loads(row["outputs"]),
+            "completed_at": row["completed_at"],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,308 @@
+"""
+Prometheus metrics, served in the text exposition format at GET /metrics.
+
+- lily_http_*: latency and in-flight requests per API route
+- lily_pipeline_*: duration of every pipeline stage and pipelines in flight; jobs per queue
+  status, claims of queued and recovered (lease expired) jobs and leases lost by a worker
+- lily_upstream_*: latency and in-flight calls per upstream operation (Firecrawl crawl, poll
+  and extract; DeepSeek per model)
+- lily_llm_tokens_total / lily_llm_cost_usd_total: token usage as reported by DeepSeek, or
+  counted with tiktoken when the response carries no usage (streams, older API versions);
+  kind="prompt_cache_hit" counts the prompt tokens DeepSeek served from its context cache
+- lily_llm_output_elements_total / lily_llm_continuations_total: JSON array elements parsed
+  from model responses (valid or invalid) and continuation calls for missing elements
+- lily_upstream_retries_total / lily_upstream_hedges_total / lily_circuit_*: retries,
+  hedged duplicates and circuit breaker state per provider (see resilience.py)
+- lily_firecrawl_credits_total: credits reported by completed crawls
+- lily_cache_*: lookups and hit ratio of the LLM cache, crawl store and extract store
+- lily_db_*: duration and row count of the bulk upserts
+
+Metrics are kept per process. When PROMETHEUS_MULTIPROC_DIR is set (the Docker image sets it)
+every process, uvicorn workers and worker.py processes alike, writes its samples there and
+/metrics on any web worker aggregates them all (prometheus_client multiprocess mode); the
+directory must be emptied before the processes start. Without it, every process reports only
+its own metrics. lily_cache_hit_ratio is computed per process and is left out in multiprocess
+mode; derive it from lily_cache_lookups_total and lily_llm_cache_events_total instead.
+lily_pipeline_jobs is read from the job queue and is the same in every process.
+"""
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+# USD per million tokens (input, output, cache-hit input); override with
+# LLM_PRICE_<MODEL>="input,output[,cache_hit_input]", e.g. LLM_PRICE_DEEPSEEK_CHAT="0.27,1.10,0.07"
+DEFAULT_LLM_PRICES = {
+    "deepseek-chat": (0.27, 1.10, 0.07),
+    "deepseek-reasoner": (0.55, 2.19, 0.14),
+}
+
+STAGE_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200)
+REQUEST_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# Seconds a scrape waits for a lock on the job queue before it skips the job gauge
+JOB_COUNTS_TIMEOUT_SECONDS = float(os.getenv("JOB_COUNTS_TIMEOUT_SECONDS", "0.5"))
+
+# Set for multiprocess mode; prometheus_client reads it when the metrics below are created
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+DB_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "lily_http_request_duration_seconds", "API request latency (until the response headers are sent).",
+    ["method", "route", "status"], buckets=REQUEST_BUCKETS
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "lily_http_requests_in_flight", "API requests being handled.", ["method", "route"], multiprocess_mode="livesum"
+)
+
+STAGE_DURATION = Histogram(
+    "lily_pipeline_stage_duration_seconds", "Duration of pipeline stages.", ["stage", "outcome"], buckets=STAGE_BUCKETS
+)
+PIPELINES_IN_FLIGHT = Gauge(
+    "lily_pipelines_in_flight", "Pipeline jobs currently running their stages.", multiprocess_mode="livesum"
+)
+JOB_CLAIMS = Counter("lily_pipeline_job_claims_total", "Pipeline jobs claimed by this worker.", ["kind"])
+JOB_LEASES_LOST = Counter("lily_pipeline_job_leases_lost_total", "Pipeline jobs taken over by another worker while running here.")
+
+UPSTREAM_DURATION = Histogram(
+    "lily_upstream_request_duration_seconds", "Latency of calls to Firecrawl and DeepSeek.",
+    ["service", "operation", "outcome"], buckets=REQUEST_BUCKETS
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "lily_upstream_requests_in_flight", "Calls to Firecrawl and DeepSeek in flight.", ["service", "operation"],
+    multiprocess_mode="livesum"
+)
+UPSTREAM_RETRIES = Counter("lily_upstream_retries_total", "Retried upstream attempts by error.", ["service", "operation", "reason"])
+UPSTREAM_HEDGES = Counter(
+    "lily_upstream_hedges_total", "Hedged duplicates launched, and won by the duplicate.", ["service", "operation", "result"]
+)
+# Every process has its own breakers; in multiprocess mode the most open one is reported
+CIRCUIT_STATE = Gauge(
+    "lily_circuit_state", "Circuit breaker state per provider (0 closed, 1 half-open, 2 open).", ["service"],
+    multiprocess_mode="livemax"
+)
+CIRCUIT_REJECTIONS = Counter("lily_circuit_rejections_total", "Calls failed fast by an open circuit breaker.", ["service"])
+
+LLM_TOKENS = Counter("lily_llm_tokens_total", "Tokens sent to and generated by DeepSeek.", ["model", "kind", "source"])
+LLM_COST = Counter("lily_llm_cost_usd_total", "Estimated DeepSeek cost in US dollars.", ["model"])
+LLM_OUTPUT_ELEMENTS = Counter(
+    "lily_llm_output_elements_total", "JSON array elements parsed from model responses.", ["schema", "result"]
+)
+LLM_CONTINUATIONS = Counter(
+    "lily_llm_continuations_total", "Continuation calls re-requesting missing or invalid elements.", ["schema"]
+)
+FIRECRAWL_CREDITS = Counter("lily_firecrawl_credits_total", "Firecrawl credits reported by completed jobs.", ["operation"])
+
+CACHE_LOOKUPS = Counter("lily_cache_lookups_total", "Lookups in the local caches.", ["cache", "result"])
+LLM_CACHE_EVENTS = Counter("lily_llm_cache_events", "LLM cache hits, misses, coalesced calls and evictions.", ["event"])
+
+DB_UPSERT_DURATION = Histogram(
+    "lily_db_upsert_duration_seconds", "Duration of bulk upserts (all chunks of one call).", ["table"], buckets=DB_BUCKETS
+)
+DB_UPSERTED_ROWS = Counter("lily_db_upserted_rows_total", "Rows written by bulk upserts.", ["table"])
+
+# Hits and lookups per cache, kept alongside the counters to export the hit ratio
+_cache_totals: Dict[str, Dict[str, int]] = {}
+
+
+def llm_price(model: str) -> Optional[tuple]:
+    """
+    Return the (input, output, cache-hit input) USD price per million tokens of a model, or None if unknown.
+    Without a cache-hit price, cached input tokens are charged at the input price.
+    """
+    override = os.getenv(f"LLM_PRICE_{model.upper().replace('-', '_').replace('.', '_')}")
+    if override:
+        prices = [float(value) for value in override.split(",")]
+        return prices[0], prices[1], prices[2] if len(prices) > 2 else prices[0]
+    return DEFAULT_LLM_PRICES.get(model)
+
+
+@contextmanager
+def track_upstream(service: str, operation: str) -> Iterator[None]:
+    """
+    Time an upstream call and count it as in flight while it runs.
+    """
+    in_flight = UPSTREAM_IN_FLIGHT.labels(service, operation)
+    in_flight.inc()
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        in_flight.dec()
+        UPSTREAM_DURATION.labels(service, operation, outcome).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        STAGE_DURATION.labels(stage, outcome).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def track_upsert(table: str, rows: int) -> Iterator[None]:
+    started = time.perf_counter()
+    yield
+    DB_UPSERT_DURATION.labels(table).observe(time.perf_counter() - started)
+    DB_UPSERTED_ROWS.labels(table).inc(rows)
+
+
+def record_cache_lookup(cache: str, hit: bool, count: int = 1) -> None:
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc(count)
+    totals = _cache_totals.setdefault(cache, {"hits": 0, "lookups": 0})
+    totals["hits"] += count if hit else 0
+    totals["lookups"] += count
+
+
+def record_retry(service: str, operation: str, reason: str) -> None:
+    UPSTREAM_RETRIES.labels(service, operation, reason).inc()
+
+
+def record_hedge(service: str, operation: str, result: str) -> None:
+    UPSTREAM_HEDGES.labels(service, operation, result).inc()
+
+
+def set_circuit_state(service: str, state: int) -> None:
+    CIRCUIT_STATE.labels(service).set(state)
+
+
+def record_circuit_rejection(service: str) -> None:
+    CIRCUIT_REJECTIONS.labels(service).inc()
+
+
+def record_job_claim(recovered: bool) -> None:
+    JOB_CLAIMS.labels("recovered" if recovered else "queued").inc()
+
+
+def record_lease_lost() -> None:
+    JOB_LEASES_LOST.inc()
+
+
+def record_output_element(schema: str, valid: bool) -> None:
+    LLM_OUTPUT_ELEMENTS.labels(schema, "valid" if valid else "invalid").inc()
+
+
+def record_continuation(schema: str) -> None:
+    LLM_CONTINUATIONS.labels(schema).inc()
+
+
+def _usage_tokens(message: Any) -> Optional[tuple]:
+    # LangChain normalises usage into usage_metadata; older versions only fill response_metadata.
+    # DeepSeek reports context cache hits as prompt_cache_hit_tokens, which only the raw usage keeps.
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    usage = getattr(message, "usage_metadata", None)
+    cache_hit = token_usage.get("prompt_cache_hit_tokens")
+    if cache_hit is None:
+        cache_hit = ((usage or {}).get("input_token_details") or {}).get("cache_read") or 0
+    if usage and usage.get("input_tokens") is not None:
+        return usage["input_tokens"], usage.get("output_tokens") or 0, cache_hit
+    if token_usage.get("prompt_tokens") is not None:
+        return token_usage["prompt_tokens"], token_usage.get("completion_tokens") or 0, cache_hit
+    return None
+
+
+def record_llm_usage(model: Optional[str], messages: Any, completion: str, response: Any = None) -> None:
+    """
+    Count the prompt and completion tokens of one DeepSeek call and its estimated cost.
+    Tokens come from the response usage when present and are counted with tiktoken otherwise.
+    """
+    import kb_summary  # Imported lazily: kb_summary imports llm_cache, which records usage here
+
+    model = model or "unknown"
+    tokens = _usage_tokens(response) if response is not None else None
+    source = "reported"
+    if tokens is None:
+        prompt = "\n".join(str(getattr(message, "content", message)) for message in messages)
+        tokens = kb_summary.count_tokens(prompt), kb_summary.count_tokens(completion), 0
+        source = "counted"
+    prompt_tokens, completion_tokens, cache_hit_tokens = tokens
+    LLM_TOKENS.labels(model, "prompt", source).inc(prompt_tokens)
+    LLM_TOKENS.labels(model, "completion", source).inc(completion_tokens)
+    if cache_hit_tokens:
+        LLM_TOKENS.labels(model, "prompt_cache_hit", source).inc(cache_hit_tokens)
+    price = llm_price(model)
+    if price is not None:
+        cost = (prompt_tokens - cache_hit_tokens) * price[0] + cache_hit_tokens * price[2] + completion_tokens * price[1]
+        LLM_COST.labels(model).inc(cost / 1_000_000)
+
+
+class _CacheCollector:
+    """
+    Exports the hit ratios of the local caches in this process.
+    """
+
+    def describe(self):
+        # Registering would otherwise call collect(), which imports llm_cache while it may still be importing us
+        return []
+
+    def collect(self):
+        import llm_cache
+
+        ratio = GaugeMetricFamily("lily_cache_hit_ratio", "Share of cache lookups that were hits.", labels=["cache"])
+        for cache, totals in sorted(_cache_totals.items()):
+            ratio.add_metric([cache], totals["hits"] / totals["lookups"] if totals["lookups"] else 0.0)
+        if llm_cache._cache is not None:
+            counters = llm_cache._cache.counters
+            hits = counters["memory_hits"] + counters["disk_hits"]
+            lookups = hits + counters["misses"]
+            ratio.add_metric(["llm"], hits / lookups if lookups else 0.0)
+        yield ratio
+
+
+class _JobQueueCollector:
+    """
+    Exports the number of pipeline jobs per status, read from the shared job queue.
+    The gauge is left out of a scrape when the queue stays locked for JOB_COUNTS_TIMEOUT_SECONDS.
+    """
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        import job_queue
+
+        try:
+            counts = job_queue.counts(timeout=JOB_COUNTS_TIMEOUT_SECONDS)
+        except sqlite3.Error as e:
+            print(f"Skipping lily_pipeline_jobs: {e}")
+            return
+        jobs = GaugeMetricFamily("lily_pipeline_jobs", "Pipeline jobs in the job queue by status.", labels=["status"])
+        for status in ("queued", "running", "completed", "failed"):
+            jobs.add_metric([status], counts.get(status, 0))
+        yield jobs
+
+
+REGISTRY.register(_CacheCollector())
+REGISTRY.register(_JobQueueCollector())
+
+
+def mark_process_dead(pid: int) -> None:
+    """
+    Drop the live gauges of a process that exited (multiprocess mode only).
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid, PROMETHEUS_MULTIPROC_DIR)
+
+
+def render() -> tuple:
+    """
+    Return the (body, content type) of the /metrics response. Collecting reads SQLite (and the
+    samples of every process in multiprocess mode), so call it from a worker thread.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, PROMETHEUS_MULTIPROC_DIR)
+        registry.register(_JobQueueCollector())
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
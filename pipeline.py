@@ -0,0 +1,220 @@
+"""
+Pipeline jobs run by queue workers, with Server-Sent Events progress.
+
+POST /pipeline/run puts a job in the durable job queue (job_queue.py). Worker processes
+(worker.py, or the worker the app embeds when PIPELINE_EMBEDDED_WORKER is on) claim jobs
+and run the lead generation DAG of each as a PipelineJob, at most PIPELINE_MAX_CONCURRENCY
+per process. Every progress event is stored in the queue, so clients following a job
+through /pipeline/{job_id}/events on any web worker see the full history: events are
+replayed from the start (or from Last-Event-ID) and new ones are picked up as they land.
+"""
+import asyncio
+import datetime
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import job_queue
+import metrics
+
+# Maximum number of pipelines that run at the same time in one worker process
+PIPELINE_MAX_CONCURRENCY = int(os.getenv("PIPELINE_MAX_CONCURRENCY", "8"))
+
+# Seconds an idle worker waits before looking for queued jobs again
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+
+# Seconds between reads of new job events while streaming them
+SSE_POLL_SECONDS = float(os.getenv("SSE_POLL_SECONDS", "0.5"))
+
+# Seconds between SSE keep-alive comments while a job is quiet
+SSE_KEEPALIVE_SECONDS = 15
+
+FINISHED_STATUSES = job_queue.FINISHED_STATUSES
+
+# A named pipeline stage and the coroutine factory that runs it
+Stage = Tuple[str, Callable[[], Awaitable[Dict[str, Any]]]]
+
+# Builds the stages of a job from its id and params: (stages, coroutine run after every stage succeeded)
+StageBuilder = Callable[[str, Dict[str, Any]], Tuple[List[Stage], Optional[Callable[[], Awaitable[None]]]]]
+
+
+class PipelineJob:
+    """
+    State of one claimed attempt of a pipeline job. Every event is written to the job queue
+    together with the job state, fenced by the attempt number.
+    """
+
+    def __init__(self, job_id: str, params: Dict[str, Any], worker_id: str, attempt: int, created_at: datetime.datetime):
+        self.job_id = job_id
+        self.params = params
+        self.worker_id = worker_id
+        self.attempt = attempt
+        self.status = "queued"
+        self.stages: Dict[str, str] = {}
+        self.error: Optional[str] = None
+        self.created_at = created_at
+        self.lease_lost = False
+
+    async def publish(self, event: str, data: Dict[str, Any]) -> None:
+        """
+        Store an event and the current job state.
+        """
+        state = {"status": self.status, "stages": self.stages, "error": self.error}
+        await asyncio.to_thread(job_queue.publish, self.job_id, self.worker_id, self.attempt, event, data, state)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "stages": dict(self.stages),
+            "error": self.error,
+            "attempt": self.attempt,
+            "worker_id": self.worker_id,
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    data = json.dumps(event["data"], ensure_ascii=False, default=str)
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {data}\n\n"
+
+
+async def stream_events(job_id: str, last_event_id: int = -1) -> AsyncIterator[str]:
+    """
+    Yield the events of a job formatted as SSE messages until the job has finished.
+    """
+    position = last_event_id
+    quiet = 0.0
+    while True:
+        status, events = await asyncio.to_thread(job_queue.events, job_id, position)
+        for event in events:
+            yield format_sse(event)
+            position = event["id"]
+        if status is None or status in FINISHED_STATUSES:
+            return
+        if events:
+            quiet = 0.0
+        elif quiet >= SSE_KEEPALIVE_SECONDS:
+            quiet = 0.0
+            yield ": keep-alive\n\n"
+        await asyncio.sleep(SSE_POLL_SECONDS)
+        quiet += SSE_POLL_SECONDS
+
+
+async def _run_stages(
+    job: PipelineJob,
+    stages: List[Stage],
+    on_complete: Optional[Callable[[], Awaitable[None]]] = None
+) -> None:
+    # Stages run in order and a failing stage stops the pipeline. A stage whose result contains
+    # "skipped": true is reported as skipped. on_complete runs after every stage has succeeded.
+    for name, _ in stages:
+        job.stages[name] = "pending"
+    job.status = "running"
+    await job.publish("status", job.summary())
+
+    metrics.PIPELINES_IN_FLIGHT.inc()
+    try:
+        for name, run_stage in stages:
+            job.stages[name] = "running"
+            await job.publish("stage", {"stage": name, "status": "running"})
+            try:
+                with metrics.track_stage(name):
+                    result = await run_stage()
+            except Exception as e:
+                job.stages[name] = "failed"
+                job.error = getattr(e, "detail", None) or str(e)
+                job.status = "failed"
+                await job.publish("stage", {"stage": name, "status": "failed", "error": job.error})
+                await job.publish("status", job.summary())
+                return
+            job.stages[name] = "skipped" if result.get("skipped") else "completed"
+            await job.publish("stage", {"stage": name, "status": job.stages[name], "result": result})
+
+        if on_complete:
+            await on_complete()
+        job.status = "completed"
+        await job.publish("status", job.summary())
+    finally:
+        metrics.PIPELINES_IN_FLIGHT.dec()
+
+
+async def _heartbeat(job: PipelineJob, task: asyncio.Task) -> None:
+    # Renew the lease while the job runs; stop the job if another worker has taken it over
+    while True:
+        await asyncio.sleep(job_queue.JOB_HEARTBEAT_SECONDS)
+        try:
+            owned = await asyncio.to_thread(job_queue.heartbeat, job.job_id, job.worker_id, job.attempt)
+        except Exception as e:
+            # A busy database is not a lost lease; the next heartbeat tries again
+            print(f"Heartbeat of job {job.job_id} failed: {e}")
+            continue
+        if not owned:
+            job.lease_lost = True
+            task.cancel()
+            return
+
+
+async def _run_claimed(claimed: Dict[str, Any], build_stages: StageBuilder, worker_id: str) -> None:
+    job = PipelineJob(claimed["job_id"], claimed["params"], worker_id, claimed["attempt"], claimed["created_at"])
+    metrics.record_job_claim(claimed["recovered"])
+    heartbeat = asyncio.create_task(_heartbeat(job, asyncio.current_task()))
+    try:
+        stages, on_complete = build_stages(job.job_id, job.params)
+        await _run_stages(job, stages, on_complete)
+    except asyncio.CancelledError:
+        if job.lease_lost:
+            metrics.record_lease_lost()
+            print(f"Job {job.job_id} attempt {job.attempt} lost its lease; stopped.")
+            return
+        # The worker is shutting down: hand the job back so another worker resumes it right away
+        await asyncio.to_thread(job_queue.release, job.job_id, worker_id, job.attempt)
+        raise
+    except job_queue.LeaseLostError as e:
+        metrics.record_lease_lost()
+        print(e)
+    except Exception as e:
+        job.status, job.error = "failed", str(e)
+        try:
+            await job.publish("status", job.summary())
+        except job_queue.LeaseLostError:
+            pass
+    finally:
+        heartbeat.cancel()
+
+
+async def work(build_stages: StageBuilder, worker_id: Optional[str] = None, concurrency: int = PIPELINE_MAX_CONCURRENCY) -> None:
+    """
+    Claim queued pipeline jobs and run them, at most `concurrency` at a time, until cancelled.
+    Jobs still running when the worker is cancelled are put back in the queue.
+    """
+    worker_id = worker_id or job_queue.new_worker_id()
+    slots = asyncio.Semaphore(concurrency)
+    running: Set[asyncio.Task] = set()
+
+    def finished(task: asyncio.Task) -> None:
+        running.discard(task)
+        slots.release()
+
+    print(f"Pipeline worker {worker_id} started ({concurrency} jobs at a time).")
+    try:
+        while True:
+            await slots.acquire()
+            try:
+                claimed = await asyncio.to_thread(job_queue.claim, worker_id)
+            except Exception as e:
+                print(f"Claiming a job failed: {e}")
+                claimed = None
+            if claimed is None:
+                slots.release()
+                await asyncio.sleep(JOB_POLL_SECONDS)
+                continue
+            task = asyncio.create_task(_run_claimed(claimed, build_stages, worker_id))
+            running.add(task)
+            task.add_done_callback(finished)
+    finally:
+        tasks = list(running)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
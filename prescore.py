@@ -0,0 +1,182 @@
+"""
+Local pre-scoring of extracted candidates before the prioritization LLM call.
+
+Firecrawl's extraction returns everything that looks like a name on an event page, including
+associations, magazines, trade shows and fragments such as "AI". Every candidate is scored
+with a few cheap features combined by a NumPy weight vector:
+
+- keyword overlap between the name and the company profile
+- name quality (corporate suffix, length, digits, URL-like names, non-company terms)
+- whether the company was already prioritized in an earlier run
+
+Only the PRESCORE_TOP_K best go into the prompt (in their original order, so the shards stay
+stable between runs). Candidates are dropped outright only when a milder weighting
+(CUTOFF_WEIGHTS) scores them below PRESCORE_MIN_SCORE. In it the length and digit features
+count for nothing, since short names and tickers such as "GE", "BP" or "3M" are real companies
+often enough, and a URL-like name or a non-company term only counts against a name together with
+another negative signal: "Amazon.com, Inc.", "Booking.com", "Bloomberg Media" and "Mayo Clinic"
+rank lower but are not dropped, "www.pv-magazine.com" is.
+"""
+import glob
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+import workspace
+
+PRESCORE_TOP_K = int(os.getenv("PRESCORE_TOP_K", "100"))
+PRESCORE_MIN_SCORE = float(os.getenv("PRESCORE_MIN_SCORE", "0"))
+
+CORPORATE_SUFFIX = re.compile(
+    r"\b(inc|incorporated|corp|corporation|co|company|ltd|limited|llc|plc|gmbh|ag|se|sa|s\.a|spa|s\.p\.a|nv|bv|ab|oy|as|kg|"
+    r"kgaa|pte|pty|k\.k|group|holdings?|industries|technologies|solutions|systems|chemicals?|international)\b\.?",
+    re.IGNORECASE
+)
+NON_COMPANY_TERMS = re.compile(
+    r"\b(association|associations|council|federation|society|institute|university|universit\w*|college|school|"
+    r"hospital|klinikum|clinic|ministry|department|agency|government|magazine|journal|news|newsletter|media|"
+    r"conference|congress|expo|exhibition|fair|show|summit|forum|week|awards?|trade show|webinar|committee)\b",
+    re.IGNORECASE
+)
+URL_LIKE = re.compile(r"https?://|www\.|@|\.(com|org|net|io|de|fr|uk)\b", re.IGNORECASE)
+WORD = re.compile(r"[a-zA-ZÀ-ɏ]{3,}")
+
+STOPWORDS = {
+    "the", "and", "for", "with", "our", "their", "that", "this", "from", "are", "was", "has", "have", "into", "such",
+    "company", "companies", "customer", "customers", "information", "product", "products", "service", "services",
+    "industry", "industries", "target", "profile", "value", "case", "cases", "use", "typical", "including",
+}
+
+# Feature weights: bias, keyword overlap, corporate suffix, known company,
+# non-company term, too short, URL-like, digit heavy, too long
+FEATURE_WEIGHTS = np.array([0.5, 1.0, 1.0, 2.0, -1.5, -2.0, -2.0, -1.0, -1.0])
+# Weights of the PRESCORE_MIN_SCORE cut-off: a single URL-like or non-company signal stays above 0
+CUTOFF_WEIGHTS = np.array([0.5, 1.0, 1.0, 2.0, -0.4, 0.0, -0.4, 0.0, -1.0])
+
+# known_companies() results, keyed on the (path, mtime, size) of the files they were read from
+_known_cache: Dict[tuple, Set[str]] = {}
+KNOWN_CACHE_ENTRIES = 16
+
+
+def _stem(word: str) -> str:
+    # Five-letter prefixes make "chemical", "chemicals" and "chemistry" match
+    return word.lower()[:5]
+
+
+def profile_terms(company_profile: str) -> Set[str]:
+    """
+    Return the stemmed content words of the company profile.
+    """
+    return {_stem(word) for word in WORD.findall(company_profile) if word.lower() not in STOPWORDS}
+
+
+def _known_files(exclude_run_id: Optional[str]) -> tuple:
+    pattern = os.path.join(workspace.RUNS_DIR, "*", workspace.ARTIFACT_PATHS["prioritized_companies"])
+    excluded = workspace.artifact_path("prioritized_companies", exclude_run_id, create_dir=False) if exclude_run_id else None
+    files = []
+    for path in sorted(glob.glob(pattern)) + [workspace.artifact_path("prioritized_companies", None, create_dir=False)]:
+        if excluded is not None and os.path.normpath(path) == os.path.normpath(excluded):
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        files.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(files)
+
+
+def known_companies(exclude_run_id: Optional[str] = None) -> Set[str]:
+    """
+    Return the lowercase names of every company prioritized in earlier runs (shared data/ and data/runs/),
+    leaving out the output of exclude_run_id so a run re-scored after a resume does not reward itself.
+    The files are only parsed again when one of them has been added, removed or changed.
+    """
+    files = _known_files(exclude_run_id)
+    if files not in _known_cache:
+        if len(_known_cache) >= KNOWN_CACHE_ENTRIES:
+            _known_cache.clear()
+        _known_cache[files] = _read_known(path for path, _, _ in files)
+    return _known_cache[files]
+
+
+def known_companies_digest(exclude_run_id: Optional[str] = None) -> str:
+    """
+    Return a hash of known_companies(exclude_run_id), which changes whenever that set does.
+    """
+    names = sorted(known_companies(exclude_run_id))
+    return hashlib.sha256("\n".join(names).encode("utf-8")).hexdigest()
+
+
+def _read_known(paths: Iterable[str]) -> Set[str]:
+    names = set()
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                companies = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if isinstance(companies, list):
+            names.update(
+                company["company_name"].strip().lower()
+                for company in companies
+                if isinstance(company, dict) and isinstance(company.get("company_name"), str)
+            )
+    return names
+
+
+def feature_matrix(candidates: List[str], terms: Set[str], known: Set[str]) -> np.ndarray:
+    """
+    Return the (candidates x features) matrix in FEATURE_WEIGHTS order.
+    """
+    names = np.array(candidates, dtype=object)
+    lengths = np.array([len(name) for name in candidates])
+    token_lists = [WORD.findall(name) for name in candidates]
+    token_counts = np.array([len(name.split()) for name in candidates])
+
+    overlap = np.array([
+        len({_stem(token) for token in tokens} & terms) / len(tokens) if tokens else 0.0
+        for tokens in token_lists
+    ])
+    digits = np.array([sum(char.isdigit() for char in name) for name in candidates])
+    # Two letters are often fragments ("AI", "IT") but also tickers ("GE", "BP"): rank-only, see CUTOFF_WEIGHTS
+    too_short = lengths < 3
+
+    return np.column_stack([
+        np.ones(len(candidates)),
+        overlap,
+        np.array([bool(CORPORATE_SUFFIX.search(name)) for name in names], dtype=float),
+        np.array([name.strip().lower() in known for name in names], dtype=float),
+        np.array([bool(NON_COMPANY_TERMS.search(name)) for name in names], dtype=float),
+        too_short.astype(float),
+        np.array([bool(URL_LIKE.search(name)) for name in names], dtype=float),
+        (digits > 0.3 * np.maximum(lengths, 1)).astype(float),
+        (token_counts > 8).astype(float),
+    ])
+
+
+def prescore(candidates: List[str], company_profile: str, run_id: Optional[str] = None) -> Dict[str, object]:
+    """
+    Score the candidates of a run and keep at most PRESCORE_TOP_K of those scoring at least PRESCORE_MIN_SCORE.
+    Returns {"selected": names in their original order, "dropped": [{"company_name", "score"}]}.
+    """
+    if not candidates:
+        return {"selected": [], "dropped": []}
+    features = feature_matrix(candidates, profile_terms(company_profile), known_companies(run_id))
+    scores = features @ FEATURE_WEIGHTS
+    cutoff_scores = features @ CUTOFF_WEIGHTS
+
+    # Highest score first, ties by original position; then restore the original order of the survivors
+    order = np.lexsort((np.arange(len(candidates)), -scores))
+    keep = [index for index in order if cutoff_scores[index] >= PRESCORE_MIN_SCORE][:PRESCORE_TOP_K]
+    kept = set(keep)
+    return {
+        "selected": [candidates[index] for index in sorted(keep)],
+        "dropped": [
+            {"company_name": candidates[index], "score": round(float(scores[index]), 2)}
+            for index in order if index not in kept
+        ],
+    }
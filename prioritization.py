@@ -0,0 +1,122 @@
+"""
+Sharded prioritisation of potential customers.
+
+The candidate list is split into shards of PRIORITIZE_SHARD_SIZE companies that are scored
+in parallel LLM calls (at most PRIORITIZE_CONCURRENCY at a time). Every shard returns all of
+its valid companies with a 0-100 score, so no single response has to hold the whole list.
+The shard results are then merged with a deterministic global ranking (score, then name)
+and cut to the top PRIORITIZE_TOP_N companies.
+"""
+import asyncio
+import os
+from typing import Any, Dict, List
+
+from pydantic import BaseModel, Field, field_validator
+
+import prompts
+import structured_output
+
+PRIORITIZE_SHARD_SIZE = int(os.getenv("PRIORITIZE_SHARD_SIZE", "25"))
+PRIORITIZE_CONCURRENCY = int(os.getenv("PRIORITIZE_CONCURRENCY", "8"))
+PRIORITIZE_TOP_N = 50
+
+
+def candidate_names(potential_data: Any) -> List[str]:
+    """
+    Return the distinct company names of a potential_customer.json document in their original order.
+    Accepts the Firecrawl extract shape ({"data": {"companies": [...]}}) as well as a plain list.
+    """
+    if isinstance(potential_data, dict):
+        potential_data = (potential_data.get("data") or {}).get("companies") or []
+    names = {}
+    for item in potential_data:
+        name = item.get("company_name") if isinstance(item, dict) else item
+        if isinstance(name, str) and name.strip():
+            names.setdefault(name.strip().lower(), name.strip())
+    return list(names.values())
+
+
+class ShardCompany(BaseModel):
+    """
+    One scored company of a shard response; the fields the outreach endpoints need are always strings.
+    """
+    company_name: str = Field(min_length=1)
+    industry: str = ""
+    revenue: str = ""
+    size: str = ""
+    stakeholder_name: str = ""
+    stakeholder_position: str = ""
+    stakeholder_email: str = ""
+    stakeholder_phone: str = ""
+    stakeholder_link: str = ""
+    score: int = Field(ge=0, le=100)
+    reasoning: str = ""
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def _nulls_and_numbers(cls, value: Any, info) -> Any:
+        # Models return null for unknown fields and numbers for revenue or size
+        if info.field_name == "score":
+            return round(float(value)) if isinstance(value, (int, float, str)) and str(value).strip() else value
+        if value is None:
+            return ""
+        return str(value).strip() if isinstance(value, (int, float)) else value
+
+
+def _score(company: Dict[str, Any]) -> float:
+    try:
+        return float(company.get("score") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def merge_rankings(shard_results: List[List[Dict[str, Any]]], top_n: int = PRIORITIZE_TOP_N) -> List[Dict[str, Any]]:
+    """
+    Merge the scored shards into one global ranking: highest score first, ties broken by name,
+    duplicates (by case-insensitive name) keep their best-scored entry.
+    """
+    best = {}
+    for companies in shard_results:
+        for company in companies:
+            key = company["company_name"].strip().lower()
+            if key not in best or _score(company) > _score(best[key]):
+                best[key] = company
+    ranked = sorted(best.values(), key=lambda company: (-_score(company), company["company_name"].strip().lower()))
+    return ranked[:top_n]
+
+
+async def prioritize(candidates: List[str], profile_digest: str, llm: Any) -> Dict[str, Any]:
+    """
+    Score the candidates shard by shard in parallel against the company profile digest and return
+    {"companies", "shards", "failed_shards", "continuations", "invalid_companies"}.
+    Every shard response is parsed element by element (see structured_output.py), so a malformed or
+    cut-off response keeps its valid companies and only the rest is re-requested.
+    Raises RuntimeError if every shard failed.
+    """
+    shards = [candidates[i:i + PRIORITIZE_SHARD_SIZE] for i in range(0, len(candidates), PRIORITIZE_SHARD_SIZE)]
+    semaphore = asyncio.Semaphore(PRIORITIZE_CONCURRENCY)
+
+    async def score_shard(shard: List[str]) -> Dict[str, Any]:
+        async with semaphore:
+            result = await structured_output.generate_list(
+                llm, prompts.shard_messages(profile_digest, shard), ShardCompany,
+                key=lambda company: company["company_name"].strip().lower()
+            )
+            if result["invalid"]:
+                print(f"Prioritization shard dropped {len(result['invalid'])} invalid companies")
+            return result
+
+    results = await asyncio.gather(*(score_shard(shard) for shard in shards), return_exceptions=True)
+    failed = [{"shard": index, "error": str(result)} for index, result in enumerate(results) if isinstance(result, Exception)]
+    for failure in failed:
+        print(f"Prioritization shard {failure['shard']} failed: {failure['error']}")
+    if shards and len(failed) == len(shards):
+        raise RuntimeError(f"all {len(shards)} prioritization shards failed: {failed[0]['error']}")
+    scored = [result for result in results if not isinstance(result, Exception)]
+    return {
+        "companies": merge_rankings([result["items"] for result in scored]),
+        "shards": len(shards),
+        "failed_shards": failed,
+        "continuations": sum(result["continuations"] for result in scored),
+        "invalid_companies": sum(len(result["invalid"]) for result in scored),
+    }
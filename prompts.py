@@ -0,0 +1,183 @@
+"""
+Prompt assembly with a stable, cacheable prefix.
+
+DeepSeek caches prompt prefixes on its side: tokens of a prompt that start exactly like an
+earlier one are served from the context cache, billed at the cache-hit price and processed
+faster. Every prompt built here therefore has the same layout:
+
+1. a system message with the task instructions followed by the company profile digest,
+   byte-identical for every call of the same task in a run (the shared prefix)
+2. a user message with the data that changes per call (one customer, one shard, ...)
+
+The profile digest is a compacted copy of company_profile.md (markdown decoration and
+repeated lines removed, cut to PROFILE_DIGEST_TOKENS tokens with every section keeping its
+heading and a share of the budget). It is computed once per run and stored next to the
+profile as profile_digest.md, tagged with the hash of the profile it was built from (calls
+without a run keep it in memory). The events call, which has no per-call data, sends the fixed
+EVENTS_REQUEST as its user message.
+"""
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+import kb_summary
+import workspace
+
+PROFILE_DIGEST_TOKENS = int(os.getenv("PROFILE_DIGEST_TOKENS", "1500"))
+
+PROFILE_HEADER = "Our company profile:\n\n"
+
+OUTREACH_INSTRUCTIONS = (
+    "You are a sales outreach expert. The user message contains the information of one potential customer company. "
+    "Based on that information and our company profile below, plus deep search potential customer company information in public, "
+    "draft a personalized outreach email that is professional, engaging, and tailored to the potential customer. "
+    "The email should reference specific details from both our company profile and the potential customer's data, "
+    "explain why our product is a good fit for them, and include a clear call to action. "
+    "Output the email as plain text with no additional commentary."
+)
+
+PRIORITIZE_INSTRUCTIONS = (
+    "You are a market research expert. Based on our company profile below and the potential customer data in the user message, "
+    "analyze public data to prioritize the potential customer companies. Assess each company on approximate revenue, "
+    "company size, industry fit, and overall alignment with our products. Companies with higher revenue, "
+    "larger scale, and better industry fit must get a higher score. Skip any entry that appears to be fake or not a legitimate company. "
+    "For each valid company, locate key decision-makers and return specific names along with their positions, email addresses, and phone numbers. "
+    "For the field stakeholder_link, search for the candidate's LinkedIn Sales Navigator profile link; if not found, return an empty string without fabricating data. "
+    "Return the results strictly as valid JSON with no extra text, explanations, or markdown formatting. "
+    "The output should be a JSON array sorted by priority (highest priority first), where each object contains the following fields:\n"
+    "  - company_name (string)\n"
+    "  - industry (string)\n"
+    "  - revenue (string)\n"
+    "  - size (string)\n"
+    "  - stakeholder_name (string)\n"
+    "  - stakeholder_position (string)\n"
+    "  - stakeholder_email (string)\n"
+    "  - stakeholder_phone (string)\n"
+    "  - stakeholder_link (string)\n"
+    "  - score (integer from 0 to 100): overall priority on an absolute scale, comparable across separate lists.\n"
+    "  - reasoning (string): one to two sentences explaining the prioritization.\n\n"
+    "Output every valid company of the list in the user message."
+)
+
+# Fixed user turn of the events call: every conversation goes system -> user (-> assistant -> user),
+# which deepseek-reasoner and other OpenAI-compatible backends require
+EVENTS_REQUEST = "List the events as a JSON array."
+
+EVENTS_INSTRUCTIONS = (
+    "You are an expert market analyst specialized in identifying potential event opportunities. "
+    "Based on our company profile below, please provide a structured JSON array of relevant trade associations, industry events, and bodies where target customers are likely to attend (based on public information). "
+    "Each event object should have the following fields: "
+    "name (string), url (string), and category (string, one of ['Associations', 'Exhibitions', 'News']). "
+    "Return only valid JSON with no extra text, no markdown fences, and no additional keys."
+)
+
+# Numbered sections ("1. Company Information:") and markdown headings start a new section
+SECTION_HEADING = re.compile(r"^(#{1,6}\s|\d+\.\s+\S.*:$)")
+MARKDOWN_NOISE = re.compile(r"\*\*|__|(?<!`)`(?!`)|<[^>]+>")
+
+# Digest of the shared (run-less) company profile, keyed on its profile hash
+_shared_digests: Dict[str, str] = {}
+
+
+def _profile_hash(company_profile: str, max_tokens: int) -> str:
+    return hashlib.sha256(f"{max_tokens}\n{company_profile}".encode("utf-8")).hexdigest()
+
+
+def _sections(lines: List[str]) -> List[Dict[str, Any]]:
+    sections = [{"heading": None, "lines": []}]
+    for line in lines:
+        if SECTION_HEADING.match(line):
+            sections.append({"heading": line, "lines": []})
+        else:
+            sections[-1]["lines"].append(line)
+    return [section for section in sections if section["heading"] or section["lines"]]
+
+
+def compact_profile(company_profile: str, max_tokens: int = PROFILE_DIGEST_TOKENS) -> str:
+    """
+    Return a deterministic, token-budgeted digest of a company profile.
+    """
+    lines, seen = [], set()
+    for raw in company_profile.splitlines():
+        line = re.sub(r"\s+", " ", MARKDOWN_NOISE.sub("", raw)).strip()
+        if not line or line.startswith("```") or set(line) <= set("-=*_|: ") or line.lower() in seen:
+            continue
+        seen.add(line.lower())
+        lines.append(line)
+    digest = "\n".join(lines)
+    if kb_summary.count_tokens(digest) <= max_tokens:
+        return digest
+
+    # Over budget: keep every heading, give each section an equal share of the rest and
+    # hand what a short section leaves unused to the following ones, in document order
+    sections = _sections(lines)
+    budget = max_tokens - sum(kb_summary.count_tokens(s["heading"]) + 1 for s in sections if s["heading"])
+    kept = []
+    for index, section in enumerate(sections):
+        share = max(0, budget) // (len(sections) - index)
+        used, body = 0, []
+        for line in section["lines"]:
+            cost = kb_summary.count_tokens(line) + 1
+            if used + cost > share:
+                continue
+            used += cost
+            body.append(line)
+        budget -= used
+        kept += ([section["heading"]] if section["heading"] else []) + body
+    return "\n".join(kept)
+
+
+def profile_digest(company_profile: str, run_id: Optional[str] = None, max_tokens: int = PROFILE_DIGEST_TOKENS) -> str:
+    """
+    Return the digest of the run's company profile, computing and storing it on first use.
+    Without a run_id the digest is kept in memory only, never written to the shared data/ tree.
+    """
+    profile_hash = _profile_hash(company_profile, max_tokens)
+    if run_id is None:
+        if profile_hash not in _shared_digests:
+            _shared_digests.clear()
+            _shared_digests[profile_hash] = compact_profile(company_profile, max_tokens)
+        return _shared_digests[profile_hash]
+
+    path = workspace.artifact_path("profile_digest", run_id)
+    tag = f"<!-- profile {profile_hash} -->\n"
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            stored = f.read()
+        if stored.startswith(tag):
+            return stored[len(tag):]
+    digest = compact_profile(company_profile, max_tokens)
+    workspace.write_text(path, tag + digest)
+    return digest
+
+
+def build_messages(instructions: str, digest: str, data: Optional[str] = None) -> List[Dict[str, str]]:
+    """
+    Return the messages of one call: the stable prefix (instructions and profile digest) as the
+    system message, and the per-call data, if any, as the user message.
+    """
+    messages = [{"role": "system", "content": f"{instructions}\n\n{PROFILE_HEADER}{digest}"}]
+    if data is not None:
+        messages.append({"role": "user", "content": data})
+    return messages
+
+
+def outreach_messages(digest: str, company: Dict[str, Any]) -> List[Dict[str, str]]:
+    return build_messages(
+        OUTREACH_INSTRUCTIONS, digest,
+        "The potential customer company information is as follows:\n\n"
+        f"{json.dumps(company, indent=2, ensure_ascii=False)}"
+    )
+
+
+def shard_messages(digest: str, shard: List[str]) -> List[Dict[str, str]]:
+    return build_messages(
+        PRIORITIZE_INSTRUCTIONS, digest,
+        f"Potential Customer Data:\n{json.dumps(shard, ensure_ascii=False, indent=2)}"
+    )
+
+
+def events_messages(digest: str) -> List[Dict[str, str]]:
+    return build_messages(EVENTS_INSTRUCTIONS, digest, EVENTS_REQUEST)
@@ -0,0 +1,311 @@
+"""
+One resilience layer for the calls to DeepSeek and Firecrawl.
+
+Every upstream call goes through call() (or stream() for streamed LLM responses), which adds:
+
+- per-provider deadlines: every attempt is cut off after <PROVIDER>_TIMEOUT_SECONDS and the
+  call as a whole, retries included, after <PROVIDER>_DEADLINE_SECONDS
+- retries with jittered exponential backoff (tenacity) on 429, 5xx, timeouts and connection
+  errors, up to <PROVIDER>_MAX_ATTEMPTS attempts; a Retry-After header is honoured
+- optional hedging of idempotent calls: if an attempt has not finished after
+  <PROVIDER>_HEDGE_AFTER_SECONDS, a duplicate is started and the first answer wins
+  (0 disables it; on by default only for Firecrawl, whose status polls are free)
+- a circuit breaker per provider: after <PROVIDER>_BREAKER_THRESHOLD consecutive failures
+  (5xx, timeouts, connection errors) calls fail fast with CircuitOpenError for
+  <PROVIDER>_BREAKER_COOLDOWN_SECONDS, then a single trial call decides whether it closes
+
+Breaker state is kept per process. Timing out a call to a synchronous SDK (Firecrawl) stops
+waiting for it, while its worker thread finishes in the background; calls that start paid
+work (crawls, extracts) are therefore short submissions with an idempotency key, and the
+long waits are status polls.
+"""
+import asyncio
+import email.utils
+import os
+import re
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+import openai
+import requests
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, stop_before_delay, wait_random_exponential
+
+import metrics
+
+T = TypeVar("T")
+
+# Defaults per provider; every value can be overridden with <PROVIDER>_<NAME>, e.g. DEEPSEEK_TIMEOUT_SECONDS
+PROVIDER_DEFAULTS = {
+    "deepseek": {
+        "timeout_seconds": 300, "deadline_seconds": 900, "max_attempts": 4, "hedge_after_seconds": 0,
+        "breaker_threshold": 5, "breaker_cooldown_seconds": 30,
+    },
+    "firecrawl": {
+        "timeout_seconds": 60, "deadline_seconds": 300, "max_attempts": 4, "hedge_after_seconds": 10,
+        "breaker_threshold": 5, "breaker_cooldown_seconds": 30,
+    },
+}
+BACKOFF_INITIAL_SECONDS = float(os.getenv("RETRY_BACKOFF_INITIAL_SECONDS", "1"))
+BACKOFF_MAX_SECONDS = float(os.getenv("RETRY_BACKOFF_MAX_SECONDS", "30"))
+
+# 409 is not retried: Firecrawl answers a reused idempotency key with 409 Conflict, so retrying a keyed
+# submission whose first attempt was accepted can only fail again
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+# The Firecrawl SDK re-raises HTTP errors as ValueError(message, 500), so the status is read from the message
+FIRECRAWL_STATUS_MESSAGES = {
+    "Payment Required": 402, "Website Not Supported": 403, "Request Timeout": 408, "Conflict": 409,
+    "Internal Server Error": 500,
+}
+STATUS_IN_MESSAGE = re.compile(r"[Ss]tatus code:? (\d{3})")
+TRANSIENT_ERRORS = (
+    asyncio.TimeoutError, TimeoutError, ConnectionError, httpx.TransportError, requests.ConnectionError,
+    requests.Timeout, openai.APIConnectionError,
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling a provider whose circuit breaker is open.
+    """
+
+
+def setting(provider: str, name: str) -> float:
+    return float(os.getenv(f"{provider.upper()}_{name.upper()}", str(PROVIDER_DEFAULTS[provider][name])))
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    """
+    Return the HTTP status behind an upstream error, if there is one.
+    """
+    for source in (error, getattr(error, "response", None)):
+        code = getattr(source, "status_code", None)
+        if isinstance(code, int):
+            return code
+    message = str(error)
+    match = STATUS_IN_MESSAGE.search(message)
+    if match:
+        return int(match.group(1))
+    for text, code in FIRECRAWL_STATUS_MESSAGES.items():
+        if text in message:
+            return code
+    return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    return status_code(error) in RETRYABLE_STATUS_CODES
+
+
+def _is_outage(error: BaseException) -> bool:
+    # Failures that say the provider is unhealthy; rate limits and client errors do not count
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    code = status_code(error)
+    return code is not None and code >= 500
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker: closed -> open after `threshold` failures ->
+    half-open after `cooldown` seconds, where one trial call closes or re-opens it.
+    """
+
+    STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= setting(self.provider, "breaker_cooldown_seconds"):
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "open" or (state == "half_open" and self.trial_running):
+            metrics.record_circuit_rejection(self.provider)
+            raise CircuitOpenError(f"{self.provider} circuit is open after {self.failures} consecutive failures")
+        if state == "half_open":
+            self.trial_running = True
+
+    def release(self) -> None:
+        # A cancelled call says nothing about the provider, but must not block the next trial
+        self.trial_running = False
+
+    def record(self, error: Optional[BaseException]) -> None:
+        self.trial_running = False
+        if error is None:
+            self.failures, self.opened_at = 0, None
+        elif _is_outage(error):
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= setting(self.provider, "breaker_threshold"):
+                self.opened_at = time.monotonic()
+        metrics.set_circuit_state(self.provider, self.STATES[self.state])
+
+
+breakers: Dict[str, CircuitBreaker] = {}
+
+
+def breaker(provider: str) -> CircuitBreaker:
+    return breakers.setdefault(provider, CircuitBreaker(provider))
+
+
+async def _hedged(provider: str, operation: str, attempt: Callable[[], Awaitable[T]], hedge_after: float) -> T:
+    # Start a duplicate if the first attempt is slow; the first successful answer wins
+    tasks = [asyncio.ensure_future(attempt())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if not done:
+            metrics.record_hedge(provider, operation, "launched")
+            tasks.append(asyncio.ensure_future(attempt()))
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not tasks[0]:
+                        metrics.record_hedge(provider, operation, "won")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _retrying(provider: str, operation: str, deadline: float) -> AsyncRetrying:
+    started = time.monotonic()
+    backoff = wait_random_exponential(multiplier=BACKOFF_INITIAL_SECONDS, max=BACKOFF_MAX_SECONDS)
+
+    def wait(retry_state) -> float:
+        delay = max(backoff(retry_state), _retry_after(retry_state.outcome.exception()) or 0)
+        return max(0.0, min(delay, deadline - (time.monotonic() - started)))
+
+    def before_sleep(retry_state) -> None:
+        error = retry_state.outcome.exception()
+        metrics.record_retry(provider, operation, str(status_code(error) or type(error).__name__))
+        print(f"{provider} {operation} attempt {retry_state.attempt_number} failed, retrying: {error!r}")
+
+    return AsyncRetrying(
+        stop=stop_after_attempt(int(setting(provider, "max_attempts"))) | stop_before_delay(deadline),
+        wait=wait,
+        retry=retry_if_exception(is_retryable),
+        before_sleep=before_sleep,
+        reraise=True,
+    )
+
+
+async def call(
+    provider: str,
+    operation: str,
+    fn: Callable[[], Awaitable[T]],
+    idempotent: bool = False,
+    timeout: Optional[float] = None,
+    deadline: Optional[float] = None,
+) -> T:
+    """
+    Run `await fn()` against a provider with its deadlines, retries, circuit breaker and, for
+    idempotent calls, hedging. `fn` is called once per attempt; timeout and deadline override
+    the provider's settings for slow operations.
+    """
+    timeout = timeout or setting(provider, "timeout_seconds")
+    deadline = deadline or setting(provider, "deadline_seconds")
+    hedge_after = setting(provider, "hedge_after_seconds") if idempotent else 0
+    circuit = breaker(provider)
+    finish_by = time.monotonic() + deadline
+
+    async def attempt() -> T:
+        circuit.before_call()
+        try:
+            with metrics.track_upstream(provider, operation):
+                result = await asyncio.wait_for(fn(), timeout=max(0.001, min(timeout, finish_by - time.monotonic())))
+        except asyncio.CancelledError:
+            circuit.release()
+            raise
+        except Exception as e:
+            circuit.record(e)
+            raise
+        circuit.record(None)
+        return result
+
+    async for retry in _retrying(provider, operation, deadline):
+        with retry:
+            if hedge_after > 0:
+                return await _hedged(provider, operation, attempt, hedge_after)
+            return await attempt()
+
+
+async def stream(provider: str, operation: str, open_stream: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+    """
+    Yield the chunks of a streamed response. Opening the stream is retried like call() until the
+    first chunk arrives; after that a failure is raised to the consumer, which keeps what it got.
+    Every wait for a chunk is bounded by the provider timeout and the whole stream by its deadline.
+    """
+    timeout = setting(provider, "timeout_seconds")
+    deadline = setting(provider, "deadline_seconds")
+    circuit = breaker(provider)
+    finish_by = time.monotonic() + deadline
+
+    def remaining() -> float:
+        return max(0.001, min(timeout, finish_by - time.monotonic()))
+
+    async def first_chunk() -> tuple:
+        circuit.before_call()
+        chunks = open_stream()
+        try:
+            return chunks, await asyncio.wait_for(chunks.__anext__(), timeout=remaining())
+        except StopAsyncIteration:
+            return chunks, None
+        except BaseException as e:
+            if isinstance(e, Exception):
+                circuit.record(e)
+            else:
+                circuit.release()
+            await chunks.aclose()
+            raise
+
+    with metrics.track_upstream(provider, operation):
+        chunks = first = None
+        async for retry in _retrying(provider, operation, deadline):
+            with retry:
+                chunks, first = await first_chunk()
+        error: Optional[BaseException] = None
+        try:
+            if first is not None:
+                yield first
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining())
+                    except StopAsyncIteration:
+                        break
+                    yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # A consumer that stops reading early leaves a healthy stream behind
+            await chunks.aclose()
+            circuit.record(error)
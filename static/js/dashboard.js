@@ -1,9 +1,23 @@
 document.addEventListener("DOMContentLoaded", function () {
+    // Run whose artifacts are shown (the shared data/ files when absent)
+    const searchParams = new URLSearchParams(window.location.search);
+    const runId = searchParams.get("run_id");
+    const runQuery = runId ? `?run_id=${encodeURIComponent(runId)}` : "";
+  
+    // With ?root_url=... (set by the pipeline page), events and prioritized companies are paged from
+    // the database; runs whose results were never stored there fall back to the run's artifacts
+    const rootUrl = searchParams.get("root_url");
+    const PAGE_SIZE = 50;
+  
     // Get column containers
     const eventsList = document.getElementById("events-list");
     const customersList = document.getElementById("customers-list");
     const prioritizedList = document.getElementById("prioritized-list");
     const backButton = document.getElementById("back-button");
+    const draftAllButton = document.getElementById("draft-all-button");
+  
+    // Prioritized company cards, keyed by company name (filled when the list loads)
+    const cardsByName = new Map();
   
     // Get preview modal elements
     const previewModal = document.getElementById("preview-modal");
@@ -36,33 +50,152 @@ document.addEventListener("DOMContentLoaded", function () {
         .catch(err => console.error(`Failed to load ${url}:`, err));
     }
   
-    // Load potential events data
-    loadData("/view_potential_events", function (data) {
-      let events = [];
-      try {
-        events = JSON.parse(data.content);
-      } catch (e) {
-        console.error("Failed to parse potential events JSON:", e);
-      }
-      eventsList.innerHTML = "";
-      if (Array.isArray(events) && events.length > 0) {
-        events.forEach(event => {
-          const card = document.createElement("div");
-          card.className = "card";
-          card.innerHTML = `
-            <h3>${event.name}</h3>
-            <p><strong>URL:</strong> <a href="${event.url}" target="_blank">${event.url}</a></p>
-            <p><strong>Category:</strong> ${event.category}</p>
-          `;
-          eventsList.appendChild(card);
+    // Helper function: read a Server-Sent Events response body and call onEvent(eventName, data) per event
+    function readEventStream(response, onEvent) {
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      function pump() {
+        return reader.read().then(({ done, value }) => {
+          if (done) return;
+          buffer += decoder.decode(value, { stream: true });
+          let boundary;
+          while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let eventName = "message";
+            const dataLines = [];
+            rawEvent.split("\n").forEach(line => {
+              if (line.startsWith("event:")) eventName = line.slice(6).trim();
+              else if (line.startsWith("data:")) dataLines.push(line.slice(5).replace(/^ /, ""));
+            });
+            if (dataLines.length > 0) onEvent(eventName, JSON.parse(dataLines.join("\n")));
+          }
+          return pump();
         });
-      } else {
-        eventsList.textContent = "No potential events available.";
       }
+      return pump();
+    }
+  
+    // Show an email (or an error) under the card of its company
+    function showEmailOnCard(result) {
+      const card = cardsByName.get(result.company_name);
+      if (!card) return;
+      let emailBox = card.querySelector(".email-preview");
+      if (!emailBox) {
+        emailBox = document.createElement("div");
+        emailBox.className = "email-preview";
+        card.appendChild(emailBox);
+      }
+      emailBox.textContent = result.error ? `Email generation failed: ${result.error}` : result.email;
+    }
+  
+    // Draft emails for the whole prioritized list in one streaming request
+    draftAllButton.addEventListener("click", function () {
+      draftAllButton.disabled = true;
+      draftAllButton.textContent = "Drafting...";
+      let generated = 0;
+      fetch("/generate_outreach_emails", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ run_id: runId })
+      })
+        .then(response => {
+          if (!response.ok) throw new Error(`Error: ${response.status}`);
+          return readEventStream(response, function (eventName, data) {
+            if (eventName === "email") {
+              if (!data.error) generated += 1;
+              showEmailOnCard(data);
+              draftAllButton.textContent = `Drafting... (${generated} ready)`;
+            } else if (eventName === "done") {
+              draftAllButton.textContent = `Drafted ${data.generated} emails` + (data.failed ? `, ${data.failed} failed` : "");
+            }
+          });
+        })
+        .catch(err => {
+          console.error("Failed to draft outreach emails:", err);
+          draftAllButton.disabled = false;
+          draftAllButton.textContent = "Draft all emails";
+          alert("Failed to draft outreach emails.");
+        });
     });
   
+    // Helper function: load a query endpoint page by page, with a "Load more" button while pages remain.
+    // onEmpty runs instead of showing emptyText when the first page is empty or cannot be loaded.
+    function loadPages(url, container, renderItem, emptyText, onEmpty) {
+      container.innerHTML = "";
+      const moreBtn = document.createElement("button");
+      moreBtn.textContent = "Load more";
+      moreBtn.className = "load-more-btn";
+      let shown = 0;
+  
+      function loadPage(cursor) {
+        moreBtn.disabled = true;
+        const pageUrl = `${url}&limit=${PAGE_SIZE}` + (cursor ? `&cursor=${encodeURIComponent(cursor)}` : "");
+        fetch(pageUrl)
+          .then(response => {
+            if (!response.ok) throw new Error(`Error: ${response.status}`);
+            return response.json();
+          })
+          .catch(err => {
+            console.error(`Failed to load ${pageUrl}:`, err);
+            return { items: [], next_cursor: null };
+          })
+          .then(page => {
+            moreBtn.remove();
+            page.items.forEach(item => container.appendChild(renderItem(item)));
+            shown += page.items.length;
+            if (shown === 0 && onEmpty) {
+              onEmpty();
+            } else if (shown === 0) {
+              container.textContent = emptyText;
+            } else if (page.next_cursor) {
+              moreBtn.disabled = false;
+              moreBtn.onclick = () => loadPage(page.next_cursor);
+              container.appendChild(moreBtn);
+            }
+          });
+      }
+      loadPage(null);
+    }
+  
+    // Build the card of a potential event
+    function renderEventCard(event) {
+      const card = document.createElement("div");
+      card.className = "card";
+      card.innerHTML = `
+        <h3>${event.name}</h3>
+        <p><strong>URL:</strong> <a href="${event.url}" target="_blank">${event.url}</a></p>
+        <p><strong>Category:</strong> ${event.category}</p>
+      `;
+      return card;
+    }
+  
+    // Load potential events data
+    function loadEventsFile() {
+      loadData(`/view_potential_events${runQuery}`, function (data) {
+        let events = [];
+        try {
+          events = JSON.parse(data.content);
+        } catch (e) {
+          console.error("Failed to parse potential events JSON:", e);
+        }
+        eventsList.innerHTML = "";
+        if (Array.isArray(events) && events.length > 0) {
+          events.forEach(event => eventsList.appendChild(renderEventCard(event)));
+        } else {
+          eventsList.textContent = "No potential events available.";
+        }
+      });
+    }
+    if (rootUrl) {
+      loadPages(`/events?root_url=${encodeURIComponent(rootUrl)}`, eventsList, renderEventCard, "No potential events available.", loadEventsFile);
+    } else {
+      loadEventsFile();
+    }
+  
     // Load potential customers data
-    loadData("/view_potential_customer", function (data) {
+    loadData(`/view_potential_customer${runQuery}`, function (data) {
       let companies = [];
       try {
         // Assume response format is { success: true, data: { companies: [ ... ] } }
@@ -86,72 +219,98 @@ document.addEventListener("DOMContentLoaded", function () {
       }
     });
   
-    // Load prioritized companies data
-    loadData("/view_prioritized_companies", function (data) {
-      let companies = [];
-      try {
-        companies = JSON.parse(data.content);
-      } catch (e) {
-        console.error("Failed to parse prioritized companies JSON:", e);
-      }
-      prioritizedList.innerHTML = "";
-      if (Array.isArray(companies) && companies.length > 0) {
-        companies.forEach(company => {
-          const card = document.createElement("div");
-          card.className = "card";
-          card.innerHTML = `
-            <h3>${company.company_name}</h3>
-            <p><strong>Industry:</strong> ${company.industry}</p>
-            <p><strong>Revenue:</strong> ${company.revenue}</p>
-            <p><strong>Size:</strong> ${company.size}</p>
-            <p><strong>Stakeholder:</strong> ${company.stakeholder_name} - ${company.stakeholder_position}</p>
-            <p><strong>Email:</strong> ${company.stakeholder_email}</p>
-            <p><strong>Phone:</strong> ${company.stakeholder_phone}</p>
-            <p><strong>LinkedIn:</strong> ${company.stakeholder_link}</p>
-            <p><strong>Reasoning:</strong> ${company.reasoning}</p>
-          `;
-          // Add Outreach button (only shown on prioritized cards)
-          const outreachBtn = document.createElement("button");
-          outreachBtn.textContent = "Outreach";
-          outreachBtn.className = "outreach-btn";
-          outreachBtn.addEventListener("click", function () {
-            // Show global overlay to prevent duplicate clicks
-            globalOverlay.style.display = "flex";
-            // Add a small spinner next to the button
-            const btnSpinner = document.createElement("span");
-            btnSpinner.className = "spinner";
-            btnSpinner.style.marginLeft = "10px";
-            outreachBtn.parentNode.insertBefore(btnSpinner, outreachBtn.nextSibling);
-  
-            fetch("/generate_outreach_email", {
-              method: "POST",
-              headers: { "Content-Type": "application/json" },
-              body: JSON.stringify(company)
-            })
-              .then(response => {
-                if (!response.ok) throw new Error(`Error: ${response.status}`);
-                return response.json();
-              })
-              .then(emailData => {
-                btnSpinner.remove();
-                globalOverlay.style.display = "none";
-                // Show email preview with formatted layout
-                previewContent.innerHTML = `<h3>Outreach Email Preview</h3><div class="email-preview">${emailData.email}</div>`;
-                previewModal.style.display = "block";
-              })
-              .catch(err => {
-                btnSpinner.remove();
-                globalOverlay.style.display = "none";
-                console.error("Failed to generate outreach email:", err);
-                alert("Failed to generate outreach email.");
-              });
+    // Build the card of a prioritized company, with its Outreach button
+    function renderCompanyCard(company) {
+      const card = document.createElement("div");
+      card.className = "card";
+      cardsByName.set(company.company_name, card);
+      card.innerHTML = `
+        <h3>${company.company_name}</h3>
+        <p><strong>Industry:</strong> ${company.industry}</p>
+        <p><strong>Revenue:</strong> ${company.revenue}</p>
+        <p><strong>Size:</strong> ${company.size}</p>
+        <p><strong>Stakeholder:</strong> ${company.stakeholder_name} - ${company.stakeholder_position}</p>
+        <p><strong>Email:</strong> ${company.stakeholder_email}</p>
+        <p><strong>Phone:</strong> ${company.stakeholder_phone}</p>
+        <p><strong>LinkedIn:</strong> ${company.stakeholder_link}</p>
+        <p><strong>Reasoning:</strong> ${company.reasoning}</p>
+      `;
+      // Add Outreach button (only shown on prioritized cards)
+      const outreachBtn = document.createElement("button");
+      outreachBtn.textContent = "Outreach";
+      outreachBtn.className = "outreach-btn";
+      outreachBtn.addEventListener("click", function () {
+        // Show global overlay to prevent duplicate clicks
+        globalOverlay.style.display = "flex";
+        // Add a small spinner next to the button
+        const btnSpinner = document.createElement("span");
+        btnSpinner.className = "spinner";
+        btnSpinner.style.marginLeft = "10px";
+        outreachBtn.parentNode.insertBefore(btnSpinner, outreachBtn.nextSibling);
+  
+        // Stream the email into the preview modal as DeepSeek writes it
+        let emailBox = null;
+        function openEmailPreview() {
+          if (emailBox) return;
+          btnSpinner.remove();
+          globalOverlay.style.display = "none";
+          previewContent.innerHTML = `<h3>Outreach Email Preview</h3><div class="email-preview"></div>`;
+          emailBox = previewContent.querySelector(".email-preview");
+          previewModal.style.display = "block";
+        }
+  
+        fetch(`/generate_outreach_email/stream${runQuery}`, {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify(company)
+        })
+          .then(response => {
+            if (!response.ok) throw new Error(`Error: ${response.status}`);
+            return readEventStream(response, function (eventName, data) {
+              if (eventName === "token") {
+                openEmailPreview();
+                emailBox.textContent += data.text;
+              } else if (eventName === "done") {
+                openEmailPreview();
+                emailBox.textContent = data.email;
+              } else if (eventName === "error") {
+                throw new Error(data.error);
+              }
+            });
+          })
+          .catch(err => {
+            btnSpinner.remove();
+            globalOverlay.style.display = "none";
+            console.error("Failed to generate outreach email:", err);
+            alert("Failed to generate outreach email.");
           });
-          card.appendChild(outreachBtn);
-          prioritizedList.appendChild(card);
-        });
-      } else {
-        prioritizedList.textContent = "No prioritized companies available.";
-      }
-    });
+      });
+      card.appendChild(outreachBtn);
+      return card;
+    }
+  
+    // Load prioritized companies data
+    function loadPrioritizedFile() {
+      loadData(`/view_prioritized_companies${runQuery}`, function (data) {
+        let companies = [];
+        try {
+          companies = JSON.parse(data.content);
+        } catch (e) {
+          console.error("Failed to parse prioritized companies JSON:", e);
+        }
+        prioritizedList.innerHTML = "";
+        if (Array.isArray(companies) && companies.length > 0) {
+          companies.forEach(company => prioritizedList.appendChild(renderCompanyCard(company)));
+        } else {
+          prioritizedList.textContent = "No prioritized companies available.";
+        }
+      });
+    }
+    if (rootUrl) {
+      // Stored in ranking order, so oldest first keeps the prioritization order
+      loadPages(`/customers?root_url=${encodeURIComponent(rootUrl)}&sort=create_time`, prioritizedList, renderCompanyCard, "No prioritized companies available.", loadPrioritizedFile);
+    } else {
+      loadPrioritizedFile();
+    }
   });
   
\ No newline at end of file
@@ -0,0 +1,234 @@
+"""
+Incremental parsing of JSON array responses with partial recovery.
+
+The model is asked for a JSON array of objects. Instead of stripping code fences and
+json.loads-ing the whole response, ArrayParser is fed the response as it streams in and
+validates every element against a pydantic schema as soon as its closing brace arrives:
+
+- valid elements are kept, whatever happens to the rest of the response
+- an element that is not valid JSON or fails validation is recorded as invalid and skipped,
+  parsing resumes at the next element
+- text around the array (prose, ```json fences) is ignored
+- an array that never closes (max_tokens reached, stream interrupted) is reported as truncated
+
+generate_list() then re-requests only what is missing: the original messages, the model's
+own answer and a short note listing the invalid elements and/or the cut-off are sent as a
+continuation call (which also reuses DeepSeek's cached prompt prefix), and the elements it
+returns are merged in. At most STRUCTURED_MAX_CONTINUATIONS such calls are made.
+"""
+import json
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+
+import llm_cache
+import metrics
+
+STRUCTURED_MAX_CONTINUATIONS = int(os.getenv("STRUCTURED_MAX_CONTINUATIONS", "2"))
+
+# Opening bracket of an array of objects (or of an empty array)
+ARRAY_START = re.compile(r"\[(?=\s*[{\]])")
+ELEMENT_BOUNDARY = re.compile(r"\}\s*,\s*(?=\{)")
+ARRAY_END = re.compile(r"\}\s*\]")
+
+CONTINUATION_PROMPT = (
+    "{problems}\n"
+    "Reply with a JSON array that contains only the elements that are still missing or were invalid, "
+    "corrected and in the same format. Do not repeat elements that were valid. "
+    "Reply with [] if nothing is missing. Return only valid JSON with no extra text or markdown fences."
+)
+
+
+def _element_end(text: str, start: int) -> Optional[int]:
+    # Index just past the object starting at text[start] == "{", or None if it is not complete yet
+    depth, in_string, escaped = 0, False, False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return index + 1
+    return None
+
+
+def _error_summary(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(str(part) for part in e['loc']) or 'element'}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+
+class ArrayParser:
+    """
+    Incremental parser for a JSON array of objects validated against a pydantic model.
+    Call feed() with every piece of the response and close() once it has ended.
+    """
+
+    def __init__(self, schema: Type[BaseModel]):
+        self.schema = schema
+        self.items: List[BaseModel] = []
+        self.invalid: List[Dict[str, str]] = []
+        self.closed = False
+        self._buffer = ""
+        self._pos: Optional[int] = None
+
+    @property
+    def complete(self) -> bool:
+        return self.closed and not self.invalid
+
+    def feed(self, text: str) -> List[BaseModel]:
+        """
+        Add a piece of the response and return the elements it completed.
+        """
+        self._buffer += text
+        return self._scan(final=False)
+
+    def close(self) -> List[BaseModel]:
+        """
+        Parse what is left at the end of the response and return the elements it completed.
+        """
+        return self._scan(final=True)
+
+    def _accept(self, raw: str) -> Optional[BaseModel]:
+        try:
+            item = self.schema.model_validate(json.loads(raw))
+        except (ValueError, ValidationError) as e:
+            self.invalid.append({"raw": raw, "error": _error_summary(e)})
+            metrics.record_output_element(self.schema.__name__, False)
+            return None
+        self.items.append(item)
+        metrics.record_output_element(self.schema.__name__, True)
+        return item
+
+    def _salvage(self, tail: str) -> List[BaseModel]:
+        # The last element never closed: either the response was cut off, or a broken string
+        # (an unescaped quote) hides the element ends. Split on element boundaries and keep
+        # what parses; a final piece without a closing brace is the truncated tail.
+        accepted = []
+        pieces = ELEMENT_BOUNDARY.split(tail)
+        for index, piece in enumerate(pieces):
+            last = index == len(pieces) - 1
+            if last:
+                end = ARRAY_END.search(piece)
+                if end is None:
+                    break
+                piece, self.closed = piece[:end.start()], True
+            item = self._accept(piece + "}")
+            if item is not None:
+                accepted.append(item)
+        return accepted
+
+    def _scan(self, final: bool) -> List[BaseModel]:
+        accepted = []
+        buffer = self._buffer
+        if self._pos is None:
+            match = ARRAY_START.search(buffer)
+            if match is None:
+                return accepted
+            self._pos = match.end()
+        pos = self._pos
+        while not self.closed:
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ","):
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == "]":
+                self.closed, pos = True, pos + 1
+                break
+            if buffer[pos] != "{":
+                # Stray text between elements: skip to the next element or the end of the array
+                following = [index for index in (buffer.find("{", pos), buffer.find("]", pos)) if index != -1]
+                if not following:
+                    pos = len(buffer) if final else pos
+                    break
+                pos = min(following)
+                continue
+            end = _element_end(buffer, pos)
+            if end is None:
+                if final:
+                    accepted += self._salvage(buffer[pos:])
+                    pos = len(buffer)
+                break
+            item = self._accept(buffer[pos:end])
+            if item is not None:
+                accepted.append(item)
+            pos = end
+        self._pos = pos
+        return accepted
+
+
+def _problems(parser: ArrayParser) -> str:
+    problems = []
+    if parser.invalid:
+        problems.append("These elements of your answer were invalid:\n" + "\n".join(
+            f"- {entry['raw'][:500]} ({entry['error']})" for entry in parser.invalid
+        ))
+    if not parser.closed:
+        problems.append(f"Your answer was cut off after {len(parser.items)} valid elements.")
+    return "\n".join(problems)
+
+
+async def generate_list(
+    llm: Any,
+    messages: List[Any],
+    schema: Type[BaseModel],
+    key: Callable[[Dict[str, Any]], Any] = lambda item: json.dumps(item, sort_keys=True),
+    max_continuations: int = STRUCTURED_MAX_CONTINUATIONS,
+) -> Dict[str, Any]:
+    """
+    Request a JSON array of `schema` objects and return
+    {"items", "invalid", "complete", "continuations"}: the valid elements (as dicts, duplicates by
+    `key` removed), the elements that stayed invalid, whether the array was received in full and
+    how many continuation calls were needed.
+    Raises ValueError if no valid element and no closed array was received at all.
+    """
+    items: Dict[Any, Dict[str, Any]] = {}
+    continuations = 0
+    while True:
+        parser = ArrayParser(schema)
+        parts = []
+        try:
+            async for chunk in llm_cache.cached_astream(llm, messages):
+                parts.append(chunk)
+                parser.feed(chunk)
+        except Exception as e:
+            # An interrupted stream still leaves the elements received so far
+            if not parser.items:
+                raise
+            print(f"Response stream of {schema.__name__} list interrupted after {len(parser.items)} elements: {e}")
+        parser.close()
+        for item in parser.items:
+            items.setdefault(key(item.model_dump()), item.model_dump())
+
+        if parser.complete or continuations >= max_continuations:
+            break
+        if not parser.closed and not parser.items and continuations > 0:
+            # The continuation produced nothing usable either; stop asking
+            break
+        continuations += 1
+        metrics.record_continuation(schema.__name__)
+        messages = list(messages) + [
+            {"role": "assistant", "content": "".join(parts)},
+            {"role": "user", "content": CONTINUATION_PROMPT.format(problems=_problems(parser))},
+        ]
+
+    if not items and not parser.closed:
+        raise ValueError(f"no valid {schema.__name__} JSON array in the response")
+    return {
+        "items": list(items.values()),
+        "invalid": parser.invalid,
+        "complete": parser.complete,
+        "continuations": continuations,
+    }
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+import pytest
+
+import crawl_store
+import crawler
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv("CRAWL_STORE_PATH", str(tmp_path / "crawl_store.sqlite"))
+
+
+def test_crawl_job_progress():
+    crawl_store.update_crawl_job("c1", target_url="https://target.example", status="scraping")
+    assert crawl_store.crawl_job("c1") == {
+        "crawl_id": "c1", "target_url": "https://target.example", "status": "scraping", "completed": 0, "total": 0,
+    }
+    crawl_store.update_crawl_job("c1", status="completed", completed=5, total=5, file_path="kb", changed=False)
+    job = crawl_store.crawl_job("c1")
+    assert job["status"] == "completed" and job["completed"] == 5
+    assert job["changed"] is False and job["file_path"] == "kb"
+    assert crawl_store.crawl_job("unknown") is None
+
+
+def test_finished_crawl_jobs_are_dropped_after_the_retention(monkeypatch):
+    monkeypatch.setattr(crawl_store, "CRAWL_JOB_RETENTION_SECONDS", 60)
+    now = time.time()
+    monkeypatch.setattr(crawl_store.time, "time", lambda: now - 120)
+    crawl_store.update_crawl_job("old-done", status="completed")
+    crawl_store.update_crawl_job("old-running", status="scraping")
+    monkeypatch.setattr(crawl_store.time, "time", lambda: now)
+    crawl_store.update_crawl_job("new", status="scraping")
+    assert crawl_store.crawl_job("old-done") is None
+    assert crawl_store.crawl_job("old-running")["status"] == "scraping"
+
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(ValueError):
+        crawl_store.update_crawl_job("c1", task=object())
+
+
+def test_background_tasks_are_released_when_done():
+    async def run():
+        async def fail():
+            raise RuntimeError("crawl failed")
+
+        task = asyncio.create_task(fail())
+        crawler.run_in_background(task)
+        assert task in crawler.background_tasks
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return task
+
+    task = asyncio.run(run())
+    assert task not in crawler.background_tasks
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import database
+
+OLD_EVENTS_TABLE = (
+    "CREATE TABLE potential_events (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, url VARCHAR NOT NULL,"
+    " category VARCHAR NOT NULL, root_url VARCHAR NOT NULL, create_time DATETIME)"
+)
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "_schema_checked", set())
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'database.sqlite'}")
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+async def _old_table_with_duplicates(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text(OLD_EVENTS_TABLE))
+        for name in ("First", "Second", "Other"):
+            url = "https://other.example" if name == "Other" else "https://expo.example"
+            await conn.execute(text(
+                "INSERT INTO potential_events (name, url, category, root_url) VALUES (:name, :url, 'Exhibitions', 'https://t.example')"
+            ), {"name": name, "url": url})
+
+
+async def _names(engine):
+    async with engine.connect() as conn:
+        return [row[0] for row in await conn.execute(text("SELECT name FROM potential_events ORDER BY id"))]
+
+
+def test_requests_create_missing_tables(engine):
+    async def run():
+        async with async_sessionmaker(engine)() as db:
+            await database.ensure_schema(db, database.PotentialEvent)
+        return await _names(engine)
+
+    assert asyncio.run(run()) == []
+
+
+def test_requests_never_delete_rows_of_an_outdated_table(engine):
+    async def run():
+        await _old_table_with_duplicates(engine)
+        async with async_sessionmaker(engine)() as db:
+            with pytest.raises(HTTPException) as error:
+                await database.ensure_schema(db, database.PotentialEvent)
+        assert error.value.status_code == 503
+        assert "uq_potential_events_root_url_url" in error.value.detail
+        return await _names(engine)
+
+    assert asyncio.run(run()) == ["First", "Second", "Other"]
+
+
+def test_migration_deletes_duplicates_and_creates_the_indexes(engine):
+    async def run():
+        await _old_table_with_duplicates(engine)
+        dry_run = await database.migrate_schema([database.PotentialEvent], dry_run=True, bind=engine)
+        assert await _names(engine) == ["First", "Second", "Other"]
+        report = await database.migrate_schema([database.PotentialEvent], bind=engine)
+        async with async_sessionmaker(engine)() as db:
+            await database.ensure_schema(db, database.PotentialEvent)
+        return dry_run, report, await _names(engine)
+
+    dry_run, report, names = asyncio.run(run())
+    assert dry_run["potential_events"]["duplicates_deleted"] == 1
+    assert report["potential_events"]["duplicates_deleted"] == 1
+    assert "index uq_potential_events_root_url_url" in report["potential_events"]["missing"]
+    assert names == ["First", "Other"]
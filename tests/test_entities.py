@@ -0,0 +1,75 @@
+import pytest
+
+import entities
+
+
+@pytest.fixture(autouse=True)
+def entity_index(tmp_path, monkeypatch):
+    monkeypatch.setenv("ENTITY_INDEX_PATH", str(tmp_path / "entity_index.sqlite"))
+
+
+def _groups(result):
+    return sorted(sorted(entry["aliases"]) for entry in result)
+
+
+@pytest.mark.parametrize("names", [
+    ["Siemens", "Siemens Energy", "Siemens Healthineers"],
+    ["Siemens Energy", "Siemens Healthineers", "Siemens"],
+    ["Siemens Healthineers", "Siemens", "Siemens Energy"],
+])
+def test_distinct_companies_sharing_a_prefix_stay_apart(names):
+    result = entities.resolve({"https://events.example/a": names})
+    assert _groups(result) == [["Siemens"], ["Siemens Energy"], ["Siemens Healthineers"]]
+
+
+def test_wrong_merge_is_not_inherited_by_later_runs():
+    entities.resolve({None: ["Siemens"]}, run_id="run-1")
+    result = entities.resolve({None: ["Siemens Energy"]}, run_id="run-2")
+    assert result[0]["canonical_name"] == "Siemens Energy"
+    assert result[0]["aliases"] == ["Siemens Energy"]
+
+
+def test_legal_form_and_group_suffixes_are_aliases():
+    result = entities.resolve({"https://events.example/a": ["BASF", "BASF SE", "BASF Group", "basf se"]})
+    assert len(result) == 1
+    assert sorted(result[0]["aliases"]) == ["BASF", "BASF Group", "BASF SE", "basf se"]
+    assert result[0]["canonical_name"] == "BASF"
+
+
+def test_alias_resolves_to_entity_from_an_earlier_run():
+    first = entities.resolve({None: ["BASF SE"]}, run_id="run-1")
+    second = entities.resolve({None: ["BASF Group"]}, run_id="run-2")
+    assert second[0]["entity_id"] == first[0]["entity_id"]
+
+
+def test_normalize_name_strips_legal_forms_and_punctuation():
+    assert entities.normalize_name("DuPont de Nemours, Inc.") == "dupont de nemours"
+    assert entities.normalize_name("Société Générale S.A.") == "societe generale"
+    assert entities.normalize_name("The Dow Chemical Company") == "dow chemical"
+
+
+def test_index_version_ignores_the_runs_own_aliases():
+    entities.resolve({None: ["BASF", "Covestro"]}, run_id="run-1")
+    before = entities.index_version(exclude_run_id="run-1")
+    entities.resolve({None: ["BASF SE", "Covestro AG"]}, run_id="run-1")
+    assert entities.index_version(exclude_run_id="run-1") == before
+
+    entities.resolve({None: ["Arkema"]}, run_id="run-2")
+    assert entities.index_version(exclude_run_id="run-1") != before
+
+
+def _mentions():
+    with entities.local_store.connect(entities._path()) as conn:
+        return {row["name"]: row["mentions"] for row in conn.execute("SELECT name, mentions FROM entity_aliases")}
+
+
+def test_resolving_a_run_again_does_not_count_its_mentions_twice():
+    entities.resolve({"https://events.example/a": ["DuPont de Nemours, Inc."]}, run_id="run-1")
+    names = {"https://events.example/b": ["DuPont", "DuPont"], "https://events.example/c": ["DuPont"]}
+    for _ in range(3):
+        result = entities.resolve(names, run_id="run-2")
+    assert _mentions() == {"DuPont de Nemours, Inc.": 1, "DuPont": 2}
+    assert result[0]["canonical_name"] == "DuPont"
+
+    entities.resolve(names, run_id="run-3")
+    assert _mentions()["DuPont"] == 4
@@ -0,0 +1,25 @@
+import pytest
+
+import extract_store
+
+
+@pytest.mark.parametrize("url, canonical", [
+    ("http://www.Example.com/events/?utm_source=x&b=2&a=1#top", "https://example.com/events?a=1&b=2"),
+    ("example.com/events", "https://example.com/events"),
+    ("https://example.com:443//expo//", "https://example.com/expo"),
+    ("https://example.com:8443/expo", "https://example.com:8443/expo"),
+])
+def test_canonical_url(url, canonical):
+    assert extract_store.canonical_url(url) == canonical
+
+
+@pytest.mark.parametrize("url, canonical", [
+    ("http://X.com:99999/", "https://x.com:99999"),
+    ("https://example.com:port/expo", "https://example.com:port/expo"),
+])
+def test_malformed_port_keeps_the_netloc(url, canonical):
+    assert extract_store.canonical_url(url) == canonical
+
+
+def test_unparseable_url_is_returned_stripped():
+    assert extract_store.canonical_url(" http://[::1/expo ") == "http://[::1/expo"
@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import pytest
+
+import extraction
+import resilience
+
+
+class FakeFirecrawl:
+    def __init__(self, statuses, status_delay=0.0):
+        self.statuses = list(statuses)
+        self.status_delay = status_delay
+        self.submitted = []
+        self.polls = 0
+
+    def async_extract(self, urls, params, idempotency_key):
+        self.submitted.append((urls, idempotency_key))
+        self.params = params
+        return {"success": True, "id": "job-1"}
+
+    def get_extract_status(self, job_id):
+        self.polls += 1
+        if self.polls == 1 and self.status_delay:
+            time.sleep(self.status_delay)
+        return self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+
+
+@pytest.fixture(autouse=True)
+def fast_polls(monkeypatch):
+    resilience.breakers.clear()
+    monkeypatch.setattr(extraction, "EXTRACT_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(resilience, "BACKOFF_INITIAL_SECONDS", 0.001)
+    monkeypatch.setattr(resilience, "BACKOFF_MAX_SECONDS", 0.01)
+    monkeypatch.setenv("FIRECRAWL_HEDGE_AFTER_SECONDS", "0")
+    yield
+    resilience.breakers.clear()
+
+
+def test_extract_is_submitted_once_and_polled_until_completed():
+    app = FakeFirecrawl([
+        {"success": True, "status": "processing"},
+        {"success": True, "status": "completed", "data": {"companies": ["Acme"]}},
+    ])
+    result = asyncio.run(extraction.run_extract(app, "https://events.example", {}))
+    assert result["data"]["companies"] == ["Acme"]
+    assert len(app.submitted) == 1
+    assert app.polls == 2
+
+
+def test_poll_timeout_retries_the_poll_not_the_submission(monkeypatch):
+    monkeypatch.setenv("FIRECRAWL_TIMEOUT_SECONDS", "0.05")
+    app = FakeFirecrawl([{"success": True, "status": "completed", "data": {"companies": ["Acme"]}}], status_delay=0.3)
+    result = asyncio.run(extraction.run_extract(app, "https://events.example", {}))
+    assert result["data"]["companies"] == ["Acme"]
+    assert len(app.submitted) == 1
+    assert app.polls >= 2
+
+
+def test_failed_job_raises():
+    app = FakeFirecrawl([{"success": False, "status": "failed", "error": "blocked"}])
+    with pytest.raises(RuntimeError, match="blocked"):
+        asyncio.run(extraction.run_extract(app, "https://events.example", {}))
+    assert len(app.submitted) == 1
+
+
+def test_job_past_its_deadline_raises(monkeypatch):
+    monkeypatch.setattr(extraction, "EXTRACT_DEADLINE_SECONDS", 0.05)
+    app = FakeFirecrawl([{"success": True, "status": "processing"}])
+    with pytest.raises(TimeoutError):
+        asyncio.run(extraction.run_extract(app, "https://events.example", {}))
+    assert len(app.submitted) == 1
+
+
+def test_options_are_sent_with_the_api_names():
+    app = FakeFirecrawl([{"success": True, "status": "completed", "data": {"companies": []}}])
+    asyncio.run(extraction.run_extract(app, "https://events.example", extraction.COMPANY_EXTRACT_OPTIONS))
+    assert set(app.params) == {"prompt", "schema", "enableWebSearch"}
+    assert app.params["enableWebSearch"] is False
+
+
+def test_submission_without_a_response_raises():
+    app = FakeFirecrawl([{"success": True, "status": "completed"}])
+    app.async_extract = lambda urls, params, idempotency_key: None
+    with pytest.raises(RuntimeError, match="job id"):
+        asyncio.run(extraction.run_extract(app, "https://events.example", {}))
@@ -0,0 +1,127 @@
+import sqlite3
+import time
+
+import pytest
+
+import job_queue
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setenv("JOB_QUEUE_PATH", str(tmp_path / "job_queue.sqlite"))
+
+
+def _state(status="running", **stages):
+    return {"status": status, "stages": stages, "error": None}
+
+
+def _expire_lease(job_id):
+    with job_queue.local_store.connect(job_queue._path()) as conn:
+        conn.execute("UPDATE jobs SET lease_expires_at = ? WHERE job_id = ?", (time.time() - 1, job_id))
+
+
+def test_enqueue_rejects_an_active_job_and_replaces_a_finished_one():
+    assert job_queue.enqueue("run-1", {"target_url": "https://a.example"})
+    assert not job_queue.enqueue("run-1", {"target_url": "https://a.example"})
+
+    claimed = job_queue.claim("worker-a")
+    job_queue.publish("run-1", "worker-a", claimed["attempt"], "status", {}, _state("completed"))
+    assert job_queue.enqueue("run-1", {"target_url": "https://a.example"})
+    status, events = job_queue.events("run-1")
+    assert status == "queued"
+    assert [event["id"] for event in events] == [0]
+
+
+def test_claim_takes_the_oldest_queued_job_once():
+    job_queue.enqueue("run-1", {"n": 1})
+    job_queue.enqueue("run-2", {"n": 2})
+
+    first = job_queue.claim("worker-a")
+    second = job_queue.claim("worker-b")
+    assert (first["job_id"], first["attempt"], first["recovered"]) == ("run-1", 1, False)
+    assert second["job_id"] == "run-2"
+    assert job_queue.claim("worker-c") is None
+    assert job_queue.get("run-1")["worker_id"] == "worker-a"
+
+
+def test_heartbeat_keeps_the_lease():
+    job_queue.enqueue("run-1", {})
+    claimed = job_queue.claim("worker-a")
+    assert job_queue.heartbeat("run-1", "worker-a", claimed["attempt"])
+    assert job_queue.claim("worker-b") is None
+
+
+def test_expired_lease_is_claimed_again_and_fences_the_old_owner():
+    job_queue.enqueue("run-1", {})
+    old = job_queue.claim("worker-a")
+    _expire_lease("run-1")
+
+    new = job_queue.claim("worker-b")
+    assert (new["job_id"], new["attempt"], new["recovered"]) == ("run-1", 2, True)
+    assert not job_queue.heartbeat("run-1", "worker-a", old["attempt"])
+    with pytest.raises(job_queue.LeaseLostError):
+        job_queue.publish("run-1", "worker-a", old["attempt"], "stage", {"stage": "crawl"}, _state(crawl="completed"))
+    # The same worker id with a stale attempt is fenced too
+    with pytest.raises(job_queue.LeaseLostError):
+        job_queue.publish("run-1", "worker-b", old["attempt"], "stage", {}, _state())
+
+    job_queue.publish("run-1", "worker-b", new["attempt"], "stage", {"stage": "crawl"}, _state(crawl="completed"))
+    assert job_queue.get("run-1")["stages"] == {"crawl": "completed"}
+
+
+def test_job_fails_after_max_attempts(monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_MAX_ATTEMPTS", 2)
+    job_queue.enqueue("run-1", {})
+    for worker in ("worker-a", "worker-b"):
+        assert job_queue.claim(worker)["job_id"] == "run-1"
+        _expire_lease("run-1")
+
+    assert job_queue.claim("worker-c") is None
+    job = job_queue.get("run-1")
+    assert job["status"] == "failed"
+    assert "giving up" in job["error"]
+    status, events = job_queue.events("run-1")
+    assert status == "failed" and events[-1]["data"]["status"] == "failed"
+
+
+def test_release_requeues_without_counting_the_attempt():
+    job_queue.enqueue("run-1", {})
+    claimed = job_queue.claim("worker-a")
+    assert job_queue.release("run-1", "worker-a", claimed["attempt"])
+    assert not job_queue.release("run-1", "worker-a", claimed["attempt"])
+
+    again = job_queue.claim("worker-b")
+    assert (again["attempt"], again["recovered"]) == (1, False)
+
+
+def test_events_are_numbered_per_job_and_read_after_an_id():
+    job_queue.enqueue("run-1", {})
+    claimed = job_queue.claim("worker-a")
+    ids = [
+        job_queue.publish("run-1", "worker-a", claimed["attempt"], "stage", {"n": n}, _state())
+        for n in range(3)
+    ]
+    job_queue.publish("run-1", "worker-a", claimed["attempt"], "status", {}, _state("completed"))
+
+    assert ids == [1, 2, 3]
+    status, events = job_queue.events("run-1", after=2)
+    assert status == "completed"
+    assert [event["id"] for event in events] == [3, 4]
+    assert job_queue.get("run-1")["worker_id"] is None
+
+
+def test_metrics_skip_the_job_gauge_when_the_queue_stays_locked(monkeypatch):
+    job_queue.enqueue("run-1", {})
+    assert b'lily_pipeline_jobs{status="queued"} 1.0' in metrics.render()[0]
+
+    timeouts = []
+
+    def locked(timeout=30):
+        timeouts.append(timeout)
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(job_queue, "counts", locked)
+    body, _ = metrics.render()
+    assert timeouts == [metrics.JOB_COUNTS_TIMEOUT_SECONDS]
+    assert b"lily_pipeline_jobs{" not in body
@@ -0,0 +1,53 @@
+import pytest
+
+import lead_metrics
+
+
+@pytest.mark.parametrize("text, usd, confidence", [
+    ("$78.7 billion (2023)", 78_700_000_000, "high"),
+    ("US$3.2 billion", 3_200_000_000, "high"),
+    ("USD 450 million", 450_000_000, "high"),
+    ("$12M", 12_000_000, "high"),
+    ("approx. $12 million", 12_000_000, "medium"),
+    ("Over $1bn", 1_000_000_000, "medium"),
+    # Other currencies are converted and stored with low confidence
+    ("€40 million", 43_200_000, "low"),
+    ("EUR 40 million", 43_200_000, "low"),
+    ("£2.5bn", 3_175_000_000, "low"),
+    ("¥3 trillion", 20_100_000_000, "low"),
+    # Prefixed dollars are not US dollars
+    ("C$5B", 3_650_000_000, "low"),
+    ("A$2 billion", 1_320_000_000, "low"),
+    ("CAD 5 billion", 3_650_000_000, "low"),
+    # The currency mentioned first wins
+    ("€5B ($5.4B)", 5_400_000_000, "low"),
+    # Ranges store their midpoint, with a scale on either end
+    ("$50M-$100M", 75_000_000, "low"),
+    ("$1-2 billion", 1_500_000_000, "low"),
+    ("500K to 2M USD", 1_250_000, "low"),
+    ("€1.2bn–€1.5bn", 1_458_000_000, "low"),
+    ("2023", None, "none"),
+    ("Not disclosed", None, "none"),
+    (None, None, "none"),
+])
+def test_parse_revenue(text, usd, confidence):
+    assert lead_metrics.parse_revenue(text) == (usd, confidence)
+
+
+@pytest.mark.parametrize("text, employees, confidence", [
+    ("Over 112,000 employees", 112_000, "medium"),
+    ("24,000 employees", 24_000, "high"),
+    ("10k+ employees", 10_000, "medium"),
+    ("1,000-5,000 employees", 3_000, "low"),
+    ("50 to 200", 125, "low"),
+    ("Founded 1998, 300 employees", 300, "high"),
+    ("Large enterprise", None, "none"),
+])
+def test_parse_employee_count(text, employees, confidence):
+    assert lead_metrics.parse_employee_count(text) == (employees, confidence)
+
+
+def test_parse_metrics_takes_the_lower_confidence():
+    assert lead_metrics.parse_metrics("$2 billion", "1,000-5,000 employees") == {
+        "revenue_usd": 2_000_000_000, "employee_count": 3_000, "parse_confidence": "low",
+    }
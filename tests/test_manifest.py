@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+import pytest
+
+import main
+import workspace
+
+
+@pytest.fixture(autouse=True)
+def stores(tmp_path, monkeypatch):
+    monkeypatch.setattr(workspace, "RUNS_DIR", str(tmp_path / "runs"))
+    monkeypatch.setenv("STAGE_MANIFEST_PATH", str(tmp_path / "stage_manifest.sqlite"))
+
+
+def events_stage(monkeypatch, run_id, results):
+    # find_potential_events replaced by a fake that writes its artifact and returns the next result
+    calls = []
+
+    async def find_potential_events(payload):
+        calls.append(payload["run_id"])
+        workspace.write_text(workspace.artifact_path("potential_events", run_id), json.dumps([{"url": f"https://e{len(calls)}.example"}]))
+        return results[len(calls) - 1]
+
+    monkeypatch.setattr(main, "find_potential_events", find_potential_events)
+    workspace.write_text(workspace.artifact_path("company_profile", run_id), "Profile")
+    stages, _ = main.pipeline_stages(run_id, {"target_url": "https://target.example"})
+    return dict(stages)["find_potential_events"], calls
+
+
+def test_complete_stage_is_skipped_on_resume(monkeypatch):
+    stage, calls = events_stage(monkeypatch, "run-a", [{"complete": True}])
+    asyncio.run(stage())
+    assert asyncio.run(stage())["skipped"]
+    assert len(calls) == 1
+
+
+def test_partial_stage_runs_again(monkeypatch):
+    stage, calls = events_stage(monkeypatch, "run-b", [{"complete": False}, {"complete": True}, {"complete": True}])
+    asyncio.run(stage())
+    assert "skipped" not in asyncio.run(stage())
+    assert asyncio.run(stage())["skipped"]
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("result, partial", [
+    ({"data": {"success": True, "errors": [{"url": "https://e.example", "error": "timeout"}]}}, True),
+    ({"data": {"success": True, "errors": []}}, False),
+    ({"failed_shards": [2]}, True),
+    ({"failed_shards": []}, False),
+    ({"complete": False}, True),
+    ({"message": "done"}, False),
+])
+def test_stage_partial(result, partial):
+    assert main._stage_partial(result) is partial
@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(code, env):
+    # Metrics are created at import time, so every "process" of the deployment is a real subprocess
+    return subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+
+
+def test_multiprocess_mode_reports_the_metrics_of_worker_processes(tmp_path):
+    env = dict(
+        os.environ,
+        PROMETHEUS_MULTIPROC_DIR=str(tmp_path / "metrics"),
+        JOB_QUEUE_PATH=str(tmp_path / "job_queue.sqlite"),
+    )
+    os.makedirs(env["PROMETHEUS_MULTIPROC_DIR"])
+    worker_pid = _run(
+        "import os, metrics\n"
+        "with metrics.track_stage('extract_companies'): pass\n"
+        "metrics.LLM_TOKENS.labels('deepseek-chat', 'prompt', 'reported').inc(42)\n"
+        "metrics.PIPELINES_IN_FLIGHT.inc()\n"
+        "print(os.getpid())",
+        env
+    ).strip()
+    body = _run("import metrics; print(metrics.render()[0].decode())", env)
+    assert 'lily_pipeline_stage_duration_seconds_count{outcome="ok",stage="extract_companies"} 1.0' in body
+    assert 'lily_llm_tokens_total{kind="prompt",model="deepseek-chat",source="reported"} 42.0' in body
+    assert "lily_pipelines_in_flight 1.0" in body
+    assert 'lily_pipeline_jobs{status="queued"} 0.0' in body
+
+    body = _run(f"import metrics; metrics.mark_process_dead({worker_pid}); print(metrics.render()[0].decode())", env)
+    assert "lily_pipelines_in_flight 1.0" not in body
+    assert 'lily_llm_tokens_total{kind="prompt",model="deepseek-chat",source="reported"} 42.0' in body
@@ -0,0 +1,74 @@
+import json
+import os
+
+import pytest
+
+import prescore
+import workspace
+
+PROFILE = "We make fluoropolymer films for photovoltaic modules, aerospace interiors and chemical plants."
+
+
+@pytest.fixture(autouse=True)
+def runs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(workspace, "RUNS_DIR", str(tmp_path / "runs"))
+    monkeypatch.setattr(workspace, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(prescore, "PRESCORE_MIN_SCORE", 0.0)
+    monkeypatch.setattr(prescore, "PRESCORE_TOP_K", 100)
+    prescore._known_cache.clear()
+    return tmp_path / "runs"
+
+
+def test_short_names_and_tickers_are_kept():
+    result = prescore.prescore(["GE", "BP", "3M", "GM", "ST", "Boeing"], PROFILE)
+    assert result["selected"] == ["GE", "BP", "3M", "GM", "ST", "Boeing"]
+    assert result["dropped"] == []
+
+
+def test_short_names_lose_to_regular_names_at_the_top_k_cut(monkeypatch):
+    monkeypatch.setattr(prescore, "PRESCORE_TOP_K", 2)
+    result = prescore.prescore(["GE", "3M", "Airbus", "Meyer Burger"], PROFILE)
+    assert result["selected"] == ["Airbus", "Meyer Burger"]
+    assert [entry["company_name"] for entry in result["dropped"]] == ["GE", "3M"]
+
+
+def test_names_with_several_penalties_are_dropped():
+    sentence = "Visit the exhibition booth of our partners in hall A3 this June"
+    result = prescore.prescore(["www.pv-magazine.com", sentence, "First Solar"], PROFILE)
+    assert result["selected"] == ["First Solar"]
+    assert {entry["company_name"] for entry in result["dropped"]} == {"www.pv-magazine.com", sentence}
+
+
+@pytest.mark.parametrize("name", ["Amazon.com, Inc.", "Booking.com", "Bloomberg Media", "Mayo Clinic", "European Plastics Council"])
+def test_a_single_url_or_non_company_penalty_does_not_drop(name):
+    assert prescore.prescore([name], PROFILE)["selected"] == [name]
+
+
+def test_penalized_names_rank_below_regular_names(monkeypatch):
+    monkeypatch.setattr(prescore, "PRESCORE_TOP_K", 2)
+    result = prescore.prescore(["Booking.com", "Mayo Clinic", "Airbus", "Meyer Burger"], PROFILE)
+    assert result["selected"] == ["Airbus", "Meyer Burger"]
+
+
+def test_known_companies_are_read_again_when_a_run_changes(runs_dir):
+    path = runs_dir / "run-1" / workspace.ARTIFACT_PATHS["prioritized_companies"]
+    os.makedirs(path.parent)
+    path.write_text(json.dumps([{"company_name": "Acme Corp"}]), encoding="utf-8")
+    assert "acme corp" in prescore.known_companies()
+
+    path.write_text(json.dumps([{"company_name": "Globex Inc"}]), encoding="utf-8")
+    os.utime(path, ns=(1, 1))
+    assert prescore.known_companies() == {"globex inc"}
+
+
+def test_known_companies_digest_leaves_out_the_runs_own_ranking(runs_dir):
+    for run_id, name in (("run-1", "Acme Corp"), ("run-2", "Globex Inc")):
+        path = runs_dir / run_id / workspace.ARTIFACT_PATHS["prioritized_companies"]
+        os.makedirs(path.parent)
+        path.write_text(json.dumps([{"company_name": name}]), encoding="utf-8")
+
+    assert prescore.known_companies("run-1") == {"globex inc"}
+    digest = prescore.known_companies_digest("run-1")
+    (runs_dir / "run-1" / workspace.ARTIFACT_PATHS["prioritized_companies"]).write_text("[]", encoding="utf-8")
+    assert prescore.known_companies_digest("run-1") == digest
+    assert prescore.known_companies_digest("run-2") != digest
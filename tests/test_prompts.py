@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+import prompts
+import workspace
+
+PROFILE = "# Tedlar\n\n**Tedlar** films protect *photovoltaic* modules.\n\n1. Products:\nPVF films\nPVF films\n"
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(workspace, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(workspace, "RUNS_DIR", str(tmp_path / "runs"))
+    return tmp_path
+
+
+def test_events_messages_start_with_a_user_turn():
+    messages = prompts.events_messages(prompts.compact_profile(PROFILE))
+    assert [message["role"] for message in messages] == ["system", "user"]
+    assert messages[0]["content"].startswith(prompts.EVENTS_INSTRUCTIONS)
+    assert messages[1]["content"] == prompts.EVENTS_REQUEST
+
+
+def test_prefix_is_identical_across_calls():
+    digest = prompts.compact_profile(PROFILE)
+    first = prompts.outreach_messages(digest, {"company_name": "Acme"})
+    second = prompts.outreach_messages(digest, {"company_name": "Globex"})
+    assert first[0] == second[0]
+    assert first[1] != second[1]
+
+
+def test_digest_without_run_is_not_written(data_dir):
+    digest = prompts.profile_digest(PROFILE)
+    assert "PVF films" in digest and digest.count("PVF films") == 1
+    assert not os.path.exists(workspace.artifact_path("profile_digest", None, create_dir=False))
+
+
+def test_digest_of_a_run_is_stored_and_rebuilt_when_the_profile_changes():
+    digest = prompts.profile_digest(PROFILE, "run-1")
+    path = workspace.artifact_path("profile_digest", "run-1", create_dir=False)
+    assert os.path.exists(path)
+    assert prompts.profile_digest(PROFILE, "run-1") == digest
+    assert "Kapton" in prompts.profile_digest(PROFILE + "Kapton tapes\n", "run-1")
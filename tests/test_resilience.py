@@ -0,0 +1,128 @@
+import asyncio
+
+import httpx
+import pytest
+
+import resilience
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.response = httpx.Response(status_code, headers=headers or {})
+
+
+@pytest.fixture(autouse=True)
+def fast_settings(monkeypatch):
+    resilience.breakers.clear()
+    monkeypatch.setattr(resilience, "BACKOFF_INITIAL_SECONDS", 0.001)
+    monkeypatch.setattr(resilience, "BACKOFF_MAX_SECONDS", 0.01)
+    monkeypatch.setenv("DEEPSEEK_BREAKER_THRESHOLD", "3")
+    monkeypatch.setenv("DEEPSEEK_BREAKER_COOLDOWN_SECONDS", "60")
+    yield
+    resilience.breakers.clear()
+
+
+@pytest.mark.parametrize("error, retryable", [
+    (StatusError(429), True),
+    (StatusError(503), True),
+    (StatusError(400), False),
+    (StatusError(401), False),
+    (asyncio.TimeoutError(), True),
+    (httpx.ConnectError("refused"), True),
+    (ValueError("Unexpected error during extract: Status code 502. Bad gateway", 500), True),
+    (ValueError("Payment Required: Failed to extract. Insufficient credits", 500), False),
+    (StatusError(409), False),
+    (ValueError("Conflict: Failed to start crawl job. Idempotency key already used", 500), False),
+    (resilience.CircuitOpenError("open"), False),
+])
+def test_is_retryable(error, retryable):
+    assert resilience.is_retryable(error) is retryable
+
+
+def test_retry_after_header_is_read():
+    assert resilience._retry_after(StatusError(429, {"retry-after": "7"})) == 7.0
+    assert resilience._retry_after(StatusError(429)) is None
+
+
+def test_breaker_opens_after_consecutive_outages_and_ignores_client_errors():
+    breaker = resilience.breaker("deepseek")
+    breaker.record(StatusError(400))
+    breaker.record(StatusError(429))
+    assert breaker.state == "closed"
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record(StatusError(503))
+    assert breaker.state == "open"
+    with pytest.raises(resilience.CircuitOpenError):
+        breaker.before_call()
+
+
+def test_success_resets_the_failure_count():
+    breaker = resilience.breaker("deepseek")
+    breaker.record(StatusError(503))
+    breaker.record(StatusError(503))
+    breaker.record(None)
+    breaker.record(StatusError(503))
+    assert breaker.state == "closed"
+
+
+def test_half_open_allows_one_trial(monkeypatch):
+    breaker = resilience.breaker("deepseek")
+    for _ in range(3):
+        breaker.record(StatusError(503))
+    monkeypatch.setenv("DEEPSEEK_BREAKER_COOLDOWN_SECONDS", "0")
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    with pytest.raises(resilience.CircuitOpenError):
+        breaker.before_call()
+    breaker.record(None)
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_reopens_the_breaker(monkeypatch):
+    breaker = resilience.breaker("deepseek")
+    for _ in range(3):
+        breaker.record(StatusError(503))
+    monkeypatch.setenv("DEEPSEEK_BREAKER_COOLDOWN_SECONDS", "0")
+    breaker.before_call()
+    monkeypatch.setenv("DEEPSEEK_BREAKER_COOLDOWN_SECONDS", "60")
+    breaker.record(StatusError(503))
+    assert breaker.state == "open"
+
+
+def test_call_retries_transient_errors_only():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise StatusError(503)
+        return "ok"
+
+    assert asyncio.run(resilience.call("deepseek", "chat", flaky)) == "ok"
+    assert len(attempts) == 3
+
+    attempts.clear()
+
+    async def rejected():
+        attempts.append(1)
+        raise StatusError(400)
+
+    with pytest.raises(StatusError):
+        asyncio.run(resilience.call("deepseek", "chat", rejected))
+    assert len(attempts) == 1
+
+
+def test_hedged_call_returns_the_first_answer(monkeypatch):
+    monkeypatch.setenv("FIRECRAWL_HEDGE_AFTER_SECONDS", "0.05")
+    calls = []
+
+    async def slow_then_fast():
+        calls.append(1)
+        await asyncio.sleep(1 if len(calls) == 1 else 0)
+        return len(calls)
+
+    result = asyncio.run(resilience.call("firecrawl", "poll", slow_then_fast, idempotent=True))
+    assert result == 2
+    assert len(calls) == 2
@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+from pydantic import BaseModel
+
+import llm_cache
+import structured_output
+from structured_output import ArrayParser
+
+
+class Company(BaseModel):
+    name: str
+    url: str
+
+
+def parse(text, chunk_size=None):
+    parser = ArrayParser(Company)
+    if chunk_size is None:
+        parser.feed(text)
+    else:
+        for start in range(0, len(text), chunk_size):
+            parser.feed(text[start:start + chunk_size])
+    parser.close()
+    return parser
+
+
+def names(parser):
+    return [item.name for item in parser.items]
+
+
+def test_complete_array():
+    parser = parse('[{"name": "Acme", "url": "https://acme.example"}, {"name": "Beta", "url": "https://beta.example"}]')
+    assert names(parser) == ["Acme", "Beta"]
+    assert parser.closed and parser.complete
+    assert parser.invalid == []
+
+
+def test_empty_array_is_complete():
+    parser = parse("[]")
+    assert parser.items == [] and parser.complete
+
+
+def test_fences_and_prose_are_ignored():
+    text = (
+        "Here are the companies:\n```json\n"
+        '[{"name": "Acme", "url": "https://acme.example"}]\n'
+        "```\nLet me know if you need more [details]."
+    )
+    parser = parse(text)
+    assert names(parser) == ["Acme"]
+    assert parser.complete
+
+
+def test_invalid_elements_are_skipped():
+    text = (
+        '[{"name": "Acme", "url": "https://acme.example"},'
+        ' {"name": "No URL"},'
+        ' {"name": "Broken", "url": https://broken.example},'
+        ' {"name": "Beta", "url": "https://beta.example"}]'
+    )
+    parser = parse(text)
+    assert names(parser) == ["Acme", "Beta"]
+    assert parser.closed and not parser.complete
+    assert [entry["raw"] for entry in parser.invalid] == [
+        '{"name": "No URL"}',
+        '{"name": "Broken", "url": https://broken.example}',
+    ]
+    assert "url" in parser.invalid[0]["error"]
+
+
+def test_truncated_array_keeps_the_complete_elements():
+    parser = parse('[{"name": "Acme", "url": "https://acme.example"}, {"name": "Be')
+    assert names(parser) == ["Acme"]
+    assert not parser.closed and not parser.complete
+    assert parser.invalid == []
+
+
+def test_unescaped_quote_is_salvaged_at_element_boundaries():
+    text = (
+        '[{"name": "Acme", "url": "https://acme.example"},'
+        ' {"name": "The "Best" Fair", "url": "https://fair.example"},'
+        ' {"name": "Beta", "url": "https://beta.example"}]'
+    )
+    parser = parse(text)
+    assert names(parser) == ["Acme", "Beta"]
+    assert parser.closed
+    assert len(parser.invalid) == 1
+
+
+def test_braces_inside_strings_do_not_end_an_element():
+    parser = parse('[{"name": "Acme {EU}]", "url": "https://acme.example/?q=}"}]')
+    assert names(parser) == ["Acme {EU}]"]
+    assert parser.complete
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7])
+def test_streamed_in_small_chunks(chunk_size):
+    text = '```json\n[{"name": "Acme", "url": "https://acme.example"}, {"name": "Beta", "url": "https://beta.example"}]\n```'
+    parser = parse(text, chunk_size)
+    assert names(parser) == ["Acme", "Beta"]
+    assert parser.complete
+
+
+def test_feed_returns_elements_as_they_complete():
+    parser = ArrayParser(Company)
+    assert parser.feed('[{"name": "Acme", "url": "https://acme.ex') == []
+    completed = parser.feed('ample"}, {"name"')
+    assert [item.name for item in completed] == ["Acme"]
+    assert parser.feed(': "Beta", "url": "https://beta.example"}]') == [parser.items[1]]
+    assert parser.closed
+
+
+def fake_stream(monkeypatch, responses):
+    calls = []
+
+    async def cached_astream(llm, messages):
+        calls.append(messages)
+        for chunk in responses[len(calls) - 1]:
+            yield chunk
+
+    monkeypatch.setattr(llm_cache, "cached_astream", cached_astream)
+    return calls
+
+
+def test_generate_list_continues_a_truncated_answer(monkeypatch):
+    calls = fake_stream(monkeypatch, [
+        ['[{"name": "Acme", "url": "https://acme.example"}, ', '{"name": "Be'],
+        ['[{"name": "Beta", "url": "https://beta.example"}, {"name": "Acme", "url": "https://acme.example"}]'],
+    ])
+    result = asyncio.run(structured_output.generate_list(None, [{"role": "user", "content": "List"}], Company))
+    assert [item["name"] for item in result["items"]] == ["Acme", "Beta"]
+    assert result["complete"] and result["continuations"] == 1
+    continuation = calls[1]
+    assert continuation[1] == {"role": "assistant", "content": '[{"name": "Acme", "url": "https://acme.example"}, {"name": "Be'}
+    assert "cut off after 1 valid elements" in continuation[2]["content"]
+
+
+def test_generate_list_stops_after_max_continuations(monkeypatch):
+    calls = fake_stream(monkeypatch, [['[{"name": "Acme"}]']] * 3)
+    result = asyncio.run(structured_output.generate_list(None, [], Company, max_continuations=2))
+    assert result["items"] == [] and not result["complete"]
+    assert result["continuations"] == 2 and len(calls) == 3
+
+
+def test_generate_list_without_an_array_raises(monkeypatch):
+    fake_stream(monkeypatch, [["I cannot help with that."]] * 3)
+    with pytest.raises(ValueError):
+        asyncio.run(structured_output.generate_list(None, [], Company))
@@ -0,0 +1,102 @@
+"""
+Pipeline job worker: claims jobs from the job queue (job_queue.py) and runs them.
+
+    python worker.py                # PIPELINE_WORKERS processes (default: one per CPU)
+    python worker.py --processes 4
+
+Every process runs up to PIPELINE_MAX_CONCURRENCY pipelines at a time. The supervisor
+restarts a process that dies; the jobs it was running are taken over by any worker once
+their leases expire (JOB_LEASE_SECONDS). On SIGTERM or SIGINT the processes hand their
+running jobs back to the queue and exit.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", str(os.cpu_count() or 1)))
+
+# Seconds to wait before restarting a worker process that died
+RESTART_DELAY_SECONDS = 5
+
+
+async def _serve() -> None:
+    # Imported here so the supervisor process does not load the app and its clients
+    import clients
+    import main
+    import pipeline
+
+    clients.registry.open()
+    worker = asyncio.create_task(pipeline.work(main.pipeline_stages))
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.cancel)
+    try:
+        await worker
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await clients.registry.aclose()
+
+
+def run_process() -> None:
+    """
+    Run one worker process until it is told to stop.
+    """
+    asyncio.run(_serve())
+
+
+def supervise(processes: int) -> None:
+    """
+    Start `processes` worker processes, restart the ones that die and stop them all on SIGTERM/SIGINT.
+    """
+    import metrics  # Only prometheus_client; lets the web tier drop the gauges of dead processes
+
+    context = multiprocessing.get_context("spawn")
+    stopping = False
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    def start() -> multiprocessing.Process:
+        process = context.Process(target=run_process, name="pipeline-worker")
+        process.start()
+        return process
+
+    workers = [start() for _ in range(processes)]
+    print(f"Started {processes} pipeline worker processes.")
+    while not stopping:
+        time.sleep(1)
+        for index, process in enumerate(workers):
+            if not process.is_alive() and not stopping:
+                print(f"Pipeline worker {process.pid} exited with code {process.exitcode}; restarting in {RESTART_DELAY_SECONDS}s.")
+                metrics.mark_process_dead(process.pid)
+                time.sleep(RESTART_DELAY_SECONDS)
+                workers[index] = start()
+
+    for process in workers:
+        if process.is_alive():
+            process.terminate()
+    for process in workers:
+        process.join()
+        metrics.mark_process_dead(process.pid)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=PIPELINE_WORKERS, help="worker processes to run")
+    args = parser.parse_args()
+    if args.processes <= 1:
+        run_process()
+    else:
+        supervise(args.processes)
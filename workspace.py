@@ -0,0 +1,127 @@
+"""
+Run-scoped artifact workspaces.
+
+Each pipeline run gets its own directory under data/runs/<run_id>/ with the same layout
+as the shared data/ directory, so several target companies can be processed at the same
+time (in one process or across uvicorn workers) without overwriting each other's files.
+Requests that do not carry a run_id keep using the shared data/ layout.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import uuid
+from typing import Optional
+
+from fastapi import HTTPException
+
+# Root of the shared (legacy) layout and of the per-run workspaces
+DATA_DIR = "data"
+RUNS_DIR = os.path.join(DATA_DIR, "runs")
+
+# Location of each pipeline artifact relative to a workspace root
+ARTIFACT_PATHS = {
+    "knowledge_base": os.path.join("knowledge_base", "knowledge_base"),
+    "company_profile": os.path.join("company_profile", "company_profile.md"),
+    "profile_digest": os.path.join("company_profile", "profile_digest.md"),
+    "potential_events": os.path.join("potential_events", "potential_events.json"),
+    "potential_customer": os.path.join("potential_customer", "potential_customer.json"),
+    "prioritized_companies": os.path.join("prioritized_companies", "prioritized_companies.json"),
+    "entities": os.path.join("entities", "entities.json"),
+}
+
+# Directory (relative to a workspace root) holding one outreach email file per company
+OUTREACH_EMAILS_DIR = "outreach_emails"
+
+RUN_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def new_run_id() -> str:
+    """
+    Generate a new run id.
+    """
+    return uuid.uuid4().hex
+
+
+def validate_run_id(run_id: Optional[str]) -> Optional[str]:
+    """
+    Reject run ids that could escape the runs directory.
+    """
+    if run_id is not None and not RUN_ID_PATTERN.match(run_id):
+        raise HTTPException(status_code=422, detail="run_id may only contain letters, digits, '-' and '_'.")
+    return run_id
+
+
+def run_dir(run_id: Optional[str] = None) -> str:
+    """
+    Return the workspace root for a run, or the shared data directory when run_id is None.
+    """
+    if run_id is None:
+        return DATA_DIR
+    return os.path.join(RUNS_DIR, validate_run_id(run_id))
+
+
+def artifact_path(artifact: str, run_id: Optional[str] = None, create_dir: bool = True) -> str:
+    """
+    Return the path of a pipeline artifact for the given run and optionally create its directory.
+    """
+    path = os.path.join(run_dir(run_id), ARTIFACT_PATHS[artifact])
+    if create_dir and os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def outreach_email_path(company_name: str, run_id: Optional[str] = None) -> str:
+    """
+    Return the file that stores the outreach email drafted for a company in the given run.
+    """
+    # Readable slug plus a short hash so names that differ only in punctuation do not collide
+    slug = re.sub(r"[^a-z0-9]+", "-", company_name.lower()).strip("-")[:80] or "company"
+    slug = f"{slug}-{hashlib.sha1(company_name.encode('utf-8')).hexdigest()[:8]}"
+    directory = os.path.join(run_dir(run_id), OUTREACH_EMAILS_DIR)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{slug}.json")
+
+
+def seed_from_shared(artifact: str, run_id: Optional[str]) -> str:
+    """
+    Copy the shared artifact into the run workspace if the run does not have it yet.
+    Used by DEBUG_MODE, which replays the files shipped in data/ instead of calling the APIs.
+    """
+    path = artifact_path(artifact, run_id)
+    shared = artifact_path(artifact, None, create_dir=False)
+    if run_id is not None and not os.path.exists(path) and os.path.exists(shared):
+        shutil.copyfile(shared, path)
+    return path
+
+
+def copy_artifact(artifact: str, from_run_id: str, to_run_id: str) -> Optional[str]:
+    """
+    Copy an artifact from another run into this run's workspace.
+    Returns the destination path, or None if the source run does not have the artifact.
+    """
+    source = artifact_path(artifact, from_run_id, create_dir=False)
+    destination = artifact_path(artifact, to_run_id)
+    if not os.path.exists(source):
+        return None
+    if os.path.abspath(source) != os.path.abspath(destination):
+        shutil.copyfile(source, destination)
+    return destination
+
+
+def write_text(path: str, content: str) -> None:
+    """
+    Write a text file atomically so concurrent readers never see a partially written artifact.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise